@@ -1,5 +1,6 @@
 import csv
 import pandas as pd
+from utils.trade_store import read_trade_history
 
 def analyze_trades(file_path="trade_history.csv"):
     """
@@ -7,8 +8,8 @@ def analyze_trades(file_path="trade_history.csv"):
     general y por estrategia, y muestra un resumen.
     """
     try:
-        # Usar pandas para leer el CSV y manejar posibles problemas
-        df = pd.read_csv(file_path, on_bad_lines='skip')
+        # CSV + journal de cierres, o el export columnar (.parquet / .pkl)
+        df = read_trade_history(file_path)
         # Asegurarse que la columna profit_loss sea numérica
         df['profit_loss'] = pd.to_numeric(df['profit_loss'], errors='coerce')
         # Filtrar solo las operaciones cerradas y con datos de P/L válidos
@@ -0,0 +1,551 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from strategies.utils import normalize_strategy_result
+from utils.indicators import compute_indicator
+from utils.kline_store import KLINE_COLUMNS
+from utils.klines_utils import INTERVAL_MS
+from utils.strategy_loader import load_strategy_classes
+from utils.trade_history import TRADE_HISTORY_FIELDNAMES, sanitize_for_json
+
+logger = logging.getLogger(__name__)
+
+# Igual que TradingBot.KLINE_STORE_CAPACITY: las estrategias nunca ven más histórico que en vivo
+LOOKBACK_ROWS = 2000
+
+
+def load_klines_csv(path):
+    """Lee velas de 1m desde un CSV con columnas open_time, open, high, low, close, volume."""
+    df = pd.read_csv(path)
+    df = df.sort_values("open_time").drop_duplicates("open_time", keep="last")
+    return {col: df[col].to_numpy(dtype=np.int64 if col == "open_time" else np.float64) for col in KLINE_COLUMNS}
+
+
+def load_klines_archive(root, symbol="BTCUSDT", start=None, end=None):
+    """Lee velas de 1m del archivo local (kline_archive.py) entre dos fechas AAAA-MM-DD (UTC, incluidas)."""
+    from kline_archive import KlineArchive, DAY_MS, _date_to_ms, to_columns
+    start_ms = _date_to_ms(start) if start else None
+    end_ms = _date_to_ms(end) + DAY_MS - 1 if end else None
+    data = KlineArchive(root).range(symbol, "1m", start_ms, end_ms)
+    if not len(data):
+        raise ValueError(f"No hay velas de {symbol}@1m en {root} para el rango indicado.")
+    return to_columns(data)
+
+
+def synthetic_klines(minutes, symbol="BTCUSDT"):
+    """Genera velas de 1m sintéticas con binance_data_provider."""
+    from binance_data_provider import get_historical_klines
+    df = pd.DataFrame(get_historical_klines(symbol, "1m", limit=minutes)["prices"])
+    df["open_time"] -= df["open_time"] % INTERVAL_MS["1m"]
+    return {col: df[col].to_numpy(dtype=np.int64 if col == "open_time" else np.float64) for col in KLINE_COLUMNS}
+
+
+def resample_klines(columns, interval):
+    """Agrega velas de 1m al intervalo indicado (5m, 30m, 1d) alineando por open_time."""
+    ms = INTERVAL_MS[interval]
+    keys = columns["open_time"] // ms
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    return {
+        "open_time": keys[starts] * ms,
+        "open": columns["open"][starts],
+        "high": np.maximum.reduceat(columns["high"], starts),
+        "low": np.minimum.reduceat(columns["low"], starts),
+        "close": columns["close"][ends],
+        "volume": np.add.reduceat(columns["volume"], starts),
+    }
+
+
+class BacktestIndicatorCache:
+    """
+    Sustituto de IndicatorCache para el backtest: igual que en vivo, cada indicador se
+    calcula sobre la ventana de velas que pidió la estrategia y se reutiliza dentro de
+    la misma vela del cursor.
+    """
+
+    def __init__(self, feed):
+        self.feed = feed
+        self._series = {}
+        self._cursor = None
+
+    def new_cycle(self):
+        self._series.clear()
+
+    def series(self, symbol, interval, indicator, params, df):
+        feed = self.feed
+        params = tuple(params)
+        if symbol.upper() != feed.symbol or interval not in feed.columns or df.empty:
+            return compute_indicator(df, indicator, params)
+        if feed.cursor != self._cursor:
+            self._series.clear()
+            self._cursor = feed.cursor
+        key = (interval, indicator, params, int(df["open_time"].iloc[-1]), len(df))
+        values = self._series.get(key)
+        if values is None:
+            values = self._series[key] = compute_indicator(df, indicator, params)
+        return values
+
+
+class BacktestDataFeed:
+    """
+    Sustituto de TradingBot para las estrategias: implementa _get_binance_klines_data
+    sobre arrays en memoria y un cursor temporal (índice de la última vela de 1m cerrada).
+    Las velas de 5m/30m/1d se agregan desde 1m y solo son visibles una vez cerradas.
+    """
+
+    streaming_indicators = None
+
+    def __init__(self, klines_1m, symbol="BTCUSDT", intervals=("1m", "5m", "30m", "1d")):
+        self.symbol = symbol.upper()
+        self.columns = {}
+        self.frames = {}
+        self._closed = {}  # interval -> nº de velas cerradas tras cada vela de 1m
+        minute_close = klines_1m["open_time"] + INTERVAL_MS["1m"]
+        for interval in intervals:
+            columns = klines_1m if interval == "1m" else resample_klines(klines_1m, interval)
+            self.columns[interval] = columns
+            self.frames[interval] = pd.DataFrame(columns, columns=KLINE_COLUMNS)
+            bar_close = columns["open_time"] + INTERVAL_MS[interval]
+            self._closed[interval] = np.searchsorted(bar_close, minute_close, side="right")
+        self.cursor = 0
+        self.indicator_cache = BacktestIndicatorCache(self)
+
+    def __len__(self):
+        return len(self.columns["1m"]["open_time"])
+
+    def closed_count(self, interval):
+        return int(self._closed[interval][self.cursor])
+
+    def closed_intervals(self, index):
+        """Intervalos que cierran una vela con la vela de 1m `index`."""
+        if index == 0:
+            return set(self._closed)
+        return {interval for interval, closed in self._closed.items() if closed[index] > closed[index - 1]}
+
+    def evaluation_mask(self, intervals):
+        """Velas de 1m en las que se evalúa una estrategia con esos intervalos (cierra alguno de ellos)."""
+        mask = np.zeros(len(self), dtype=bool)
+        for interval in intervals or self._closed:
+            closed = self._closed[interval]
+            mask |= np.diff(closed, prepend=0) > 0
+        return mask
+
+    def _get_binance_klines_data(self, symbol, interval, limit):
+        if symbol.upper() != self.symbol or interval not in self.frames:
+            raise KeyError((symbol.upper(), interval))
+        end = self.closed_count(interval)
+        start = max(0, end - min(limit, LOOKBACK_ROWS))
+        return {'prices': self.frames[interval].iloc[start:end].reset_index(drop=True)}
+
+
+class Backtester:
+    """
+    Reproduce el flujo de _polling_loop sobre un BacktestDataFeed:
+    - una posición por estrategia, entrada al cierre de la vela que da la señal;
+    - SL/TP como fracción del precio de entrada (igual que en _process_new_trade) y,
+      si la estrategia no los da, multiplicadores de config.json sobre detailed_status["ATR"];
+    - cooldown de 5 minutos desde la apertura;
+    - filtro de tendencia 30m (cierre vs EMA30): prevent_counter_trend_trades y la
+      regla SL=TP de enable_tp_sl_against_trend.
+    Si en una misma vela se tocan SL y TP se asume el SL. No se simula la segunda
+    operación de enable_two_tp_trades ni la gestión de la posición por IA.
+
+    Se asume que run() solo depende de las velas visibles en el cursor, lo que permite
+    repartir el histórico en tramos entre procesos (run_parallel) y unirlos después
+    con el mismo resultado que una pasada secuencial.
+    """
+
+    def __init__(self, feed, config=None, order_size=None, cooldown_minutes=5, spread_pct=0.0, epic="BACKTEST"):
+        self.feed = feed
+        self.config = config or {}
+        settings = self.config.get("global_settings", {})
+        self.order_size = order_size or settings.get("global_order_size", 0.0015)
+        self.prevent_counter_trend_trades = settings.get("prevent_counter_trend_trades", True)
+        self.enable_tp_sl_against_trend = settings.get("enable_tp_sl_against_trend", False)
+        self.cooldown_ms = cooldown_minutes * INTERVAL_MS["1m"]
+        self.spread_pct = spread_pct
+        self.epic = epic
+
+        close_30m = feed.columns["30m"]["close"]
+        ema30 = compute_indicator(feed.frames["30m"], "EMA", (30,))
+        self._trend_30m = np.where(close_30m > ema30, 1, np.where(close_30m < ema30, -1, 0))
+
+    def current_trend(self, index):
+        closed = int(self.feed._closed["30m"][index])
+        if closed == 0:
+            return "neutral"
+        return {1: "bullish", -1: "bearish"}.get(int(self._trend_30m[closed - 1]), "neutral")
+
+    def run_strategy(self, name, instance, start=None, stop=None, warmup_minutes=1440):
+        """
+        Ejecuta el run() sin modificar de la estrategia vela a vela entre start y stop
+        (índices de velas de 1m) y devuelve la lista de trades. Un trade abierto antes
+        de stop se sigue hasta su cierre aunque sea posterior.
+        """
+        feed = self.feed
+        times = feed.columns["1m"]["open_time"]
+        n = len(times)
+        stop = n if stop is None else min(stop, n)
+        strategy_intervals = set(getattr(instance, "intervals", ()))
+        trades = []
+        last_trade_time = None
+        i = min(warmup_minutes, n) if start is None else start
+        while i < stop:
+            now = int(times[i]) + INTERVAL_MS["1m"]
+            if last_trade_time is not None and now - last_trade_time < self.cooldown_ms:
+                i += 1
+                continue
+            if strategy_intervals and not strategy_intervals.intersection(feed.closed_intervals(i)):
+                i += 1
+                continue
+
+            feed.cursor = i
+            try:
+                result = normalize_strategy_result(instance.run(None, feed, feed.symbol))
+            except Exception as e:
+                logger.debug(f"La estrategia '{name}' falló en la vela {i}: {e}")
+                i += 1
+                continue
+
+            signal_text = result.get("signal", "HOLD")
+            direction = "BUY" if signal_text.startswith("BUY") else ("SELL" if signal_text.startswith("SELL") else None)
+            trade = self._open_trade(name, instance, result, direction, i) if direction else None
+            if trade is None:
+                i += 1
+                continue
+
+            last_trade_time = now
+            exit_index = self._close_trade(trade, i)
+            # Primera vela en la que la estrategia vuelve a evaluarse (posición cerrada y cooldown cumplido)
+            trade["_open_index"] = i
+            trade["_free_index"] = max(exit_index + 1, int(np.searchsorted(times, times[i] + self.cooldown_ms)))
+            trades.append(trade)
+            i = exit_index + 1
+        return trades
+
+    def run_vectorized(self, name, instance, signals=None, warmup_minutes=1440):
+        """
+        Igual que run_strategy pero con las señales de generate_signals(): en lugar de
+        llamar a run() en cada vela salta directamente a la siguiente vela con señal en
+        la que la estrategia se evaluaría (cierra uno de sus intervalos, sin posición
+        abierta y con el cooldown cumplido). La apertura y el cierre de cada trade usan
+        el mismo _open_trade/_close_trade.
+        """
+        feed = self.feed
+        if signals is None:
+            signals = instance.generate_signals(feed.frames)
+        times = feed.columns["1m"]["open_time"]
+        n = len(times)
+        signal_values = signals["signal"].to_numpy()
+        sl_values = signals["sl_pct"].to_numpy(dtype=float)
+        tp_values = signals["tp_pct"].to_numpy(dtype=float)
+        atr_values = signals["atr"].to_numpy(dtype=float)
+        candidates = np.flatnonzero((signal_values != "HOLD") & feed.evaluation_mask(getattr(instance, "intervals", ())))
+        candidates = candidates[candidates >= min(warmup_minutes, n)]
+
+        trades = []
+        free = 0
+        position = int(np.searchsorted(candidates, free))
+        while position < len(candidates):
+            i = int(candidates[position])
+            result = {
+                "signal": signal_values[i],
+                "sl_pct": sl_values[i],
+                "tp_pct": tp_values[i],
+                "detailed_status": {"ATR": float(atr_values[i]), "vectorized": True},
+            }
+            trade = self._open_trade(name, instance, result, signal_values[i], i)
+            if trade is None:
+                position += 1
+                continue
+            exit_index = self._close_trade(trade, i)
+            trade["_open_index"] = i
+            trade["_free_index"] = free = max(exit_index + 1, int(np.searchsorted(times, times[i] + self.cooldown_ms)))
+            trades.append(trade)
+            position = int(np.searchsorted(candidates, free))
+        return trades
+
+    def check_signals(self, name, instance, samples=200, signals=None, warmup_minutes=1440, seed=0):
+        """
+        Comprueba generate_signals() contra run() en una muestra de velas: todas las
+        velas con señal vectorizada (hasta la mitad de la muestra) y el resto al azar.
+        Devuelve la lista de discrepancias [(índice, señal run(), señal vectorizada)].
+        """
+        feed = self.feed
+        if signals is None:
+            signals = instance.generate_signals(feed.frames)
+        eligible = np.flatnonzero(feed.evaluation_mask(getattr(instance, "intervals", ())))
+        eligible = eligible[eligible >= min(warmup_minutes, len(feed))]
+        signal_values = signals["signal"].to_numpy()
+        rng = np.random.default_rng(seed)
+        with_signal = eligible[signal_values[eligible] != "HOLD"]
+        with_signal = rng.permutation(with_signal)[:samples // 2]
+        rest = rng.permutation(np.setdiff1d(eligible, with_signal))[:max(0, samples - len(with_signal))]
+
+        mismatches = []
+        for i in np.sort(np.r_[with_signal, rest]).astype(int):
+            feed.cursor = i
+            result = normalize_strategy_result(instance.run(None, feed, feed.symbol))
+            signal_text = result.get("signal", "HOLD")
+            direction = "BUY" if signal_text.startswith("BUY") else ("SELL" if signal_text.startswith("SELL") else "HOLD")
+            expected = signal_values[i]
+            if direction != expected:
+                mismatches.append((i, direction, expected))
+            elif direction != "HOLD" and not np.isclose(result.get("sl_pct") or 0.0, signals["sl_pct"].iat[i], rtol=1e-6, equal_nan=True):
+                mismatches.append((i, f"{direction} sl_pct={result.get('sl_pct')}", f"{expected} sl_pct={signals['sl_pct'].iat[i]}"))
+        return mismatches
+
+    def run_parallel(self, name, strategy_class, strategy_config, aggressiveness_level, workers, warmup_minutes=1440):
+        """
+        Reparte el histórico en `workers` tramos que se simulan en procesos separados
+        (cada tramo empieza sin posición) y los une con merge_chunks.
+        """
+        n = len(self.feed)
+        start = min(warmup_minutes, n)
+        bounds = np.linspace(start, n, workers + 1).astype(int)
+        chunks = list(zip(bounds[:-1], bounds[1:]))
+        args = (self.feed.columns["1m"], self.config, self.spread_pct, self.epic, name, strategy_config, aggressiveness_level)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_chunk, *zip(*[args + (a, b) for a, b in chunks])))
+        instance = strategy_class(strategy_config, aggressiveness_level=aggressiveness_level)
+        return self.merge_chunks(name, instance, list(zip([a for a, _ in chunks], results)))
+
+    def merge_chunks(self, name, instance, chunk_results):
+        """
+        Une los trades de tramos simulados por separado [(inicio, trades), ...].
+        Si el tramo anterior deja una posición abierta (o en cooldown) más allá del
+        inicio del siguiente, se vuelve a simular secuencialmente el hueco hasta que
+        ambas simulaciones están libres en la misma vela; desde ahí son idénticas.
+        """
+        merged = []
+        free = 0
+        for start, trades in chunk_results:
+            while True:
+                straddling = next((t for t in trades if t["_open_index"] < free < t["_free_index"]), None)
+                if free <= start or straddling is None:
+                    merged.extend(t for t in trades if t["_open_index"] >= max(free, start))
+                    break
+                extra = self.run_strategy(name, instance, start=free, stop=straddling["_free_index"])
+                merged.extend(extra)
+                free = max([straddling["_free_index"]] + [t["_free_index"] for t in extra])
+            if merged:
+                free = max(free, merged[-1]["_free_index"])
+        return merged
+
+    def _open_trade(self, name, instance, result, direction, index):
+        price = float(self.feed.columns["1m"]["close"][index])
+        atr_5m = result.get("detailed_status", {}).get("ATR", 0.0)
+        sl_pct, tp_pct = _valid_pct(result.get("sl_pct")), _valid_pct(result.get("tp_pct"))
+        if sl_pct is None or tp_pct is None:
+            sl_multiplier = getattr(instance, "sl_multiplier", None)
+            tp_multiplier = getattr(instance, "tp_multiplier", None)
+            if sl_multiplier is None or tp_multiplier is None or not _valid_pct(atr_5m):
+                return None
+            sl_pct = _valid_pct(sl_multiplier * atr_5m / price)
+            tp_pct = _valid_pct(tp_multiplier * atr_5m / price)
+        if sl_pct is None or tp_pct is None:
+            return None
+
+        trend = self.current_trend(index)
+        against_trend = (direction == "BUY" and trend == "bearish") or (direction == "SELL" and trend == "bullish")
+        if self.prevent_counter_trend_trades and against_trend:
+            return None
+        tp_sl_against_trend = self.enable_tp_sl_against_trend and against_trend
+        if tp_sl_against_trend:
+            tp_pct = sl_pct
+
+        half_spread = self.spread_pct / 2
+        if direction == "BUY":
+            entry = price * (1 + half_spread)
+            stop_level, profit_level = entry * (1 - sl_pct), entry * (1 + tp_pct)
+        else:
+            entry = price * (1 - half_spread)
+            stop_level, profit_level = entry * (1 + sl_pct), entry * (1 - tp_pct)
+
+        deal_id = f"BT-{name}-{int(self.feed.columns['1m']['open_time'][index])}"
+        return {
+            "open_time": _format_time(int(self.feed.columns["1m"]["open_time"][index]) + INTERVAL_MS["1m"]),
+            "strategy": name, "epic": self.epic, "direction": direction, "size": self.order_size,
+            "entry_price": entry, "stop_level": stop_level, "profit_level": profit_level,
+            "dealReference": deal_id, "dealId": deal_id, "status": "OPEN", "profit_loss": None,
+            "close_time": None, "close_price": None,
+            "entry_conditions": json.dumps(sanitize_for_json(result.get("detailed_status", {})), default=str),
+            "exit_conditions": "", "exit_reason": "",
+            "tp_sl_against_trend_active": self.enable_tp_sl_against_trend,
+            "sl_moved_to_be": False, "break_even_profit_pct": 0.0,
+            "current_trend": trend, "atr_5m": atr_5m,
+        }
+
+    def _close_trade(self, trade, index, chunk=1440):
+        """Busca (por bloques vectorizados) la primera vela posterior que toca el SL o el TP."""
+        columns = self.feed.columns["1m"]
+        n = len(columns["open_time"])
+        buy = trade["direction"] == "BUY"
+        sl, tp = trade["stop_level"], trade["profit_level"]
+        exit_index, exit_price, exit_reason = n - 1, float(columns["close"][n - 1]), "Fin del backtest"
+        j = index + 1
+        while j < n:
+            high, low = columns["high"][j:j + chunk], columns["low"][j:j + chunk]
+            sl_hit = (low <= sl) if buy else (high >= sl)
+            tp_hit = (high >= tp) if buy else (low <= tp)
+            hits = np.flatnonzero(sl_hit | tp_hit)
+            if hits.size:
+                k = int(hits[0])
+                exit_index = j + k
+                if sl_hit[k]:
+                    # Si la vela abre más allá del SL, se ejecuta a la apertura
+                    open_ = float(columns["open"][exit_index])
+                    exit_price, exit_reason = (min(sl, open_) if buy else max(sl, open_)), "Stop Loss"
+                else:
+                    exit_price, exit_reason = tp, "Take Profit"
+                break
+            j += chunk
+
+        pnl = (exit_price - trade["entry_price"]) if buy else (trade["entry_price"] - exit_price)
+        trade.update({
+            "status": "CLOSED", "profit_loss": pnl * trade["size"],
+            "close_time": _format_time(int(columns["open_time"][exit_index]) + INTERVAL_MS["1m"]),
+            "close_price": exit_price, "exit_reason": exit_reason,
+        })
+        return exit_index
+
+
+def _valid_pct(value):
+    """Devuelve el valor si es un número finito distinto de cero (None, 0 y NaN no son válidos)."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value and math.isfinite(value) else None
+
+
+def direction_mismatches(mismatches):
+    """Discrepancias de check_signals en las que run() da otra dirección (no solo otro sl_pct)."""
+    return [m for m in mismatches if m[1].split()[0] != m[2].split()[0]]
+
+
+def _run_chunk(klines_1m, config, spread_pct, epic, name, strategy_config, aggressiveness_level, start, stop):
+    strategy_class = load_strategy_classes("strategies")[name]
+    instance = strategy_class(strategy_config, aggressiveness_level=aggressiveness_level)
+    backtester = Backtester(BacktestDataFeed(klines_1m), config, spread_pct=spread_pct, epic=epic)
+    return backtester.run_strategy(name, instance, start=start, stop=stop)
+
+
+def _format_time(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def write_trade_log(trades, path):
+    with open(path, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TRADE_HISTORY_FIELDNAMES, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(trades)
+
+
+def summarize(trades):
+    """Resumen por estrategia: nº de trades, P/L total, tasa de acierto y drawdown máximo."""
+    summary = {}
+    for trade in trades:
+        summary.setdefault(trade["strategy"], []).append(trade["profit_loss"])
+    result = {}
+    for name, pnls in summary.items():
+        pnls = np.asarray(pnls, dtype=float)
+        equity = np.cumsum(pnls)
+        drawdown = np.max(np.maximum.accumulate(np.r_[0.0, equity]) - np.r_[0.0, equity])
+        result[name] = {
+            "trades": len(pnls),
+            "profit_loss": float(pnls.sum()),
+            "win_rate": float((pnls > 0).mean() * 100),
+            "max_drawdown": float(drawdown),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest de las estrategias sobre velas históricas de 1m.")
+    parser.add_argument("--data", help="CSV de velas de 1m (open_time, open, high, low, close, volume). Sin él se usan datos sintéticos.")
+    parser.add_argument("--synthetic-days", type=int, default=30, help="Días de velas sintéticas si no se indica --data.")
+    parser.add_argument("--archive", help="Directorio del archivo local de velas (kline_archive.py) a usar en lugar de --data.")
+    parser.add_argument("--symbol", default="BTCUSDT", help="Símbolo a leer del archivo local.")
+    parser.add_argument("--from", dest="start", help="Fecha inicial AAAA-MM-DD (UTC) del rango del archivo local.")
+    parser.add_argument("--to", dest="end", help="Fecha final AAAA-MM-DD (UTC, incluida) del rango del archivo local.")
+    parser.add_argument("--strategies", nargs="*", help="Estrategias a evaluar (por defecto todas).")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--output", default="backtest_trades.csv")
+    parser.add_argument("--spread-pct", type=float, default=0.0, help="Spread como fracción del precio (p. ej. 0.0005).")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos por estrategia (reparte el histórico en tramos).")
+    parser.add_argument("--vectorized", action="store_true", help="Usa generate_signals() en las estrategias que lo implementan.")
+    parser.add_argument("--check-signals", type=int, default=0, metavar="N",
+                        help="Compara generate_signals() con run() en N velas por estrategia; "
+                             "termina con código 1 si alguna dirección no coincide.")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    if args.archive:
+        klines = load_klines_archive(args.archive, args.symbol, args.start, args.end)
+    elif args.data:
+        klines = load_klines_csv(args.data)
+    else:
+        klines = synthetic_klines(args.synthetic_days * 1440)
+    feed = BacktestDataFeed(klines)
+    backtester = Backtester(feed, config, spread_pct=args.spread_pct)
+    aggressiveness_level = config.get("global_settings", {}).get("aggressiveness_level", 3)
+
+    all_trades = []
+    failed_checks = []
+    for name, strategy_class in load_strategy_classes("strategies").items():
+        if args.strategies and name not in args.strategies:
+            continue
+        strategy_config = config.get(name, {})
+        level = strategy_config.get("aggressiveness_level", aggressiveness_level)
+        instance = strategy_class(strategy_config, aggressiveness_level=level)
+        start = time.time()
+        signals = None
+        if args.vectorized or args.check_signals:
+            try:
+                signals = instance.generate_signals(feed.frames)
+            except NotImplementedError:
+                logger.info(f"{name} no implementa generate_signals; se usa run() vela a vela.")
+        if signals is not None and args.check_signals:
+            mismatches = backtester.check_signals(name, instance, samples=args.check_signals, signals=signals)
+            print(f"{name}: {len(mismatches)} discrepancias entre run() y generate_signals() en {args.check_signals} velas")
+            for index, run_signal, vector_signal in mismatches[:10]:
+                print(f"  vela {index}: run()={run_signal} vectorizada={vector_signal}")
+            if direction_mismatches(mismatches):
+                failed_checks.append(name)
+        if args.vectorized and signals is not None:
+            trades = backtester.run_vectorized(name, instance, signals)
+        elif args.workers > 1:
+            trades = backtester.run_parallel(name, strategy_class, strategy_config, level, args.workers)
+        else:
+            trades = backtester.run_strategy(name, instance)
+        print(f"{name}: {len(trades)} operaciones en {time.time() - start:.1f}s")
+        all_trades.extend(trades)
+
+    write_trade_log(all_trades, args.output)
+    print(f"Historial del backtest guardado en {args.output}")
+    for name, stats in summarize(all_trades).items():
+        print(f"Estrategia: {name}")
+        print(f"  Ganancia/Pérdida Total: {stats['profit_loss']:.2f}")
+        print(f"  Número Total de Operaciones: {stats['trades']}")
+        print(f"  Tasa de Acierto: {stats['win_rate']:.2f}%")
+        print(f"  Drawdown Máximo: {stats['max_drawdown']:.2f}")
+        print("-" * 30)
+    if failed_checks:
+        print(f"generate_signals() da otra dirección que run() en: {', '.join(failed_checks)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
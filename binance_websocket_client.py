@@ -6,44 +6,122 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-class BinanceWebsocketClient:
-    def __init__(self, symbol, interval, data_queue):
-        self.symbol = symbol.lower()
-        self.interval = interval
-        self.data_queue = data_queue
-        self.ws_url = f"wss://stream.binance.com:9443/ws/{self.symbol}@kline_{self.interval}"
+class BinanceCombinedStreamClient:
+    """
+    Una sola conexión /stream?streams= de Binance para todas las parejas (símbolo, intervalo),
+    con un único hilo y bucle de eventos. Las suscripciones se pueden añadir o quitar en
+    caliente (SUBSCRIBE/UNSUBSCRIBE) y se restauran al reconectar.
+
+    Cada vela cerrada se encola en data_queues[(SÍMBOLO, intervalo)] y se notifica con
+    on_close(símbolo, intervalo, kline). Con gap_filler (utils.kline_gap_filler.KlineGapFiller)
+    es él quien encola y notifica, rellenando antes por REST las velas que falten tras una
+    reconexión.
+    """
+
+    BASE_URL = "wss://stream.binance.com:9443/stream"
+    MAX_STREAMS = 1024  # Límite de streams por conexión de Binance
+
+    def __init__(self, data_queues, on_close=None, gap_filler=None, on_partial=None):
+        self.data_queues = data_queues
+        self.on_close = on_close
+        self.gap_filler = gap_filler
+        # Callback opcional on_partial(symbol, interval, kline) con cada tick de la vela en curso
+        self.on_partial = on_partial
+        self.streams = set()
         self.running = False
+        self._loop = None
+        self._ws = None
+        self._request_id = 0
+
+    @staticmethod
+    def stream_name(symbol, interval):
+        return f"{symbol.lower()}@kline_{interval}"
+
+    def subscribe(self, symbol, interval):
+        stream = self.stream_name(symbol, interval)
+        if stream in self.streams:
+            return
+        if len(self.streams) >= self.MAX_STREAMS:
+            raise ValueError(f"Límite de {self.MAX_STREAMS} streams por conexión alcanzado")
+        self.streams.add(stream)
+        self._send_threadsafe("SUBSCRIBE", [stream])
+
+    def unsubscribe(self, symbol, interval):
+        stream = self.stream_name(symbol, interval)
+        if stream in self.streams:
+            self.streams.discard(stream)
+            self._send_threadsafe("UNSUBSCRIBE", [stream])
+
+    def _send_threadsafe(self, method, params):
+        # Antes de conectar no hace falta: los streams van en la URL de conexión
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._send(method, params), self._loop)
+
+    async def _send(self, method, params):
+        self._request_id += 1
+        await self._ws.send(json.dumps({"method": method, "params": params, "id": self._request_id}))
+
+    def _url(self):
+        if not self.streams:
+            return self.BASE_URL
+        return f"{self.BASE_URL}?streams={'/'.join(sorted(self.streams))}"
+
+    def _dispatch(self, message):
+        data = message.get("data")
+        if not data or data.get("e") != "kline":
+            return  # Respuestas a SUBSCRIBE/UNSUBSCRIBE ({"result": null, "id": n})
+        kline = data["k"]
+        symbol, interval = kline["s"].upper(), kline["i"]
+        if not kline["x"]:
+            if self.on_partial:
+                try:
+                    self.on_partial(symbol, interval, kline)
+                except Exception as e:
+                    logger.error(f"Error en el callback on_partial de {symbol}@{interval}: {e}")
+            return
+        if self.gap_filler is not None:
+            self.gap_filler.put(symbol, interval, kline)
+            return
+        data_queue = self.data_queues.get((symbol, interval))
+        if data_queue is not None:
+            data_queue.put(kline)
+        if self.on_close:
+            try:
+                self.on_close(symbol, interval, kline)
+            except Exception as e:
+                logger.error(f"Error en el callback on_close de {symbol}@{interval}: {e}")
 
     async def _run(self):
+        self._loop = asyncio.get_running_loop()
         self.running = True
         while self.running:
             try:
-                async with websockets.connect(self.ws_url) as ws:
-                    logger.info(f"Conectado al WebSocket de Binance para {self.symbol}@{self.interval}")
+                async with websockets.connect(self._url()) as ws:
+                    self._ws = ws
+                    logger.info(f"Conectado al WebSocket combinado de Binance ({len(self.streams)} streams)")
                     while self.running:
                         try:
-                            message = await asyncio.wait_for(ws.recv(), timeout=60.0)
-                            data = json.loads(message)
-                            if 'k' in data:
-                                kline = data['k']
-                                if kline['x']:  # Si la vela está cerrada
-                                    self.data_queue.put(kline)
+                            self._dispatch(json.loads(await asyncio.wait_for(ws.recv(), timeout=60.0)))
                         except asyncio.TimeoutError:
                             logger.warning("Timeout esperando mensaje de WebSocket. Intentando reconectar...")
-                            break  # Salir del bucle interno para reconectar
+                            break
                         except websockets.exceptions.ConnectionClosed:
                             logger.warning("Conexión WebSocket cerrada. Intentando reconectar...")
                             break
             except Exception as e:
-                logger.error(f"Error en el cliente WebSocket de Binance: {e}")
+                logger.error(f"Error en el cliente WebSocket combinado de Binance: {e}")
                 await asyncio.sleep(5)
+            finally:
+                self._ws = None
 
     def start(self):
         import threading
-        threading.Thread(target=self._start_event_loop, daemon=True).start()
+        threading.Thread(target=self._start_event_loop, name="binance-streams", daemon=True).start()
 
     def _start_event_loop(self):
         asyncio.run(self._run())
 
     def stop(self):
         self.running = False
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
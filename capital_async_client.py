@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger("TradingBotLogger")
+
+# Límites publicados por Capital.com: 10 peticiones/s por usuario, 1 orden cada 0.1 s
+# (POST /positions y /workingorders) y 1 petición/s a POST /session.
+GENERAL_RATE = (10.0, 10)  # (tokens por segundo, capacidad)
+ENDPOINT_RATES = {
+    ("POST", "/positions"): (10.0, 1),
+    ("POST", "/workingorders"): (10.0, 1),
+    ("POST", "/session"): (1.0, 1),
+}
+RETRY_STATUS = (429, 500, 502, 503, 504)
+ORDER_ENDPOINTS = ("/positions", "/workingorders")
+
+
+class CapitalAPIError(Exception):
+    """Respuesta HTTP de error de Capital.com (status, texto y JSON si lo hay)."""
+
+    def __init__(self, status, text, payload=None):
+        super().__init__(f"{status} - {text}")
+        self.status = status
+        self.text = text
+        self.payload = payload or {}
+
+
+def _is_order(method, endpoint):
+    return method == "POST" and endpoint in ORDER_ENDPOINTS
+
+
+class TokenBucket:
+    """Limitador token bucket para asyncio: acquire() espera hasta que haya un token."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncCapitalClient:
+    """
+    Cliente asyncio de la API REST de Capital.com.
+
+    - Una sesión aiohttp con conexiones keep-alive reutilizadas (pool limitado por max_connections).
+    - Token buckets en cliente: uno general y otro por endpoint con límite propio, de modo
+      que órdenes, /confirms, /positions y /history/transactions pueden lanzarse a la vez.
+    - Reintentos con backoff exponencial y jitter ante 429/5xx y errores de red. POST /positions
+      solo se reintenta ante 429 (la orden no llegó a procesarse) para no duplicar órdenes.
+    - Varios 401/403 simultáneos provocan una única llamada a /session.
+    """
+
+    def __init__(self, base_url, api_key, identifier, password, account_id=None,
+                 max_connections=8, timeout_seconds=10, max_retries=3, backoff_seconds=0.5, sync_client=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.identifier = identifier
+        self.password = password
+        self.account_id = account_id
+        self.max_connections = max_connections
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.sync_client = sync_client  # Si existe, comparte con él los tokens de sesión
+        self.cst_token = getattr(sync_client, "cst_token", None)
+        self.x_security_token = getattr(sync_client, "x_security_token", None)
+        self._session = None
+        self._auth_lock = None
+        self._buckets = None
+
+    @classmethod
+    def from_sync(cls, client, **kwargs):
+        """Crea el cliente asíncrono con las credenciales y tokens de un CapitalComAPIClient."""
+        return cls(client.base_url, client.api_key, client.identifier, client.password,
+                   account_id=client.account_id, sync_client=client, **kwargs)
+
+    # --- Infraestructura ---
+
+    async def _get_session(self):
+        # La sesión, los locks y los buckets se crean dentro del bucle de eventos que los usa
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+            )
+            self._auth_lock = asyncio.Lock()
+            self._buckets = {"general": TokenBucket(*GENERAL_RATE)}
+            self._buckets.update({key: TokenBucket(*rate) for key, rate in ENDPOINT_RATES.items()})
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _throttle(self, method, endpoint):
+        await self._buckets["general"].acquire()
+        bucket = self._buckets.get((method, endpoint))
+        if bucket is not None:
+            await bucket.acquire()
+
+    def _backoff(self, attempt):
+        return self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _headers(self):
+        return {"X-CAP-API-KEY": self.api_key, "CST": self.cst_token, "X-SECURITY-TOKEN": self.x_security_token}
+
+    # --- Autenticación ---
+
+    async def _authenticate(self):
+        session = await self._get_session()
+        await self._throttle("POST", "/session")
+        login_data = {"identifier": self.identifier, "password": self.password, "encryptedPassword": False}
+        async with session.post(f"{self.base_url}/session", json=login_data,
+                                headers={"X-CAP-API-KEY": self.api_key, "Content-Type": "application/json"}) as response:
+            if response.status != 200:
+                raise CapitalAPIError(response.status, await response.text())
+            self.cst_token = response.headers.get("CST")
+            self.x_security_token = response.headers.get("X-SECURITY-TOKEN")
+        logger.debug("AsyncCapitalClient: sesión renovada.")
+        if self.sync_client is not None:
+            self.sync_client.cst_token, self.sync_client.x_security_token = self.cst_token, self.x_security_token
+            self.sync_client._save_session()
+
+    async def _reauthenticate(self, stale_token):
+        """Renueva la sesión una sola vez aunque varias peticiones reciban 401/403 a la vez."""
+        await self._get_session()
+        async with self._auth_lock:
+            if self.cst_token and self.cst_token != stale_token:
+                return  # Otra petición ya la renovó mientras esperábamos
+            await self._authenticate()
+
+    # --- Peticiones ---
+
+    async def request(self, method, endpoint, params=None, data=None):
+        session = await self._get_session()
+        if not self.cst_token or not self.x_security_token:
+            await self._reauthenticate(None)
+        reauthenticated = False
+        attempt = 0
+        while True:
+            await self._throttle(method, endpoint)
+            used_token = self.cst_token
+            try:
+                async with session.request(method, f"{self.base_url}{endpoint}", headers=self._headers(),
+                                           params=params, json=data) as response:
+                    text = await response.text()
+                    status = response.status
+            except Exception as e:
+                # Errores de red/timeout: la orden pudo llegar a procesarse, no se repite
+                if attempt >= self.max_retries or _is_order(method, endpoint):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"AsyncCapitalClient: error de red en {method} {endpoint} ({e!r}); reintento en {delay:.2f}s.")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            if status < 400:
+                return json.loads(text) if text else {}
+            if status in (401, 403) and not reauthenticated:
+                reauthenticated = True
+                await self._reauthenticate(used_token)
+                continue
+            retryable = status == 429 or (status in RETRY_STATUS and not _is_order(method, endpoint))
+            if retryable and attempt < self.max_retries:
+                delay = self._backoff(attempt)
+                logger.warning(f"AsyncCapitalClient: HTTP {status} en {method} {endpoint}; reintento en {delay:.2f}s.")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            logger.error(f"ERROR HTTP en AsyncCapitalClient.request: {status} - {text}")
+            try:
+                payload = json.loads(text)
+            except ValueError:
+                payload = None
+            raise CapitalAPIError(status, text, payload)
+
+    # --- Endpoints (mismos nombres que CapitalComAPIClient) ---
+
+    async def get_market_data(self, epic):
+        return await self.request("GET", f"/markets/{epic}")
+
+    async def get_accounts(self):
+        return await self.request("GET", "/accounts")
+
+    async def get_open_positions(self):
+        return await self.request("GET", "/positions")
+
+    async def get_transaction_history(self, from_date):
+        return await self.request("GET", "/history/transactions", params={"from": from_date})
+
+    async def get_confirmation(self, deal_reference):
+        return await self.request("GET", f"/confirms/{deal_reference}")
+
+    async def place_market_order(self, epic, direction, size, stop_level=None, profit_level=None):
+        order_data = {"epic": epic, "direction": direction, "size": size, "accountId": self.account_id}
+        if stop_level is not None:
+            order_data["stopLevel"] = stop_level
+        if profit_level is not None:
+            order_data["profitLevel"] = profit_level
+        return await self.request("POST", "/positions", data=order_data)
+
+    async def amend_position(self, deal_id, new_stop_level, new_profit_level):
+        amend_data = {"stopLevel": new_stop_level, "profitLevel": new_profit_level}
+        return await self.request("PUT", f"/positions/{deal_id}", data=amend_data)
+
+    async def close_position(self, deal_id):
+        return await self.request("DELETE", f"/positions/{deal_id}")
+
+
+class CapitalAsyncBridge:
+    """
+    Expone AsyncCapitalClient con la interfaz síncrona de CapitalComAPIClient para que
+    TradingBot lo use sin cambios. Las corrutinas se ejecutan en un bucle de eventos
+    propio en un hilo de fondo, así que las llamadas de varios hilos (polling, monitor,
+    confirmación de órdenes) comparten el pool de conexiones y los límites de peticiones.
+    gather() lanza varias llamadas a la vez desde código síncrono.
+    """
+
+    def __init__(self, sync_client, call_timeout_seconds=60, **client_kwargs):
+        self.sync_client = sync_client
+        self.async_client = AsyncCapitalClient.from_sync(sync_client, **client_kwargs)
+        self.call_timeout_seconds = call_timeout_seconds
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="capital-async", daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        # Lo no implementado aquí (p. ej. get_all_markets, _set_active_account) va al cliente síncrono
+        return getattr(self.sync_client, name)
+
+    @property
+    def account_id(self):
+        return self.sync_client.account_id
+
+    @account_id.setter
+    def account_id(self, value):
+        self.sync_client.account_id = value
+        self.async_client.account_id = value
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout=self.call_timeout_seconds)
+
+    def gather(self, *coros):
+        """Ejecuta varias corrutinas del cliente a la vez; devuelve resultados o excepciones en orden."""
+        async def _gather():
+            return await asyncio.gather(*coros, return_exceptions=True)
+        return self.call(_gather())
+
+    def close(self):
+        try:
+            self.call(self.async_client.close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _make_authenticated_request(self, method, endpoint, params=None, data=None, is_retry=False):
+        return self.call(self.async_client.request(method, endpoint, params=params, data=data))
+
+    def get_market_data(self, epic):
+        return self.call(self.async_client.get_market_data(epic))
+
+    def get_accounts(self):
+        return self.call(self.async_client.get_accounts())
+
+    def get_open_positions(self):
+        return self.call(self.async_client.get_open_positions())
+
+    def get_transaction_history(self, from_date):
+        return self.call(self.async_client.get_transaction_history(from_date))
+
+    def place_market_order(self, epic, direction, size, stop_level=None, profit_level=None):
+        logger.debug(f"Llamada a place_market_order (async) - Epic: {epic}, Direction: {direction}, Size: {size}")
+        response = self.call(self.async_client.place_market_order(epic, direction, size, stop_level, profit_level))
+        logger.debug(f"Respuesta de la API de Capital.com: {response}")
+        return response
+
+    def amend_position(self, deal_id, new_stop_level, new_profit_level):
+        return self.call(self.async_client.amend_position(deal_id, new_stop_level, new_profit_level))
+
+    def close_position(self, deal_id):
+        return self.call(self.async_client.close_position(deal_id))
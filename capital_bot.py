@@ -1,3 +1,4 @@
+import atexit
 import logging
 import queue
 import logging
@@ -5,7 +6,7 @@ logging.basicConfig(level=logging.DEBUG) # Habilitar logging detallado para libr
 
 import json
 import inspect
-import glob
+import functools
 from strategies.utils import normalize_strategy_result
 import requests
 import time
@@ -13,21 +14,38 @@ import os
 import re
 from dotenv import load_dotenv
 load_dotenv()
-import importlib.util
 from datetime import datetime, timedelta
 import pandas as pd
 import ta
 import threading
-import csv
 from pycoingecko import CoinGeckoAPI
 import logging.handlers
 
-import numpy as np
-from utils.klines_utils import normalize_klines
+from utils.klines_utils import normalize_klines, INTERVAL_MS
+from utils.kline_gap_filler import KlineGapFiller
+from utils.kline_cache import KlineDiskCache, persist_kline_stores, warm_up_kline_stores
+from kline_archive import KlineArchive
 from utils.indicators import add_ema
+from utils.kline_store import KlineStore
+from utils.indicator_cache import IndicatorCache
+from utils.streaming_indicators import StreamingIndicatorEngine
+from utils.strategy_pool import StrategyPool, KlineSnapshot
+from utils.strategy_loader import load_strategy_classes
+from utils.trade_history import TRADE_HISTORY_FIELDNAMES, sanitize_for_json
+from utils.trade_store import TradeStore
+from utils.position_registry import OpenPositionRegistry
+from utils.instruments import KLINE_INTERVALS, load_instruments, resolve_epics, strategy_key, base_strategy_name
 from mcp_agent import MCPAgent
+from deal_confirmation import DealConfirmationService
+from capital_price_stream import CapitalPriceStream
+from market_metadata import MarketMetadataCache
+from sltp_advisor import SLTPAdvisor
+from trade_management import BatchTradeManager, parse_batch_decisions
+from llm_client import build_llm_client
+from trade_analytics import TradeAnalytics
+from telegram_gateway import TelegramGateway
 
-from binance_websocket_client import BinanceWebsocketClient
+from binance_websocket_client import BinanceCombinedStreamClient
 
 config_lock = threading.Lock()
 
@@ -60,20 +78,6 @@ ai_file_handler = logging.handlers.RotatingFileHandler(
 ai_file_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
 ai_logger.addHandler(ai_file_handler)
 
-def sanitize_for_json(data):
-    """Convierte recursivamente los tipos de NumPy a tipos nativos de Python para la serialización JSON."""
-    if isinstance(data, dict):
-        return {k: sanitize_for_json(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [sanitize_for_json(i) for i in data]
-    elif isinstance(data, np.bool_):
-        return bool(data)
-    elif isinstance(data, np.integer):
-        return int(data)
-    elif isinstance(data, np.floating):
-        return float(data)
-    return data
-
 def parse_float(value_str):
     if isinstance(value_str, (int, float)):
         return float(value_str)
@@ -111,26 +115,6 @@ def load_config(config_file="config.json"):
             logger.warning(f"ADVERTENCIA: Error al decodificar {config_file}. Se usarán los valores por defecto.")
             return {}
 
-def load_strategy_classes(strategy_dir="strategies"):
-    logger.debug(f"Loading strategy classes from {strategy_dir}.")
-    strategy_classes = {}
-    strategy_files = glob.glob(os.path.join(strategy_dir, "*.py"))
-    logger.debug(f"Archivos de estrategia encontrados: {strategy_files}") # DEBUG PRINT
-    for strategy_file in strategy_files:
-        module_name = os.path.splitext(os.path.basename(strategy_file))[0]
-        spec = importlib.util.spec_from_file_location(module_name, strategy_file)
-        if spec and spec.loader:
-            strategies_module = importlib.util.module_from_spec(spec)
-            try:
-                spec.loader.exec_module(strategies_module)
-                for name, obj in inspect.getmembers(strategies_module, inspect.isclass):
-                    if hasattr(obj, 'run') and obj.__module__ == strategies_module.__name__ and name != "BaseStrategy": # Añadido: y no es BaseStrategy
-                        strategy_classes[name] = obj # Return the class, not an instance
-                        logger.debug(f"Clase de estrategia cargada: {name}") # DEBUG PRINT
-            except Exception as e:
-                logger.error(f"Error al cargar '{strategy_file}': {e}")
-    return strategy_classes
-
 class CapitalComAPIClient: # (No changes in this class)
     def __init__(self, account_id=None): # Añadir account_id como parámetro opcional
         self.base_url = os.getenv("CAPITAL_BASE_URL")
@@ -171,7 +155,7 @@ class CapitalComAPIClient: # (No changes in this class)
             "encryptedPassword": False
         }
 
-        response = requests.post(f"{self.base_url}/session", json=login_data, headers=headers, timeout=10)
+        response = self.session.post(f"{self.base_url}/session", json=login_data, headers=headers, timeout=10)
 
         if response.status_code != 200:
             raise Exception(f"Error de autenticación: {response.status_code} - {response.text}")
@@ -212,10 +196,6 @@ class CapitalComAPIClient: # (No changes in this class)
         try:
             response = self.session.request(method, f"{self.base_url}{endpoint}", headers=headers, params=params, json=data, timeout=10)
             response.raise_for_status()
-            
-            if endpoint == "/markets":
-                logger.debug(f"Raw response for /markets: {response.text}") # DEBUG PRINT
-
             return response.json()
         except requests.exceptions.HTTPError as e:
             logger.error(f"ERROR HTTP en _make_authenticated_request: {e.response.status_code} - {e.response.text}") # Added detailed error logging
@@ -231,6 +211,13 @@ class CapitalComAPIClient: # (No changes in this class)
         """
         return self._make_authenticated_request("GET", "/markets")
 
+    def search_markets(self, search_term):
+        """
+        Busca mercados por texto (nombre, símbolo...) sin descargar la lista completa.
+        API: GET /markets?searchTerm=...
+        """
+        return self._make_authenticated_request("GET", "/markets", params={"searchTerm": search_term})
+
     def get_accounts(self):
         """
         Obtiene una lista de todas las cuentas asociadas al usuario autenticado.
@@ -245,10 +232,11 @@ class CapitalComAPIClient: # (No changes in this class)
         logger.debug(f"Llamada a place_market_order - Epic: {epic}, Direction: {direction}, Size: {size}")
         order_data = {"epic": epic, "direction": direction, "size": size, "accountId": self.account_id}
         
+        # Los niveles llegan ya redondeados al tick del mercado (MarketMetadataCache.round_price)
         if stop_level is not None:
-            order_data["stopLevel"] = round(stop_level, 2)
+            order_data["stopLevel"] = stop_level
         if profit_level is not None:
-            order_data["profitLevel"] = round(profit_level, 2)
+            order_data["profitLevel"] = profit_level
 
         logger.debug(f"Datos de la orden a enviar: {order_data}")
         response = self._make_authenticated_request("POST", "/positions", data=order_data)
@@ -256,9 +244,7 @@ class CapitalComAPIClient: # (No changes in this class)
         return response
 
     def amend_position(self, deal_id, new_stop_level, new_profit_level):
-        logger.debug(f"Intentando modificar posición {deal_id} con SL: {new_stop_level:.2f}, TP: {new_profit_level:.2f}")
-        new_stop_level = round(new_stop_level, 2)
-        new_profit_level = round(new_profit_level, 2)
+        logger.debug(f"Intentando modificar posición {deal_id} con SL: {new_stop_level}, TP: {new_profit_level}")
         amend_data = {"stopLevel": new_stop_level, "profitLevel": new_profit_level}
         logger.debug(f"Datos de modificación enviados para {deal_id}: {amend_data}")
         response = self._make_authenticated_request("PUT", f"/positions/{deal_id}", data=amend_data)
@@ -275,9 +261,14 @@ class CapitalComAPIClient: # (No changes in this class)
 class BinanceAPIClient:
     def __init__(self, api_key, api_secret):
         from binance.client import Client
-        self.client = Client(api_key, api_secret)
-    def get_historical_klines(self, symbol, interval, limit):
-        klines = self.client.get_historical_klines(symbol, interval, limit=limit)
+        try:
+            # Sin el ping de arranque (versiones recientes de python-binance)
+            self.client = Client(api_key, api_secret, ping=False)
+        except TypeError:
+            self.client = Client(api_key, api_secret)
+    def get_historical_klines(self, symbol, interval, limit, start_time=None, end_time=None):
+        # start_time/end_time en ms: con start_time, python-binance pagina de `limit` en `limit` hasta end_time
+        klines = self.client.get_historical_klines(symbol, interval, start_str=start_time, end_str=end_time, limit=limit)
         # Devolver un formato más estándar con claves 'open_time', 'open', 'high', 'low', 'close', 'volume'
         return {'prices': [{"open_time": k[0], "open": float(k[1]), "high": float(k[2]), "low": float(k[3]), "close": float(k[4]), "volume": float(k[5])} for k in klines]}
 
@@ -304,31 +295,33 @@ class CoinGeckoAPIClient:
             return {'prices': []}
 
 class TelegramListener:
+    # Espera tras un error de red antes de volver a hacer long polling
+    ERROR_BACKOFF_SECONDS = 5
+
     def __init__(self, trading_bot):
         self.bot = trading_bot
-        self.bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+        self.gateway = trading_bot.telegram
         self.running = False
         self.update_id = 0
+        self.thread = None
     def start(self):
-        if not self.bot_token: return
-        self._clear_webhook()
+        if not self.gateway.bot_token: return
+        self.gateway.delete_webhook()
         self.running = True
         self.thread = threading.Thread(target=self._run_loop, daemon=True)
         self.thread.start()
         logger.info("Oyente de Telegram iniciado.")
     def stop(self):
         self.running = False
-        if self.thread and self.thread.is_alive(): self.thread.join()
-    def _clear_webhook(self):
-        url = f"https://api.telegram.org/bot{self.bot_token}/setWebhook?url="
-        try:
-            return requests.get(url, timeout=10).json().get('ok')
-        except Exception: pass
+        # El hilo puede estar esperando en un long poll; es daemon, no se espera a que termine
+        if self.thread and self.thread.is_alive(): self.thread.join(timeout=1)
     def _get_updates(self):
-        url = f"https://api.telegram.org/bot{self.bot_token}/getUpdates?offset={self.update_id + 1}&timeout=5"
         try:
-            return requests.get(url, timeout=10).json().get('result', [])
-        except Exception: return []
+            return self.gateway.get_updates(self.update_id + 1)
+        except Exception as e:
+            logger.warning(f"Error al consultar actualizaciones de Telegram: {e}")
+            time.sleep(self.ERROR_BACKOFF_SECONDS)
+            return []
     def _get_commands_message(self):
         commands_list = [
             "/list: Muestra el estado actual de todas las estrategias.",
@@ -420,42 +413,31 @@ class TelegramListener:
             
             self.bot._send_telegram_notification(response_message, parse_mode=parse_mode_arg)
     def _run_loop(self):
+        # Long polling: getUpdates responde en cuanto llega un mensaje, sin esperas fijas entre consultas
         while self.running:
             updates = self._get_updates()
             if updates: self._process_updates(updates)
-            time.sleep(2)
 
 
 
 class TradingBot:
-    TRADE_HISTORY_FIELDNAMES = [
-        "open_time", "strategy", "epic", "direction", "size",
-        "entry_price", "stop_level", "profit_level",
-        "dealReference", "dealId", "status", "profit_loss",
-        "close_time", "close_price", "entry_conditions",
-        "exit_conditions", "exit_reason", "tp_sl_against_trend_active", "sl_moved_to_be", "break_even_profit_pct",
-        "current_trend", "atr_5m"
-    ]
+    TRADE_HISTORY_FIELDNAMES = TRADE_HISTORY_FIELDNAMES
 
     BOT_STATUS_FILE = "bot_status.json"
-
-    def _send_telegram_notification(self, message, parse_mode=None):
+    KLINE_STORE_CAPACITY = 2000
+    # Espera máxima por un cierre de vela antes de evaluar todas las estrategias igualmente
+    KLINE_EVENT_FALLBACK_SECONDS = 60
+    # Margen tras el primer cierre para agrupar los cierres simultáneos (p. ej. 1m y 5m)
+    KLINE_EVENT_COALESCE_SECONDS = 1.0
+    # Marca en pending_kline_intervals: hay ticks nuevos de la vela en curso (modo partial_klines)
+    PARTIAL_TICK = "partial"
+    # Cada cuánto se guardan los KlineStore en la caché de disco (además de al parar)
+    KLINE_CACHE_SAVE_SECONDS = 15 * 60
+
+    def _send_telegram_notification(self, message, parse_mode=None, coalesce=False):
+        """Encola el mensaje en la pasarela de Telegram; no bloquea al hilo que notifica."""
         logger.debug(f"Attempting to send Telegram message: {message}")
-        bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        chat_id = os.getenv("TELEGRAM_CHAT_ID")
-        if not bot_token or not chat_id:
-            logger.error("TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID not set in .env file.")
-            return
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        payload = {"chat_id": chat_id, "text": message}
-        if parse_mode:
-            payload["parse_mode"] = parse_mode
-        try:
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
-            logger.debug("Telegram message sent successfully.")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"--- ERROR TELEGRAM: No se pudo enviar la notificación: {e} ---")
+        self.telegram.send(message, parse_mode=parse_mode, coalesce=coalesce)
 
     def _save_status(self):
         try:
@@ -478,12 +460,39 @@ class TradingBot:
         self.last_trade_time = {}
         self.strategy_signals = {}
         self.config = load_config()
+        # Pasarela de Telegram: cola de salida con hilo propio y long polling para los comandos
+        self.telegram = TelegramGateway.from_settings(self.config.get("global_settings", {}))
+        # Al salir del proceso (no en /stop) se envían los avisos que queden en la cola
+        atexit.register(self.telegram.stop)
+        if self.config.get("global_settings", {}).get("capital_async_client", False):
+            # Cliente asyncio con pool keep-alive y límites de peticiones, con la misma interfaz síncrona
+            from capital_async_client import CapitalAsyncBridge
+            self.capital_client_api = CapitalAsyncBridge(self.capital_client_api)
+        # Un único hilo resuelve las confirmaciones de todas las órdenes (sin un hilo por orden)
+        self.deal_confirmations = DealConfirmationService(self.capital_client_api)
+        # Multiplicadores SL/TP de la IA cacheados y refrescados en segundo plano
+        self.sltp_advisor = SLTPAdvisor(
+            self.get_ai_sl_tp,
+            ttl_seconds=self.config.get("global_settings", {}).get("ai_sl_tp_ttl_minutes", 360) * 60,
+            max_concurrent=self.config.get("global_settings", {}).get("ai_sl_tp_workers", 2),
+        )
+        # Gestión por IA de las posiciones abiertas: una petición por ciclo y solo con las que han cambiado
+        self.trade_manager = BatchTradeManager(
+            self.get_ai_trade_management_decisions, self._apply_trade_decision,
+            price_step_atr=self.config.get("global_settings", {}).get("ai_trade_management_price_step_atr", 0.25),
+            max_age_seconds=self.config.get("global_settings", {}).get("ai_trade_management_max_age_minutes", 30) * 60,
+        )
         self.aggressiveness_level = self.config.get("global_settings", {}).get("aggressiveness_level", 3)
         self.enable_tp_sl_against_trend = self.config.get("global_settings", {}).get("enable_tp_sl_against_trend", False)
         self.enable_two_tp_trades = self.config.get("global_settings", {}).get("enable_two_tp_trades", False)
         self.global_order_size = self.config.get("global_settings", {}).get("global_order_size", 0.0015)
         self.prevent_counter_trend_trades = self.config.get("global_settings", {}).get("prevent_counter_trend_trades", True)
-        self.mcp_agent = MCPAgent(self.capital_client_api, self.binance_client_api, self.config)
+        # Archivo histórico en disco (un fichero por día) alimentado con las velas cerradas del WebSocket
+        self.kline_archive = KlineArchive(self.config.get("global_settings", {}).get("kline_archive_dir", "kline_archive"))
+        # Cliente LLM compartido (Gemini o backend local sin red) con caché de respuestas y métricas
+        self.llm_client = build_llm_client(self.config.get("global_settings", {}))
+        self.mcp_agent = MCPAgent(self.capital_client_api, self.binance_client_api, self.config,
+                                  kline_archive=self.kline_archive, llm_client=self.llm_client)
         accounts = self.capital_client_api.get_accounts()
         self.account_id = None
         target_account_name = "bot"
@@ -503,26 +512,30 @@ class TradingBot:
         logger.debug(f"self.account_id final: {self.account_id}")
         self.capital_client_api.account_id = self.account_id
         self.capital_client_api._set_active_account()
-        all_markets = self.capital_client_api.get_all_markets()
-        self.btc_epic = None
-        for market in all_markets.get('markets', []):
-            if market.get('instrumentName') == "Bitcoin/USD":
-                self.btc_epic = market.get('epic')
-                break
-        
-        if not self.btc_epic:
-            raise ValueError("No se pudo encontrar el EPIC para BTC/USD en Capital.com. Asegúrate de que el símbolo sea correcto o que el mercado esté disponible.")
+        # Epics y reglas de cada mercado por búsquedas puntuales, con caché en disco (sin descargar /markets)
+        metadata_ttl_hours = self.config.get("global_settings", {}).get("market_metadata_ttl_hours", 24)
+        self.market_metadata = MarketMetadataCache(self.capital_client_api, ttl_seconds=metadata_ttl_hours * 3600)
+        # Instrumentos operados (global_settings.instruments); el primero es el principal
+        self.instruments = resolve_epics(load_instruments(self.config.get("global_settings", {}).get("instruments")), self.market_metadata)
+        for instrument in self.instruments:
+            self.market_metadata.get(instrument.epic)
+        self.primary_instrument = self.instruments[0]
+        self.instruments_by_epic = {instrument.epic: instrument for instrument in self.instruments}
+        self.btc_epic = self.primary_instrument.epic
+        logger.info(f"Instrumentos: {', '.join(f'{i.symbol} -> {i.epic}' for i in self.instruments)}")
+
+        # Bid/offer en vivo por websocket (una conexión para todos los epics); si el stream está desactivado o parado se consulta por REST
+        self.price_stream = CapitalPriceStream(self.capital_client_api, [instrument.epic for instrument in self.instruments])
+        if self.config.get("global_settings", {}).get("capital_price_stream", True):
+            self.price_stream.start()
 
-        self.available_strategies = {}
         strategy_classes = load_strategy_classes("strategies")
-        for name, strategy_class in strategy_classes.items():
-            strategy_config = self.config.get(name, {})
-            aggressiveness = strategy_config.get("aggressiveness_level", self.aggressiveness_level)
-            self.available_strategies[name] = strategy_class(strategy_config, aggressiveness_level=aggressiveness)
-
+        self.available_strategies, self.strategy_instruments = self._build_strategies(strategy_classes)
+        for name in self.available_strategies:
             # Inicializar self.strategy_signals para cada estrategia
             self.strategy_signals[name] = {"signal": "HOLD", "message": "Inicializando...", "detailed_status": {}} # Añadido
 
+        for name, strategy_class in strategy_classes.items():
             if name not in self.config:
                 default_params = get_default_strategy_params(strategy_class)
                 self.config[name] = default_params
@@ -534,12 +547,20 @@ class TradingBot:
         
         self.active_strategies = {}
         for name, instance in self.available_strategies.items():
-            if self.config.get(name, {}).get("is_active", True):
+            if self.config.get(base_strategy_name(name), {}).get("is_active", True):
                 self.active_strategies[name] = instance
-        self.csv_lock, self.trade_history_file = threading.Lock(), "trade_history.csv"
+        self.trade_history_file = "trade_history.csv"
+        # Historial con índice en memoria: aperturas añadidas al CSV y cierres en un journal
+        self.trade_store = TradeStore(self.trade_history_file, columnar_path="trade_history.parquet")
         self.signals_lock = threading.Lock() # New line
-        self.open_trades = {} # NEW
+        # Posiciones abiertas por estrategia y por dealId, reconstruidas desde el historial al arrancar
+        self.open_positions = OpenPositionRegistry(self.trade_store.open_trades())
+        # Agregados por estrategia de las operaciones cerradas, actualizados con cada cierre
+        self.trade_analytics = TradeAnalytics(self.trade_store.closed_trades())
+        # Aperturas pendientes por estrategia: desde que se envía la orden hasta que su confirmación
+        # queda registrada en open_positions (o falla). Mientras haya alguna, la estrategia no abre otra
         self.opening_trade = {}
+        self.opening_lock = threading.Lock()
         self.strategy_types = {
             "LadisLong": "scalping",
             "LadisLongLite": "scalping",
@@ -553,33 +574,60 @@ class TradingBot:
             "GabinalongShort": "scalping", # Assuming this is also scalping
             "Guillermoshort": "scalping", # Assuming this is also scalping
         }
-        self.kline_queues = {
-            '1m': queue.Queue(),
-            '5m': queue.Queue(),
-            '30m': queue.Queue()
-        }
-        self.binance_ws_clients = {}
-        self.klines_data = {interval: [] for interval in self.kline_queues.keys()}
-        for interval in self.kline_queues.keys():
-            # Pre-fill with historical data
-            try:
-                initial_klines = self.binance_client_api.get_historical_klines("BTCUSDT", interval, limit=1000).get("prices", [])
-                self.klines_data[interval].extend(initial_klines)
-            except Exception as e:
-                logger.error(f"Error al precargar datos históricos para {interval}: {e}")
+        # Un store y una cola por (símbolo, intervalo) de cada instrumento; el WebSocket y los pools son compartidos
+        self.kline_queues = {(instrument.symbol, interval): queue.Queue() for instrument in self.instruments for interval in KLINE_INTERVALS}
+        # Intervalos con velas cerradas pendientes de evaluar (los rellena el callback del WebSocket)
+        self.kline_event = threading.Condition()
+        # Contexto por hilo de evaluación: partial=True si la estrategia ve la vela en curso
+        self.eval_context = threading.local()
+        self.last_partial_signal = 0.0
+        self.strategy_pool = None
+        self.pending_kline_intervals = set()
+        self.kline_stores = {(symbol, interval): KlineStore(symbol, interval, capacity=self.KLINE_STORE_CAPACITY) for symbol, interval in self.kline_queues.keys()}
+        # Las velas del WebSocket pasan por el gap filler: si falta alguna se rellena por REST antes de entregarlas
+        self.kline_gap_filler = KlineGapFiller(self.binance_client_api, self.kline_queues, on_close=self._on_kline_closed)
+        # Una sola conexión y un solo hilo para todas las parejas (símbolo, intervalo)
+        on_partial = self._on_partial_kline if self.config.get("global_settings", {}).get("partial_klines", False) else None
+        self.binance_stream = BinanceCombinedStreamClient(data_queues=self.kline_queues, on_close=self._on_kline_closed,
+                                                          gap_filler=self.kline_gap_filler, on_partial=on_partial)
+        # Pre-fill with historical data: todos los pares a la vez y, con la caché en disco, solo el delta
+        self.kline_cache = KlineDiskCache(self.config.get("global_settings", {}).get("kline_cache_dir", "kline_cache"))
+        warm_up_kline_stores(self.binance_client_api, self.kline_stores, self.kline_cache, limit=1000)
+        self.last_kline_cache_save = time.monotonic()
+        for symbol, interval in self.kline_queues.keys():
+            # La vela en curso del histórico no está cerrada: la primera vela del WebSocket la sustituye
+            last_open_time = self.kline_stores[(symbol, interval)].last_open_time()
+            if last_open_time is not None:
+                self.kline_gap_filler.seed(symbol, interval, last_open_time - INTERVAL_MS[interval])
+            self.binance_stream.subscribe(symbol, interval)
+        self.binance_stream.start()
+        # Caché de indicadores compartida por todas las estrategias en cada ciclo de polling
+        self.indicator_cache = IndicatorCache(self.kline_stores)
+        # Indicadores incrementales (O(1) por vela cerrada), sembrados con el histórico precargado
+        self.streaming_indicators = StreamingIndicatorEngine(self.kline_stores)
 
-            ws_client = BinanceWebsocketClient(symbol="BTCUSDT", interval=interval, data_queue=self.kline_queues[interval])
-            ws_client.start()
-            self.binance_ws_clients[interval] = ws_client
-
-        if not os.path.exists(self.trade_history_file):
-            with open(self.trade_history_file, "w", newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.TRADE_HISTORY_FIELDNAMES)
-                writer.writeheader()
         self.monitor_cooldown, self.last_monitor_time = timedelta(seconds=60), datetime.min
         logger.debug(f"DEBUG: self.running antes de start_polling(): {self.running}") # DEBUG PRINT
         self.start_polling()
 
+    def _build_strategies(self, strategy_classes):
+        """
+        Una instancia por estrategia e instrumento: en el principal conserva el nombre de la
+        estrategia y en los demás se llama 'Nombre:SÍMBOLO'. Todas leen la misma sección de
+        config.json. Devuelve ({nombre: instancia}, {nombre: Instrument}).
+        """
+        strategies, instruments = {}, {}
+        for index, instrument in enumerate(self.instruments):
+            for name, strategy_class in strategy_classes.items():
+                if not instrument.runs(name):
+                    continue
+                strategy_config = self.config.get(name, {})
+                aggressiveness = strategy_config.get("aggressiveness_level", self.aggressiveness_level)
+                key = strategy_key(name, instrument, primary=index == 0)
+                strategies[key] = strategy_class(strategy_config, aggressiveness_level=aggressiveness)
+                instruments[key] = instrument
+        return strategies, instruments
+
     def set_strategy(self, strategy_name, enable=True):
         if enable:
             if strategy_name in self.available_strategies and strategy_name not in self.active_strategies:
@@ -634,15 +682,10 @@ class TradingBot:
         self.config = load_config()
         self.aggressiveness_level = self.config.get("global_settings", {}).get("aggressiveness_level", self.aggressiveness_level)
 
-        new_available_strategies = {}
         strategy_classes = load_strategy_classes("strategies")
-        for name, strategy_class in strategy_classes.items():
-            strategy_config = self.config.get(name, {})
-            logger.debug(f"Recargando estrategia {name} con config: {strategy_config}")
-            aggressiveness = strategy_config.get("aggressiveness_level", self.aggressiveness_level)
-            new_available_strategies[name] = strategy_class(strategy_config, aggressiveness_level=aggressiveness)
-        
-        self.available_strategies = new_available_strategies
+        for name in strategy_classes:
+            logger.debug(f"Recargando estrategia {name} con config: {self.config.get(name, {})}")
+        self.available_strategies, self.strategy_instruments = self._build_strategies(strategy_classes)
 
         new_active_strategies = {}
         for name, instance in self.active_strategies.items():
@@ -652,10 +695,12 @@ class TradingBot:
         logger.info("Configuración de estrategias recargada.")
 
     def delete_strategy(self, strategy_name):
-        if strategy_name in self.active_strategies:
-            del self.active_strategies[strategy_name]
-            if strategy_name in self.strategy_signals:
-                del self.strategy_signals[strategy_name]
+        # Se borra la estrategia en todos los instrumentos
+        strategy_name = base_strategy_name(strategy_name)
+        for name in [name for name in self.active_strategies if base_strategy_name(name) == strategy_name]:
+            del self.active_strategies[name]
+            if name in self.strategy_signals:
+                del self.strategy_signals[name]
 
         if strategy_name in self.config:
             del self.config[strategy_name]
@@ -671,134 +716,86 @@ class TradingBot:
         return f"Estrategia '{strategy_name}' eliminada correctamente."
 
     def clear_trade_history(self):
-        with self.csv_lock:
-            if os.path.exists(self.trade_history_file):
-                os.remove(self.trade_history_file)
-            with open(self.trade_history_file, "w", newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.TRADE_HISTORY_FIELDNAMES)
-                writer.writeheader()
+        self.trade_store.clear()
+        self.open_positions.rebuild(())
+        self.trade_analytics.rebuild(())
         return "Historial de operaciones limpiado y reseteado."
 
     def get_trade_history(self, limit=5):
         history_message = "<b>Historial de Operaciones Recientes</b>\n\n"
         try:
-            with self.csv_lock:
-                if not os.path.exists(self.trade_history_file) or os.path.getsize(self.trade_history_file) == 0:
-                    return history_message + "No hay operaciones registradas aún."
-                
-                df = pd.read_csv(self.trade_history_file, on_bad_lines='skip')
-                if df.empty:
-                    return history_message + "No hay operaciones registradas aún."
-                
-                df['open_time'] = pd.to_datetime(df['open_time'])
-                df = df.sort_values(by='open_time', ascending=False)
-                
-                for index, row in df.head(limit).iterrows():
-                    status_emoji = "✅" if row['status'] == 'CLOSED' and row['profit_loss'] > 0 else ("❌" if row['status'] == 'CLOSED' and row['profit_loss'] <= 0 else "⏳")
-                    profit_loss_str = f"{row['profit_loss']:.2f}" if pd.notna(row['profit_loss']) else "N/A"
-                    
-                    history_message += f"{status_emoji} <b>{row['strategy']}</b> ({row['direction']}) - {row['epic']}\n"
-                    history_message += f"  Apertura: {row['open_time'].strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    history_message += f"  Estado: {row['status']}\n"
-                    if row['status'] == 'CLOSED':
-                        history_message += f"  P/L: {profit_loss_str}\n"
-                    history_message += "\n"
-                
-                return history_message
+            trades = self.trade_store.recent(limit)
+            if not trades:
+                return history_message + "No hay operaciones registradas aún."
+
+            for row in trades:
+                profit_loss = row['profit_loss']
+                status_emoji = "✅" if row['status'] == 'CLOSED' and (profit_loss or 0) > 0 else ("❌" if row['status'] == 'CLOSED' else "⏳")
+                profit_loss_str = f"{profit_loss:.2f}" if profit_loss is not None else "N/A"
+
+                history_message += f"{status_emoji} <b>{row['strategy']}</b> ({row['direction']}) - {row['epic']}\n"
+                history_message += f"  Apertura: {pd.to_datetime(row['open_time']).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                history_message += f"  Estado: {row['status']}\n"
+                if row['status'] == 'CLOSED':
+                    history_message += f"  P/L: {profit_loss_str}\n"
+                history_message += "\n"
+
+            return history_message
         except Exception as e:
             return history_message + f"Error al cargar el historial: {e}"
 
     def get_performance_summary(self):
         summary_message = "<b>Resumen de Rendimiento</b>\n\n"
         try:
-            with self.csv_lock:
-                if not os.path.exists(self.trade_history_file) or os.path.getsize(self.trade_history_file) == 0:
-                    return summary_message + "No hay operaciones registradas para analizar."
-                
-                df = pd.read_csv(self.trade_history_file, on_bad_lines='skip')
-                df = df[df['status'] == 'CLOSED'].copy()
-                
-                if df.empty:
-                    return summary_message + "No hay operaciones cerradas para analizar."
-                
-                total_pnl = df['profit_loss'].sum()
-                total_trades = len(df)
-                winning_trades = df[df['profit_loss'] > 0]
-                win_rate = (len(winning_trades) / total_trades * 100) if total_trades > 0 else 0
-                
-                summary_message += f"<b>Rendimiento General:</b>\n"
-                summary_message += f"  P/L Total: {total_pnl:.2f}\n"
-                summary_message += f"  Total Operaciones Cerradas: {total_trades}\n"
-                summary_message += f"  Tasa de Acierto: {win_rate:.2f}%\n\n"
-                
-                summary_message += "<b>Rendimiento por Estrategia:</b>\n"
-                performance_by_strategy = df.groupby('strategy')['profit_loss'].agg(['sum', 'count', lambda x: (x > 0).sum()]).reset_index()
-                performance_by_strategy.columns = ['strategy', 'total_pnl', 'trade_count', 'win_count']
-                
-                for index, row in performance_by_strategy.iterrows():
-                    strategy_win_rate = (row['win_count'] / row['trade_count'] * 100) if row['trade_count'] > 0 else 0
-                    summary_message += f"  <b>{row['strategy']}:</b>\n"
-                    summary_message += f"    P/L: {row['total_pnl']:.2f}\n"
-                    summary_message += f"    Operaciones: {row['trade_count']}\n"
-                    summary_message += f"    Tasa de Acierto: {strategy_win_rate:.2f}%\n"
-                
-                return summary_message
+            if not len(self.trade_store):
+                return summary_message + "No hay operaciones registradas para analizar."
+
+            total_pnl, total_trades, winning_trades = self.trade_analytics.totals()
+            if not total_trades:
+                return summary_message + "No hay operaciones cerradas para analizar."
+            win_rate = winning_trades / total_trades * 100
+            
+            summary_message += f"<b>Rendimiento General:</b>\n"
+            summary_message += f"  P/L Total: {total_pnl:.2f}\n"
+            summary_message += f"  Total Operaciones Cerradas: {total_trades}\n"
+            summary_message += f"  Tasa de Acierto: {win_rate:.2f}%\n\n"
+            
+            summary_message += "<b>Rendimiento por Estrategia:</b>\n"
+            for strategy, stats in self.trade_analytics.strategy_summaries().items():
+                summary_message += f"  <b>{strategy}:</b>\n"
+                summary_message += f"    P/L: {stats['pnl_total']:.2f}\n"
+                summary_message += f"    Operaciones: {stats['operaciones']}\n"
+                summary_message += f"    Tasa de Acierto: {stats['tasa_acierto'] or 0:.2f}%\n"
+            
+            return summary_message
         except Exception as e:
             return summary_message + f"Error al generar resumen de rendimiento: {e}"
 
     def get_ai_analysis(self):
         ai_analysis_message = "<b>Análisis de IA</b>\n\n"
         try:
-            with self.csv_lock:
-                if not os.path.exists(self.trade_history_file) or os.path.getsize(self.trade_history_file) == 0:
-                    return ai_analysis_message + "No hay operaciones registradas para analizar."
-                df = pd.read_csv(self.trade_history_file, on_bad_lines='skip')
-
-            df.fillna("N/A", inplace=True)
-
-            trade_history_simplified = []
-            cols_to_include = ['strategy', 'open_time', 'direction', 'entry_price', 'close_price', 'profit_loss', 'status', 'exit_reason']
-            
-            for col in cols_to_include:
-                if col not in df.columns:
-                    df[col] = "N/A"
-
-            for index, row in df.tail(20).iterrows():
-                entry_price = f"{row['entry_price']:.2f}" if isinstance(row['entry_price'], (int, float)) else row['entry_price']
-                close_price = f"{row['close_price']:.2f}" if isinstance(row['close_price'], (int, float)) else row['close_price']
-                profit_loss = f"{row['profit_loss']:.2f}" if isinstance(row['profit_loss'], (int, float)) else row['profit_loss']
-                trade_info = (
-                    f"Estrategia: {row['strategy']}, "
-                    f"Apertura: {row['open_time']}, "
-                    f"Dirección: {row['direction']}, "
-                    f"Entrada: {entry_price}, "
-                    f"Cierre: {close_price}, "
-                    f"P/L: {profit_loss}, "
-                    f"Estado: {row['status']}, "
-                    f"Razón Cierre: {row['exit_reason']}"
-                )
-                trade_history_simplified.append(trade_info)
-            
-            trade_history_csv = "\n".join(trade_history_simplified)
+            if not len(self.trade_store):
+                return ai_analysis_message + "No hay operaciones registradas para analizar."
 
+            # Agregados incrementales y una muestra de las últimas cerradas: el prompt no crece con el historial
             performance_summary = self.get_performance_summary()
+            strategy_aggregates = json.dumps(self.trade_analytics.strategy_summaries(), indent=1, default=str)
+            trade_sample = "\n".join(json.dumps(trade, default=str) for trade in self.trade_analytics.sample_recent(20))
             strategy_configs = json.dumps(self.config, indent=2)
-            
-            open_positions_df = df[df['status'] == 'OPEN']
+
             open_positions_simplified = []
-            for index, row in open_positions_df.tail(20).iterrows():
+            for row in self.open_positions.trades()[-20:]:
                 entry_price = f"{row['entry_price']:.2f}" if isinstance(row['entry_price'], (int, float)) else row['entry_price']
                 trade_info = (
                     f"Estrategia: {row['strategy']}, "
-                    f"Apertura: {row['open_time']}, "
+                    f"Apertura: {row.get('open_time', 'N/A')}, "
                     f"Dirección: {row['direction']}, "
                     f"Entrada: {entry_price}"
                 )
                 open_positions_simplified.append(trade_info)
             open_positions_info = "\n".join(open_positions_simplified) if open_positions_simplified else "Ninguna"
 
-            market_data = self.capital_client_api.get_market_data(epic=self.btc_epic)
-            current_price = market_data.get('snapshot', {}).get('bid', 'N/A')
+            current_price = self.price_stream.snapshot(self.btc_epic).get('bid', 'N/A')
 
             # Add strategy source code to the prompt
             strategy_source_code = ""
@@ -828,11 +825,15 @@ class TradingBot:
             <b>Resumen de Rendimiento General y por Estrategia:</b>
             {performance_summary}
 
+            <b>Estadísticas Acumuladas por Estrategia (operaciones cerradas):</b>
+            Incluye P/L, tasa de acierto total y de las últimas operaciones, resultados por dirección, motivos de salida, % de veces que cada condición de entrada se cumplía en ganadoras (win) y perdedoras (loss) y valores medios de los indicadores al entrar.
+            {strategy_aggregates}
+
             <b>Configuración Actual de Parámetros por Estrategia:</b>
             {strategy_configs}
 
-            <b>Historial Completo de Operaciones:</b>
-            {trade_history_csv}
+            <b>Muestra de Operaciones Cerradas Recientes:</b>
+            {trade_sample}
 
             <b>Operaciones Actualmente Abiertas:</b>
             {open_positions_info}
@@ -853,21 +854,9 @@ class TradingBot:
 
             logger.debug(f"Prompt para Gemini: {prompt}")
 
-            gemini_api_key = os.getenv("GEMINI_API_KEY")
-            if not gemini_api_key:
-                return "<b>Análisis de IA</b>\n\nError: La clave GEMINI_API_KEY no está configurada en el archivo .env"
+            content = self.llm_client.complete(prompt, task="analysis")
 
-            api_url = f"https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent?key={gemini_api_key}"
-            headers = {'Content-Type': 'application/json'}
-            data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-            response = requests.post(api_url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-
-            result = response.json()
-            content = result['candidates'][0]['content']['parts'][0]['text']
-            
-            return f"<b>Análisis de IA (Gemini)</b>\n\n{content}"
+            return f"<b>Análisis de IA ({self.llm_client.backend.label})</b>\n\n{content}"
 
         except Exception as e:
             return ai_analysis_message + f"Error al generar análisis de IA: {e}"
@@ -875,12 +864,36 @@ class TradingBot:
     def manage_open_trade(self, trade, strategy_type):
         try:
             logger.debug(f"Gestionando operación abierta: {trade['dealId']}")
-            decision_data = self.get_ai_trade_management_decision(trade.to_dict(), strategy_type)
+            decision_data = self.get_ai_trade_management_decision(dict(trade), strategy_type)
 
             if not decision_data:
                 logger.warning(f"No se pudo obtener una decisión de la IA para la operación {trade['dealId']}. No se tomarán acciones.")
                 return
 
+            self._apply_trade_decision(trade, decision_data)
+        except Exception as e:
+            logger.error(f"Error al gestionar la operación abierta {trade['dealId']}: {e}")
+
+    def manage_open_trades(self, trades):
+        """Gestión por IA de todas las posiciones abiertas con una sola petición (solo las que han cambiado)."""
+        positions = []
+        for trade in trades:
+            position = dict(trade)
+            position["strategy_type"] = self.strategy_types.get(base_strategy_name(trade["strategy"]), "desconocido")
+            try:
+                position["current_price"] = self.price_stream.mid_price(trade["epic"])
+            except Exception as e:
+                logger.debug(f"Sin precio actual para {trade['dealId']}: {e}")
+                position["current_price"] = None
+            positions.append(position)
+        try:
+            applied = self.trade_manager.run(positions)
+            logger.debug(f"Gestión IA por lotes: {applied} decisiones aplicadas de {len(positions)} posiciones.")
+        except Exception as e:
+            logger.error(f"Error en la gestión por lotes de las operaciones abiertas: {e}")
+
+    def _apply_trade_decision(self, trade, decision_data):
+        try:
             decision = decision_data.get("decision")
             reason = decision_data.get("reason")
             ai_logger.info(f"Decisión de la IA para {trade['dealId']}: {decision}. Razón: {reason}")
@@ -898,9 +911,11 @@ class TradingBot:
                     else: # SELL
                         final_sl = trade['entry_price'] * (1 + sl_pct / 100)
                         final_tp = trade['entry_price'] * (1 - tp_pct / 100)
+                    final_sl = self.market_metadata.round_price(trade['epic'], final_sl)
+                    final_tp = self.market_metadata.round_price(trade['epic'], final_tp)
 
                     self.capital_client_api.amend_position(trade['dealId'], final_sl, final_tp)
-                    ai_logger.info(f"Posición {trade['dealId']} modificada. Nuevo SL: {final_sl:.2f}, Nuevo TP: {final_tp:.2f}")
+                    ai_logger.info(f"Posición {trade['dealId']} modificada. Nuevo SL: {final_sl}, Nuevo TP: {final_tp}")
                 else:
                     ai_logger.warning(f"La IA decidió ajustar SL/TP para {trade['dealId']} pero no proporcionó nuevos multiplicadores.")
 
@@ -909,7 +924,42 @@ class TradingBot:
                 ai_logger.info(f"Posición {trade['dealId']} cerrada por decisión de la IA.")
 
         except Exception as e:
-            logger.error(f"Error al gestionar la operación abierta {trade['dealId']}: {e}")
+            logger.error(f"Error al aplicar la decisión de la IA a la operación {trade['dealId']}: {e}")
+
+    def get_ai_trade_management_decisions(self, positions):
+        """Una sola consulta a la IA para varias posiciones; devuelve {dealId: decisión}."""
+        positions_json = json.dumps(sanitize_for_json(positions), indent=2, default=str)
+        prompt = f"""Eres un experto en gestión de riesgos para un bot de trading de criptomonedas. Tu tarea es decidir, para cada una de las operaciones abiertas, si mantenerla, ajustar el SL/TP o cerrarla, basándote en los datos de la operación, el precio actual y el tipo de estrategia.
+
+            **Instrucciones:**
+            1.  Analiza cada operación abierta por separado.
+            2.  Decide la mejor acción para cada una: "HOLD" (mantener), "ADJUST_SLTP" (ajustar SL/TP), or "CLOSE" (cerrar).
+            3.  Si la decisión es "ADJUST_SLTP", proporciona los nuevos `sl_multiplier` y `tp_multiplier`.
+            4.  Proporciona una breve `reason` para cada decisión.
+            5.  Devuelve una lista JSON con exactamente un elemento por `dealId`.
+
+            **Operaciones Abiertas:**
+            {positions_json}
+
+            **Formato de Salida (JSON):**
+            ```json
+            [
+                {{
+                    "dealId": "<dealId de la operación>",
+                    "decision": "<HOLD|ADJUST_SLTP|CLOSE>",
+                    "reason": "<Tu razonamiento aquí>",
+                    "sl_multiplier": <nuevo_valor_si_ajustas>,
+                    "tp_multiplier": <nuevo_valor_si_ajustas>
+                }}
+            ]
+            ```
+            """
+
+        ai_logger.info(f"Prompt para decisión de gestión de {len(positions)} trades:\n{prompt}")
+
+        decisions = self.llm_client.complete_json(prompt, task="trade_management_batch", timeout=60)
+        ai_logger.info(f"Respuesta de la IA para decisión de gestión de trades:\n{decisions}")
+        return parse_batch_decisions(decisions, {position["dealId"] for position in positions})
 
     def get_ai_trade_management_decision(self, trade_data, strategy_type):
         try:
@@ -939,38 +989,17 @@ class TradingBot:
 
             ai_logger.info(f"Prompt para decisión de gestión de trade:\n{prompt}")
 
-            gemini_api_key = os.getenv("GEMINI_API_KEY")
-            if not gemini_api_key:
-                logger.error("GEMINI_API_KEY no encontrada en .env")
-                return None
-
-            api_url = f"https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent?key={gemini_api_key}"
-            headers = {'Content-Type': 'application/json'}
-            data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-            response = requests.post(api_url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-
-            result = response.json()
-            content = result['candidates'][0]['content']['parts'][0]['text']
-            ai_logger.info(f"Respuesta de la IA para decisión de gestión de trade:\n{content}")
-            
-            json_match = re.search(r"```json\n(.*?)\n```", content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                decision = json.loads(json_str)
-                return decision
-            else:
-                logger.error(f"No se pudo encontrar JSON en la respuesta de Gemini para gestión de trade: {content}")
-                return None
+            decision = self.llm_client.complete_json(prompt, task="trade_management")
+            ai_logger.info(f"Respuesta de la IA para decisión de gestión de trade:\n{decision}")
+            return decision if isinstance(decision, dict) else None
 
         except Exception as e:
             logger.error(f"Error al obtener decisión de gestión de trade de la IA: {e}")
             return None
 
-    def get_ai_sl_tp(self, result_queue, strategy_name, direction, entry_price, current_trend, atr_5m, strategy_type):
-        try:
-            prompt = f"""Eres un experto en gestión de riesgos para un bot de trading de criptomonedas. Tu tarea es determinar los multiplicadores de Stop Loss (SL) y Take Profit (TP) para una operación específica, basados en la estrategia, las condiciones del mercado, la volatilidad y el tipo de estrategia.
+    def get_ai_sl_tp(self, strategy_name, direction, entry_price, current_trend, atr_5m, strategy_type):
+        """Consulta a la IA los multiplicadores de SL/TP; la llama SLTPAdvisor en segundo plano."""
+        prompt = f"""Eres un experto en gestión de riesgos para un bot de trading de criptomonedas. Tu tarea es determinar los multiplicadores de Stop Loss (SL) y Take Profit (TP) para una operación específica, basados en la estrategia, las condiciones del mercado, la volatilidad y el tipo de estrategia.
 
             **Instrucciones:**
             1.  Analiza los datos de la operación.
@@ -999,60 +1028,87 @@ class TradingBot:
             ```
             """
 
-            gemini_api_key = os.getenv("GEMINI_API_KEY")
-            if not gemini_api_key:
-                logger.error("GEMINI_API_KEY no encontrada en .env")
-                result_queue.put((None, None))
-                return
-
-            api_url = f"https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent?key={gemini_api_key}"
-            headers = {'Content-Type': 'application/json'}
-            data = {"contents": [{"parts": [{"text": prompt}]}]}
+        multipliers = self.llm_client.complete_json(prompt, task="sl_tp")
+        return multipliers.get("sl_multiplier"), multipliers.get("tp_multiplier")
 
-            response = requests.post(api_url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
+    def _on_kline_closed(self, symbol, interval, kline):
+        """Callback del WebSocket: despierta al bucle de estrategias al cerrar una vela."""
+        with self.kline_event:
+            self.pending_kline_intervals.add((symbol, interval))
+            self.kline_event.notify_all()
 
-            result = response.json()
-            content = result['candidates'][0]['content']['parts'][0]['text']
-            
-            # Extract the JSON from the response
-            json_match = re.search(r"```json\n(.*?)\n```", content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                multipliers = json.loads(json_str)
-                result_queue.put((multipliers.get("sl_multiplier"), multipliers.get("tp_multiplier")))
-            else:
-                logger.error(f"No se pudo encontrar JSON en la respuesta de Gemini para SL/TP: {content}")
-                result_queue.put((None, None))
+    def _on_partial_kline(self, symbol, interval, kline):
+        """
+        Callback del WebSocket con cada tick de la vela en curso: actualiza la fila cabeza del
+        store y, como mucho una vez cada partial_eval_seconds, despierta al bucle para evaluar
+        las estrategias con evaluate_on_partial.
+        """
+        store = self.kline_stores.get((symbol, interval))
+        if store is None or not store.set_partial(kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v']):
+            return
+        throttle = self.config.get("global_settings", {}).get("partial_eval_seconds", 5)
+        now = time.monotonic()
+        if now - self.last_partial_signal < throttle:
+            return
+        if not any(getattr(instance, "evaluate_on_partial", False) for instance in self.active_strategies.values()):
+            return
+        self.last_partial_signal = now
+        with self.kline_event:
+            self.pending_kline_intervals.add(self.PARTIAL_TICK)
+            self.kline_event.notify_all()
 
-        except Exception as e:
-            logger.error(f"Error al obtener SL/TP de la IA: {e}")
-            result_queue.put((None, None))
+    def _wait_for_closed_klines(self):
+        """
+        Espera al cierre de una vela. Devuelve el conjunto de (símbolo, intervalo) cerrados, o None
+        si venció KLINE_EVENT_FALLBACK_SECONDS sin eventos (se evalúan todas las estrategias).
+        """
+        with self.kline_event:
+            if not self.pending_kline_intervals:
+                self.kline_event.wait_for(lambda: self.pending_kline_intervals or not self.running, timeout=self.KLINE_EVENT_FALLBACK_SECONDS)
+            if not self.pending_kline_intervals:
+                return None
+        time.sleep(self.KLINE_EVENT_COALESCE_SECONDS)
+        with self.kline_event:
+            intervals = set(self.pending_kline_intervals)
+            self.pending_kline_intervals.clear()
+        return intervals
+
+    def _monitor_loop(self):
+        """Monitoriza las posiciones abiertas en su propio temporizador, independiente de las velas."""
+        while self.running:
+            try:
+                if datetime.now() - self.last_monitor_time > self.monitor_cooldown:
+                    self.last_monitor_time = datetime.now()
+                    self._monitor_open_positions()
+            except Exception as e:
+                logger.error(f"ERROR en el bucle de monitorización de posiciones: {e}")
+            time.sleep(5)
 
-    def _get_binance_klines_data(self, symbol, interval, limit):
+    def _drain_kline_queue(self, symbol, interval):
+        # Solo desde el hilo de polling: si dos hilos vaciaran la misma cola a la vez, el que
+        # añadiera después una vela más antigua la perdería (KlineStore.append la rechaza)
+        store = self.kline_stores[(symbol.upper(), interval)]
         # Get new klines from the queue
-        while not self.kline_queues[interval].empty():
-            kline = self.kline_queues[interval].get()
-            
-            # Convert kline to the same format as historical klines
-            formatted_kline = {
-                "open_time": kline['t'],
-                "open": float(kline['o']),
-                "high": float(kline['h']),
-                "low": float(kline['l']),
-                "close": float(kline['c']),
-                "volume": float(kline['v'])
-            }
-
-            # Append the new kline to the historical data
-            self.klines_data[interval].append(formatted_kline)
+        while True:
+            try:
+                kline = self.kline_queues[(symbol.upper(), interval)].get_nowait()
+            except queue.Empty:
+                break
+            # Append the new kline to the ring buffer (O(1), the oldest one is overwritten)
+            if store.append(kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v']):
+                self.streaming_indicators.on_kline(symbol, interval, kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v'])
+                self.kline_archive.record(symbol, interval, kline)
+        return store
 
-            # Keep the list of klines at a reasonable size
-            if len(self.klines_data[interval]) > 2000:
-                self.klines_data[interval].pop(0)
+    def _get_binance_klines_data(self, symbol, interval, limit):
+        # Solo lectura: las estrategias se evalúan en el pool y el hilo de polling ya vació
+        # las colas antes de repartirlas
+        store = self.kline_stores[(symbol.upper(), interval)]
 
-        # Return the last `limit` klines
-        return {'prices': self.klines_data[interval][-limit:]}
+        # Return the last `limit` klines as a DataFrame (normalize_klines accepts it directly);
+        # en una evaluación sobre la vela en curso, esa vela es la última fila
+        partial = getattr(self.eval_context, "partial", False)
+        return {'prices': store.to_dataframe(limit, partial=partial)}
 
     def get_historical_data_from_binance(self, symbol, interval, limit):
         try:
@@ -1074,12 +1130,25 @@ class TradingBot:
         self._save_status()
         try:
             threading.Thread(target=self._polling_loop, daemon=True).start()
+            threading.Thread(target=self._monitor_loop, daemon=True).start()
             logger.debug("DEBUG: Hilo de polling intentado iniciar.") # DEBUG PRINT
         except Exception as e:
             logger.error(f"ERROR: No se pudo iniciar el hilo de polling: {e}")
 
     def stop_polling(self):
         self.running = False
+        try:
+            self.kline_archive.flush()
+        except Exception as e:
+            logger.error(f"Error al guardar las velas pendientes en el archivo histórico: {e}")
+        persist_kline_stores(self.kline_stores, self.kline_cache)
+        self.sltp_advisor.shutdown()
+        self.trade_manager.shutdown()
+        if self.strategy_pool is not None:
+            self.strategy_pool.shutdown()
+            self.strategy_pool = None
+        with self.kline_event:
+            self.kline_event.notify_all()
         self._save_status()
 
     def start_app(self):
@@ -1094,6 +1163,13 @@ class TradingBot:
         self.stop_polling()
         return "Bot detenido correctamente."
 
+    def _order_size(self, epic):
+        """Tamaño de orden del instrumento (order_size en instruments) o, si no tiene, global_order_size."""
+        instrument = self.instruments_by_epic.get(epic)
+        if instrument is not None and instrument.order_size:
+            return instrument.order_size
+        return self.global_order_size
+
     def set_global_order_size(self, new_size):
         with config_lock:
             self.config["global_settings"]["global_order_size"] = new_size
@@ -1119,40 +1195,28 @@ class TradingBot:
             logger.error(f"Error al cerrar operaciones para la estrategia {strategy_name}: {e}")
             return f"Error al cerrar operaciones para la estrategia {strategy_name}."
 
+    def reload_trade_history(self):
+        """Relee el historial (p. ej. tras sustituir el CSV desde el dashboard) y reconstruye las posiciones abiertas."""
+        self.trade_store.reload()
+        self.open_positions.rebuild(self.trade_store.open_trades())
+        self.trade_analytics.rebuild(self.trade_store.closed_trades())
+
     def has_open_trade(self, strategy_name):
-        with self.signals_lock:
-            return strategy_name in self.open_trades and self.open_trades[strategy_name]
+        return self.open_positions.has_strategy(strategy_name)
 
     def _monitor_open_positions(self):
-        dtype_spec = {'dealId': 'object', 'close_time': 'object', 'close_price': 'object', 'profit_loss': 'object', 'entry_conditions': 'object', 'exit_conditions': 'object', 'exit_reason': 'object', 'tp_sl_against_trend_active': 'bool'}
-        open_trades = pd.DataFrame()
         try:
-            with self.csv_lock:
-                if not os.path.exists(self.trade_history_file) or os.path.getsize(self.trade_history_file) == 0:
-                    with open(self.trade_history_file, "w", newline='') as f:
-                        writer = csv.DictWriter(f, fieldnames=self.TRADE_HISTORY_FIELDNAMES)
-                        writer.writeheader()
-                    trades_df = pd.DataFrame(columns=self.TRADE_HISTORY_FIELDNAMES)
-                else:
-                    try:
-                        trades_df = pd.read_csv(self.trade_history_file, dtype=dtype_spec, on_bad_lines='skip')
-                        if 'break_even_profit_pct' not in trades_df.columns: trades_df['break_even_profit_pct'] = 0.0
-                        if 'sl_moved_to_be' not in trades_df.columns: trades_df['sl_moved_to_be'] = False
-                        if 'tp_sl_against_trend_active' not in trades_df.columns: trades_df['tp_sl_against_trend_active'] = False
-                        trades_df['sl_moved_to_be'] = trades_df['sl_moved_to_be'].fillna(False).astype(bool)
-                        trades_df['tp_sl_against_trend_active'] = trades_df['tp_sl_against_trend_active'].replace({np.nan: False}).astype(bool)
-                    except pd.errors.EmptyDataError:
-                        with open(self.trade_history_file, "w", newline='') as f:
-                            writer = csv.DictWriter(f, fieldnames=self.TRADE_HISTORY_FIELDNAMES)
-                            writer.writeheader()
-                        trades_df = pd.DataFrame(columns=self.TRADE_HISTORY_FIELDNAMES)
-            open_trades = trades_df[(trades_df['status'] == 'OPEN') & (trades_df['dealId'].notna())]
-            logger.debug(f"open_trades (from CSV):\n{open_trades}")
-            if open_trades.empty: return
+            # Solo las posiciones abiertas, desde el registro en memoria
+            open_trades = self.open_positions.trades()
+            logger.debug(f"open_trades (from registry): {[trade['dealId'] for trade in open_trades]}")
+            if not open_trades: return
 
             if self.config.get("global_settings", {}).get("enable_ai_trade_management", False):
-                for index, trade in open_trades.iterrows():
-                    self.manage_open_trade(trade, self.strategy_types.get(trade["strategy"], "desconocido"))
+                if self.config.get("global_settings", {}).get("ai_trade_management_batch", True):
+                    self.manage_open_trades(open_trades)
+                else:
+                    for trade in open_trades:
+                        self.manage_open_trade(trade, self.strategy_types.get(base_strategy_name(trade["strategy"]), "desconocido"))
 
             api_positions = self.capital_client_api.get_open_positions().get('positions', [])
             logger.debug(f"api_positions (from API): {api_positions}")
@@ -1162,14 +1226,13 @@ class TradingBot:
                 if 'position' in pos and 'dealId' in pos['position']:
                     open_api_deal_ids.add(pos['position']['dealId'])
             
-            closed_trades_deal_ids = set(open_trades['dealId']) - open_api_deal_ids
+            closed_trades_deal_ids = {trade['dealId'] for trade in open_trades} - open_api_deal_ids
             logger.debug(f"closed_trades_deal_ids: {closed_trades_deal_ids}")
 
             if not closed_trades_deal_ids: return
 
             from_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S')
             transactions = self.capital_client_api.get_transaction_history(from_date).get('transactions', [])
-            updates_made = False
             for deal_id in closed_trades_deal_ids:
                 logger.debug(f"Procesando deal_id en closed_trades_deal_ids: {deal_id}")
                 for trx in transactions:
@@ -1180,69 +1243,81 @@ class TradingBot:
                         logger.debug(f"Transacción de cierre: {trx}")
                         close_price = parse_float(trx.get('price', pd.NA))
                         
-                        trade_row = trades_df[trades_df['dealId'] == deal_id].iloc[0]
+                        trade_row = self.open_positions.get(deal_id) or self.trade_store.get(deal_id)
                         strategy_name = trade_row['strategy']
                         trade_epic = trade_row['epic']
                         trade_direction = trade_row['direction']
-                        stop_level = trade_row['stop_level']
-                        profit_level = trade_row['profit_level']
+                        stop_level = trade_row.get('stop_level')
+                        profit_level = trade_row.get('profit_level')
 
                         exit_reason = "Manual/Other"
-                        if pd.notna(close_price) and pd.notna(stop_level) and pd.notna(profit_level):
+                        if pd.notna(close_price) and stop_level is not None and profit_level is not None:
                             if abs(close_price - stop_level) < 0.01 * stop_level:
                                 exit_reason = "Stop Loss"
                             elif abs(close_price - profit_level) < 0.01 * profit_level:
                                 exit_reason = "Take Profit"
 
                         instance = self.available_strategies.get(strategy_name)
-                        exit_conditions = self._get_current_detailed_status(trade_epic, "BTCUSDT", trade_direction, instance)
-
-                        trades_df.loc[trades_df['dealId'] == deal_id, ['status', 'profit_loss', 'close_time', 'close_price', 'exit_conditions', 'exit_reason']] = ['CLOSED', pnl, close_time, close_price, json.dumps(sanitize_for_json(exit_conditions)), exit_reason]
-                        updates_made = True
+                        instrument = self.instruments_by_epic.get(trade_epic, self.primary_instrument)
+                        exit_conditions = self._get_current_detailed_status(trade_epic, instrument.symbol, trade_direction, instance)
+
+                        self.trade_store.update(
+                            deal_id, status='CLOSED', profit_loss=pnl, close_time=close_time, close_price=close_price,
+                            exit_conditions=json.dumps(sanitize_for_json(exit_conditions)), exit_reason=exit_reason
+                        )
+                        self.trade_analytics.record_close(self.trade_store.get(deal_id))
                         
                         self._send_telegram_notification(f"<b>Operación Cerrada ({strategy_name})</b>\n" \
                                                    f"<b>Deal ID:</b> {deal_id}\n" \
                                                    f"<b>Resultado:</b> {pnl:+.2f} {currency}\n" \
                                                    f"<b>Precio Cierre:</b> {close_price:.2f}\n" \
-                                                   f"<b>Motivo:</b> {exit_reason}")
-                        with self.signals_lock:
-                            if strategy_name in self.open_trades and deal_id in self.open_trades[strategy_name]:
-                                self.open_trades[strategy_name].remove(deal_id)
+                                                   f"<b>Motivo:</b> {exit_reason}", coalesce=True)
+                        self.open_positions.remove(deal_id)
                         break
-            if updates_made:
-                with self.csv_lock:
-                    trades_df.to_csv(self.trade_history_file, index=False)
         except Exception as e:
             logger.error(f"--- [MONITOR] ERROR CRÍTICO durante el ciclo de monitoreo: {e} ---")
 
-    def _process_new_trade(self, deal_reference, strategy_name, direction, size, sl_pct, tp_pct, current_trend, atr_5m):
+    def _opening_started(self, strategy_name):
+        with self.opening_lock:
+            self.opening_trade[strategy_name] = self.opening_trade.get(strategy_name, 0) + 1
+
+    def _opening_finished(self, strategy_name):
+        """Termina una apertura pendiente (registrada o fallida); con dos TP puede quedar la otra."""
+        with self.opening_lock:
+            self.opening_trade[strategy_name] = max(0, self.opening_trade.get(strategy_name, 0) - 1)
+
+    def _process_new_trade(self, deal_reference, strategy_name, epic, direction, size, sl_pct, tp_pct, current_trend, atr_5m):
+        """Encola la orden en el servicio de confirmaciones; SL/TP y registro se hacen al confirmarse."""
+        try:
+            self.deal_confirmations.submit(deal_reference, functools.partial(
+                self._on_deal_confirmed, strategy_name=strategy_name, epic=epic, direction=direction, size=size,
+                sl_pct=sl_pct, tp_pct=tp_pct, current_trend=current_trend, atr_5m=atr_5m
+            ))
+        except Exception as e:
+            logger.error(f"--- ERROR en _process_new_trade para {deal_reference}: {e} ---")
+            self._opening_finished(strategy_name)
+
+    def _on_deal_confirmed(self, deal_reference, confirmation, error, strategy_name, epic, direction, size, sl_pct, tp_pct, current_trend, atr_5m):
         try:
             if self.enable_tp_sl_against_trend and \
                ((direction == "BUY" and current_trend == "bearish") or \
                 (direction == "SELL" and current_trend == "bullish")):
                 logger.debug(f"Aplicando regla SL=TP para {direction} en tendencia {current_trend}.")
                 tp_pct = sl_pct
-            
-            timeout, start_time = 120, time.time()
+
             deal_id, real_entry_price = None, None
-            confirmation = None
-            while time.time() - start_time < timeout:
-                confirmation = self.capital_client_api._make_authenticated_request("GET", f"/confirms/{deal_reference}")
-                if confirmation.get('status') == 'OPEN' and confirmation.get('affectedDeals'):
-                    deal_info = confirmation['affectedDeals'][0]
-                    deal_id = deal_info['dealId']
-                    real_entry_price = confirmation.get('level')
-                    break
-                time.sleep(2)
+            if confirmation and confirmation.get('status') == 'OPEN' and confirmation.get('affectedDeals'):
+                deal_id = confirmation['affectedDeals'][0]['dealId']
+                real_entry_price = confirmation.get('level')
 
             if not deal_id or not real_entry_price:
-                logger.error(f"ERROR: No se pudo confirmar la operación {deal_reference} a tiempo.")
+                reason = error or (confirmation or {}).get('reason') or (confirmation or {}).get('dealStatus')
+                logger.error(f"ERROR: No se pudo confirmar la operación {deal_reference} a tiempo ({reason}).")
                 return
 
-            with self.signals_lock:
-                if strategy_name not in self.open_trades:
-                    self.open_trades[strategy_name] = []
-                self.open_trades[strategy_name].append(deal_id)
+            # La posición entra en open_positions junto con su fila del historial (al final);
+            # hasta entonces la apertura sigue pendiente en opening_trade (se libera en el finally)
+            open_time_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
             if direction == "BUY":
                 final_sl = real_entry_price * (1 - sl_pct)
@@ -1250,19 +1325,21 @@ class TradingBot:
             else: # SELL
                 final_sl = real_entry_price * (1 + sl_pct)
                 final_tp = real_entry_price * (1 - tp_pct)
+            final_sl = self.market_metadata.round_price(epic, final_sl)
+            final_tp = self.market_metadata.round_price(epic, final_tp)
 
             amend_response = self.capital_client_api.amend_position(deal_id, final_sl, final_tp)
             if amend_response and "dealReference" in amend_response:
                 logger.debug(f"Amend OK para {strategy_name}: {amend_response}")
-                logger.debug(f"Posición {deal_id} modificada con SL: {final_sl:.2f} y TP: {final_tp:.2f}")
+                logger.debug(f"Posición {deal_id} modificada con SL: {final_sl} y TP: {final_tp}")
 
-                open_time_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 self._send_telegram_notification(
                     f"<b>Orden Abierta ({strategy_name})</b>\n" \
                     f"<b>Hora:</b> {open_time_str}\n" \
                     f"<b>Dirección:</b> {direction}\n" \
                     f"<b>Precio Entrada Real:</b> {real_entry_price:.2f}\n" \
-                    f"<b>Deal ID:</b> {deal_id}"
+                    f"<b>Deal ID:</b> {deal_id}",
+                    coalesce=True
                 )
             else:
                 logger.error(f"ERROR: No se pudo modificar la posición {deal_id} con SL/TP. Respuesta: {amend_response}")
@@ -1272,7 +1349,7 @@ class TradingBot:
                 )
 
             trade_info = {
-                "open_time": open_time_str, "strategy": strategy_name, "epic": self.btc_epic, 
+                "open_time": open_time_str, "strategy": strategy_name, "epic": epic, 
                 "direction": direction, "size": size, "entry_price": real_entry_price, 
                 "stop_level": final_sl, "profit_level": final_tp, "dealReference": deal_reference, 
                 "dealId": deal_id, "status": "OPEN", "profit_loss": pd.NA, "close_time": pd.NA, 
@@ -1284,183 +1361,270 @@ class TradingBot:
                 "current_trend": current_trend,
                 "atr_5m": atr_5m
             }
-            with self.csv_lock:
-                file_exists = os.path.isfile(self.trade_history_file)
-                with open(self.trade_history_file, "a", newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=self.TRADE_HISTORY_FIELDNAMES)
-                    if not file_exists: writer.writeheader()
-                    writer.writerow(trade_info)
+            self.open_positions.add(self.trade_store.append(trade_info))
 
         except Exception as e:
-            logger.error(f"--- ERROR en _process_new_trade para {deal_reference}: {e} ---")
+            logger.error(f"--- ERROR en _on_deal_confirmed para {deal_reference}: {e} ---")
         finally:
-            self.opening_trade[strategy_name] = False
+            self._opening_finished(strategy_name)
+
+    def _get_strategy_pool(self):
+        """Pool de evaluación de estrategias, configurable en global_settings."""
+        settings = self.config.get("global_settings", {})
+        workers = settings.get("strategy_workers", 4)
+        executor = settings.get("strategy_executor", "thread")
+        timeout_seconds = settings.get("strategy_timeout_seconds", 15)
+        pool = self.strategy_pool
+        if pool is None or (pool.workers, pool.mode) != (max(1, int(workers)), "process" if executor == "process" else "thread"):
+            if pool is not None:
+                pool.shutdown()
+            pool = self.strategy_pool = StrategyPool(workers, executor, timeout_seconds)
+            logger.info(f"Pool de estrategias: {pool.mode} con {pool.workers} workers (timeout {timeout_seconds}s).")
+        pool.timeout_seconds = timeout_seconds
+        return pool
+
+    def _kline_snapshot(self, partial=False):
+        """Copia de las velas del ciclo para evaluar estrategias en otro proceso."""
+        return KlineSnapshot({key: store.to_dataframe(partial=partial) for key, store in self.kline_stores.items()})
+
+    def _strategy_can_trade(self, name, now, cooldown):
+        if self.opening_trade.get(name):
+            logger.debug(f"Estrategia '{name}' ya tiene una operación en proceso de apertura. Saltando.")
+            return False
+        if self.has_open_trade(name):
+            logger.debug(f"Estrategia '{name}' ya tiene una operación abierta. Saltando.")
+            return False
+        if self.last_trade_time.get(name) and (now - self.last_trade_time[name]) < cooldown:
+            return False
+        return True
+
+    def _act_on_strategy_signal(self, name, instance, result, now, epic, preliminary_price, current_trend):
+        """Abre la(s) operación(es) de una señal BUY/SELL. Se ejecuta siempre en el hilo de polling."""
+        signal_text = self.strategy_signals[name].get("signal", "HOLD")
+        direction = None
+        if signal_text.startswith("BUY"): direction = "BUY"
+        elif signal_text.startswith("SELL"): direction = "SELL"
+
+        if direction:
+            # Intentar obtener sl_pct y tp_pct directamente de la estrategia
+            sl_pct = result.get("sl_pct")
+            tp_pct = result.get("tp_pct")
+
+            atr_5m_value = self.strategy_signals[name].get("detailed_status", {}).get("ATR", 0.0)
+
+            # Si la estrategia no proporcionó SL/TP válidos: último consejo de la IA o config.json, sin esperar a la red
+            if sl_pct is None or tp_pct is None or sl_pct == 0.0 or tp_pct == 0.0:
+                sl_multiplier, tp_multiplier, source = self.sltp_advisor.advise(
+                    name, direction, current_trend, atr_5m_value, preliminary_price,
+                    default=(instance.sl_multiplier, instance.tp_multiplier),
+                    strategy_type=self.strategy_types.get(base_strategy_name(name), "desconocido"),
+                )
+                logger.debug(f"Multiplicadores SL/TP para {name} ({source}): {sl_multiplier}, {tp_multiplier}")
+
+                sl_pct = (sl_multiplier * atr_5m_value / preliminary_price)
+                tp_pct = (tp_multiplier * atr_5m_value / preliminary_price)
+
+            if sl_pct is None or tp_pct is None or sl_pct == 0.0 or tp_pct == 0.0:
+                logger.error(f"Estrategia '{name}' devolvió 'sl_pct' o 'tp_pct' inválidos (None o 0.0). Saltando trade.")
+                self.strategy_signals[name]['signal'] = "ERROR"
+                self.strategy_signals[name]['message'] = "La estrategia devolvió sl_pct o tp_pct inválidos"
+                return
+                                
+            if self.prevent_counter_trend_trades:
+                if (direction == "BUY" and current_trend == "bearish"):
+                    logger.info(f"Trade de COMPRA bloqueado para '{name}' por tendencia principal bajista.")
+                    self.strategy_signals[name]['signal'] = "HOLD"
+                    self.strategy_signals[name]['message'] = f"Trade de COMPRA bloqueado por tendencia principal bajista."
+                    return
+                if (direction == "SELL" and current_trend == "bullish"):
+                    logger.info(f"Trade de VENTA bloqueado para '{name}' por tendencia principal alcista.")
+                    self.strategy_signals[name]['signal'] = "HOLD"
+                    self.strategy_signals[name]['message'] = f"Trade de VENTA bloqueado por tendencia principal alcista."
+                    return
+
+            order_size = self._order_size(epic)
+            order_problem = self.market_metadata.validate_order(epic, order_size)
+            if order_problem:
+                logger.warning(f"Trade de '{name}' no enviado: {order_problem}")
+                self.strategy_signals[name]['signal'] = "HOLD"
+                self.strategy_signals[name]['message'] = f"Orden no enviada: {order_problem}"
+                return
+
+            apply_sl_tp_against_trend_rule = self.enable_tp_sl_against_trend and \
+               ((direction == "BUY" and current_trend == "bearish") or \
+                (direction == "SELL" and current_trend == "bullish"))
+
+            def open_single_trade(tp_modifier=0, atr_5m=None):
+                # La apertura queda pendiente hasta que _on_deal_confirmed registra la posición
+                self._opening_started(name)
+                try:
+                    return send_order(tp_modifier, atr_5m)
+                except Exception:
+                    self._opening_finished(name)
+                    raise
+
+            def send_order(tp_modifier, atr_5m):
+                current_tp_pct = tp_pct + tp_modifier
+                if apply_sl_tp_against_trend_rule:
+                    current_tp_pct = sl_pct
+
+                if direction == "BUY":
+                    preliminary_sl = preliminary_price * (1 - sl_pct / 100)
+                    preliminary_tp = preliminary_price * (1 + current_tp_pct / 100)
+                else: # SELL
+                    preliminary_sl = preliminary_price * (1 + sl_pct / 100)
+                    preliminary_tp = preliminary_price * (1 - current_tp_pct / 100)
+                preliminary_sl = self.market_metadata.round_price(epic, preliminary_sl)
+                preliminary_tp = self.market_metadata.round_price(epic, preliminary_tp)
+
+                logger.debug(f"preliminary_price: {preliminary_price}, sl_pct: {sl_pct}, tp_pct: {current_tp_pct}, preliminary_sl: {preliminary_sl}, preliminary_tp: {preliminary_tp}")
+
+                response = self.capital_client_api.place_market_order(
+                    epic, direction, order_size,
+                    stop_level=preliminary_sl, profit_level=preliminary_tp
+                )
+
+                if "dealReference" in response:
+                    self.last_trade_time[name] = now
+                    self._process_new_trade(
+                        response["dealReference"], name, epic, direction, order_size,
+                        sl_pct, current_tp_pct, current_trend, atr_5m
+                    )
+                    return True
+                else:
+                    self._opening_finished(name)
+                    logger.error(f"ERROR: No se pudo abrir la operación para {name} (TP mod: {tp_modifier}).")
+                    return False
+
+            if apply_sl_tp_against_trend_rule or not self.enable_two_tp_trades:
+                open_single_trade(atr_5m=atr_5m_value)
+            else:
+                open_single_trade(atr_5m=atr_5m_value)
+                time.sleep(1)
+                open_single_trade(tp_modifier=-0.10, atr_5m=atr_5m_value)
+
+    def _instrument_market_state(self, instrument):
+        """(precio medio de Capital.com, tendencia 30m) del instrumento, o None si no hay precio."""
+        market_data = self.price_stream.snapshot(instrument.epic)
+        current_bid = market_data.get('bid')
+        current_offer = market_data.get('offer')
+        if not current_bid or not current_offer:
+            logger.error(f"ERROR: No se pudo obtener el precio de mercado de {instrument.epic} para el cálculo preliminar de SL/TP.")
+            return None
+
+        preliminary_price = (current_bid + current_offer) / 2
+
+        # Tendencia 30m con la EMA30 incremental: sin construir DataFrames en cada ciclo
+        store_30m = self._drain_kline_queue(instrument.symbol, "30m")
+        current_trend = "neutral"
+        if len(store_30m) >= 30:
+            close_30m = float(store_30m.tail(1)["close"][-1])
+            ema30_30m = self.streaming_indicators.latest(instrument.symbol, "30m", "EMA", 30)
+            if close_30m > ema30_30m:
+                current_trend = "bullish"
+            elif close_30m < ema30_30m:
+                current_trend = "bearish"
+
+        logger.debug(f"Tendencia actual de {instrument.symbol} (30m): {current_trend}")
+        return preliminary_price, current_trend
 
     def _polling_loop(self):
         print("DEBUG: _polling_loop iniciado.") # DEBUG PRINT
         cooldown = timedelta(minutes=5)
         while self.running:
+            closed_intervals = self._wait_for_closed_klines()
+            if not self.running:
+                break
+            partial_tick = closed_intervals is not None and self.PARTIAL_TICK in closed_intervals
+            if partial_tick:
+                closed_intervals.discard(self.PARTIAL_TICK)
             try:
-                logger.info("--- INICIO CICLO POLLING ---")
+                if partial_tick and not closed_intervals:
+                    logger.info("--- INICIO CICLO POLLING (vela en curso) ---")
+                else:
+                    logger.info(f"--- INICIO CICLO POLLING (velas cerradas: {sorted(closed_intervals) if closed_intervals else 'ninguna, evaluación por tiempo'}) ---")
+                self.indicator_cache.new_cycle()
                 now = datetime.now()
-                if now - self.last_monitor_time > self.monitor_cooldown:
-                    self._monitor_open_positions()
                 
-                market_data = self.capital_client_api.get_market_data(epic=self.btc_epic)['snapshot']
-                current_bid = market_data.get('bid')
-                current_offer = market_data.get('offer')
-                if not current_bid or not current_offer:
-                    logger.error("ERROR: No se pudo obtener el precio de mercado para el cálculo preliminar de SL/TP.")
-                    time.sleep(20)
+                # Precio preliminar y tendencia de cada instrumento; sin precio no se evalúan sus estrategias
+                market = {}
+                for instrument in self.instruments:
+                    try:
+                        state = self._instrument_market_state(instrument)
+                    except Exception as e:
+                        logger.error(f"ERROR obteniendo el estado de mercado de {instrument.symbol}: {e}")
+                        continue
+                    if state is not None:
+                        market[instrument.symbol] = state
+                if not market:
                     continue
-                
-                preliminary_price = (current_bid + current_offer) / 2
 
-                klines_30m = self._get_binance_klines_data("BTCUSDT", "30m", limit=50).get("prices", [])
-                df_30m = normalize_klines(klines_30m, min_length=30)
-                
-                current_trend = "neutral"
-                if not df_30m.empty:
-                    df_30m = add_ema(df_30m, 30)
-                    latest_30m = df_30m.iloc[-1]
-                    if latest_30m["close"] > latest_30m["EMA30"]:
-                        current_trend = "bullish"
-                    elif latest_30m["close"] < latest_30m["EMA30"]:
-                        current_trend = "bearish"
-                
-                logger.debug(f"Tendencia actual (30m): {current_trend}")
-                
+                # 1) Seleccionar las estrategias a evaluar (guardas comprobados en este hilo)
+                pool = self._get_strategy_pool()
+                for symbol, interval in self.kline_queues.keys():
+                    self._drain_kline_queue(symbol, interval)
+                if time.monotonic() - self.last_kline_cache_save > self.KLINE_CACHE_SAVE_SECONDS:
+                    self.last_kline_cache_save = time.monotonic()
+                    persist_kline_stores(self.kline_stores, self.kline_cache)
+                snapshot = self._kline_snapshot() if pool.mode == "process" else None
+                partial_snapshot = None
+                submitted = []
+                submitted_instruments = {}
                 for name, instance in list(self.active_strategies.items()):
-                    logger.debug(f"Procesando estrategia: {name}")
-                    if self.opening_trade.get(name):
-                        logger.debug(f"Estrategia '{name}' ya tiene una operación en proceso de apertura. Saltando.")
+                    instrument = self.strategy_instruments.get(name, self.primary_instrument)
+                    if instrument.symbol not in market:
                         continue
-
-                    if self.has_open_trade(name):
-                        logger.debug(f"Estrategia '{name}' ya tiene una operación abierta. Saltando.")
+                    # Con velas cerradas de sus intervalos se evalúa normal; si solo hay ticks
+                    # de la vela en curso, solo las estrategias que lo piden y sobre esa vela
+                    on_partial = False
+                    if closed_intervals is not None and not closed_intervals.intersection((instrument.symbol, interval) for interval in getattr(instance, "intervals", ())):
+                        if not (partial_tick and getattr(instance, "evaluate_on_partial", False)):
+                            continue
+                        on_partial = True
+                    if not self._strategy_can_trade(name, now, cooldown):
+                        continue
+                    if pool.busy(name):
+                        logger.warning(f"Estrategia '{name}' sigue ejecutando el ciclo anterior. Saltando.")
+                        continue
+                    logger.debug(f"Llamando a {name}.run(){' (vela en curso)' if on_partial else ''}")
+                    if on_partial and pool.mode == "process" and partial_snapshot is None:
+                        partial_snapshot = self._kline_snapshot(partial=True)
+                    submitted_instruments[name] = instrument
+                    submitted.append((name, pool.submit(name, instance, self, partial_snapshot if on_partial else snapshot,
+                                                        partial=on_partial, symbol=instrument.symbol)))
+
+                # 2) Recoger los resultados en orden y actuar secuencialmente sobre las señales
+                for name, raw_result, error in pool.collect(submitted):
+                    instance = self.active_strategies.get(name)
+                    if instance is None:
                         continue
-
-                    if self.last_trade_time.get(name) and (now - self.last_trade_time[name]) < cooldown: continue
-                    
-                    print(f"DEBUG: Llamando a {name}.run()") # DEBUG PRINT
                     try:
-                        raw_result = instance.run(self.capital_client_api, self)
+                        if error is not None:
+                            raise error
                         result = normalize_strategy_result(raw_result)
                         logger.debug(f"Resultado normalizado para {name}: {result}") # Añadido
                         with self.signals_lock:
                             self.strategy_signals[name] = result
-                        signal_text = self.strategy_signals[name].get("signal", "HOLD")
-                        direction = None
-                        if signal_text.startswith("BUY"): direction = "BUY"
-                        elif signal_text.startswith("SELL"): direction = "SELL"
-
-                        if direction:
-                            # Intentar obtener sl_pct y tp_pct directamente de la estrategia
-                            sl_pct = result.get("sl_pct")
-                            tp_pct = result.get("tp_pct")
-
-                            # Si la estrategia no proporcionó SL/TP válidos, usar la IA
-                            if sl_pct is None or tp_pct is None or sl_pct == 0.0 or tp_pct == 0.0:
-                                result_queue = queue.Queue()
-                                atr_5m_value = self.strategy_signals[name].get("detailed_status", {}).get("ATR", 0.0)
-                                ai_thread = threading.Thread(target=self.get_ai_sl_tp, args=(result_queue, name, direction, preliminary_price, current_trend, atr_5m_value, self.strategy_types.get(name, "desconocido")))
-                                ai_thread.start()
-
-                                try:
-                                    sl_multiplier, tp_multiplier = result_queue.get(timeout=10) # 10 second timeout
-                                except queue.Empty:
-                                    logger.warning(f"Timeout al esperar la respuesta de la IA para {name}. Usando los valores de config.json")
-                                    sl_multiplier, tp_multiplier = None, None
-
-                                if sl_multiplier is None or tp_multiplier is None:
-                                    logger.warning(f"No se pudieron obtener los multiplicadores de la IA para {name}. Usando los valores de config.json")
-                                    sl_multiplier = instance.sl_multiplier
-                                    tp_multiplier = instance.tp_multiplier
-
-                                sl_pct = (sl_multiplier * atr_5m_value / preliminary_price)
-                                tp_pct = (tp_multiplier * atr_5m_value / preliminary_price)
-
-                            if sl_pct is None or tp_pct is None or sl_pct == 0.0 or tp_pct == 0.0:
-                                logger.error(f"Estrategia '{name}' devolvió 'sl_pct' o 'tp_pct' inválidos (None o 0.0). Saltando trade.")
-                                self.strategy_signals[name]['signal'] = "ERROR"
-                                self.strategy_signals[name]['message'] = "La estrategia devolvió sl_pct o tp_pct inválidos"
-                                continue
-                                
-                            if self.prevent_counter_trend_trades:
-                                if (direction == "BUY" and current_trend == "bearish"):
-                                    logger.info(f"Trade de COMPRA bloqueado para '{name}' por tendencia principal bajista.")
-                                    self.strategy_signals[name]['signal'] = "HOLD"
-                                    self.strategy_signals[name]['message'] = f"Trade de COMPRA bloqueado por tendencia principal bajista."
-                                    continue
-                                if (direction == "SELL" and current_trend == "bullish"):
-                                    logger.info(f"Trade de VENTA bloqueado para '{name}' por tendencia principal alcista.")
-                                    self.strategy_signals[name]['signal'] = "HOLD"
-                                    self.strategy_signals[name]['message'] = f"Trade de VENTA bloqueado por tendencia principal alcista."
-                                    continue
-
-                            apply_sl_tp_against_trend_rule = self.enable_tp_sl_against_trend and \
-                               ((direction == "BUY" and current_trend == "bearish") or \
-                                (direction == "SELL" and current_trend == "bullish"))
-
-                            def open_single_trade(tp_modifier=0, atr_5m=None):
-                                if self.opening_trade.get(name):
-                                    return False
-                                
-                                self.opening_trade[name] = True
-                                current_tp_pct = tp_pct + tp_modifier
-                                if apply_sl_tp_against_trend_rule:
-                                    current_tp_pct = sl_pct
-
-                                if direction == "BUY":
-                                    preliminary_sl = preliminary_price * (1 - sl_pct / 100)
-                                    preliminary_tp = preliminary_price * (1 + current_tp_pct / 100)
-                                else: # SELL
-                                    preliminary_sl = preliminary_price * (1 + sl_pct / 100)
-                                    preliminary_tp = preliminary_price * (1 - current_tp_pct / 100)
-
-                                logger.debug(f"preliminary_price: {preliminary_price}, sl_pct: {sl_pct}, tp_pct: {current_tp_pct}, preliminary_sl: {preliminary_sl}, preliminary_tp: {preliminary_tp}")
-
-                                response = self.capital_client_api.place_market_order(
-                                    self.btc_epic, direction, self.global_order_size,
-                                    stop_level=preliminary_sl, profit_level=preliminary_tp
-                                )
-
-                                if "dealReference" in response:
-                                    self.last_trade_time[name] = now
-                                    threading.Thread(target=self._process_new_trade, args=(
-                                        response["dealReference"], name, direction, self.global_order_size,
-                                        sl_pct, current_tp_pct, current_trend, atr_5m
-                                    )).start()
-                                    return True
-                                else:
-                                    self.opening_trade[name] = False
-                                    logger.error(f"ERROR: No se pudo abrir la operación para {name} (TP mod: {tp_modifier}).")
-                                    return False
-
-                            if apply_sl_tp_against_trend_rule or not self.enable_two_tp_trades:
-                                open_single_trade(atr_5m=atr_5m_value)
-                            else:
-                                open_single_trade(atr_5m=atr_5m_value)
-                                time.sleep(1)
-                                open_single_trade(tp_modifier=-0.10, atr_5m=atr_5m_value)
-
+                        # El estado puede haber cambiado mientras se evaluaba la estrategia
+                        if not self._strategy_can_trade(name, datetime.now(), cooldown):
+                            continue
+                        instrument = submitted_instruments[name]
+                        preliminary_price, current_trend = market[instrument.symbol]
+                        self._act_on_strategy_signal(name, instance, result, now, instrument.epic, preliminary_price, current_trend)
                     except Exception as strategy_e:
                         logger.error(f"ERROR: La estrategia '{name}' falló durante la ejecución: {strategy_e}")
                         with self.signals_lock: # New line
                             self.strategy_signals[name] = {"signal": "ERROR", "message": f"Error: {strategy_e}"}
-                    finally:
-                        self.opening_trade[name] = False
 
             except Exception as e:
                 logger.error(f"ERROR CRÍTICO en el bucle de polling: {e}")
             logger.info("--- FIN CICLO POLLING ---")
             logger.info(f"Estado actual de strategy_signals: {self.strategy_signals}") # Añadido para depuración
-            time.sleep(20)
 
     def _get_current_detailed_status(self, epic, binance_symbol, direction, instance):
         detailed_status = {}
         try:
-            market_data = self.capital_client_api.get_market_data(epic=epic)['snapshot']
+            market_data = self.price_stream.snapshot(epic)
             current_price = market_data.get('bid') if direction == "BUY" else market_data.get('offer')
             detailed_status["current_price"] = current_price
 
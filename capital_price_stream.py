@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+import websockets
+
+logger = logging.getLogger("TradingBotLogger")
+
+DEFAULT_STREAM_URL = "wss://api-streaming-capital.backend-capital.com/connect"
+PING_INTERVAL_SECONDS = 300  # Capital.com cierra la conexión si no hay ping en 10 minutos
+MAX_EPICS = 40               # Límite de epics por conexión de streaming
+
+
+class CapitalPriceStream:
+    """
+    Caché de bid/offer por epic alimentada por el stream de precios de Capital.com
+    (destination marketData.subscribe), con REST como respaldo.
+
+    Cada cotización se guarda como una tupla inmutable (bid, offer, timestamp) que se
+    sustituye entera en un dict: las lecturas (quote/snapshot) no necesitan lock.
+    Si el stream no está activo o la última cotización tiene más de max_age_seconds,
+    snapshot() consulta /markets/{epic} y refresca la caché con esa respuesta.
+    """
+
+    def __init__(self, capital_client_api, epics=(), max_age_seconds=5.0, url=None):
+        self.capital_client_api = capital_client_api
+        self.url = url or os.getenv("CAPITAL_STREAM_URL", DEFAULT_STREAM_URL)
+        self.max_age_seconds = max_age_seconds
+        self.epics = list(dict.fromkeys(epics))[:MAX_EPICS]
+        self._quotes = {}  # epic -> (bid, offer, time.time() de recepción)
+        self.running = False
+        self.connected = False
+        self.thread = None
+        self._loop = None
+        self._ws = None
+        self._correlation = 0
+
+    # --- Lecturas ---
+
+    def quote(self, epic):
+        """(bid, offer, timestamp) de la última cotización recibida, o None."""
+        return self._quotes.get(epic)
+
+    def snapshot(self, epic):
+        """Dict {'bid', 'offer'} como el 'snapshot' de /markets/{epic}; usa REST si la caché no es reciente."""
+        quote = self._quotes.get(epic)
+        if quote is not None and time.time() - quote[2] <= self.max_age_seconds:
+            return {"bid": quote[0], "offer": quote[1], "source": "stream"}
+        snapshot = self.capital_client_api.get_market_data(epic=epic)["snapshot"]
+        bid, offer = snapshot.get("bid"), snapshot.get("offer")
+        if bid and offer:
+            self._quotes[epic] = (bid, offer, time.time())
+        return snapshot
+
+    def mid_price(self, epic):
+        snapshot = self.snapshot(epic)
+        bid, offer = snapshot.get("bid"), snapshot.get("offer")
+        return (bid + offer) / 2 if bid and offer else None
+
+    # --- Ciclo de vida ---
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._start_event_loop, name="capital-prices", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+
+    def subscribe(self, epic):
+        """Añade un epic a la suscripción (también en caliente)."""
+        if epic in self.epics:
+            return
+        if len(self.epics) >= MAX_EPICS:
+            logger.warning(f"CapitalPriceStream: límite de {MAX_EPICS} epics alcanzado; {epic} usará REST.")
+            return
+        self.epics.append(epic)
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._send("marketData.subscribe", {"epics": [epic]}), self._loop)
+
+    def _start_event_loop(self):
+        asyncio.run(self._run())
+
+    # --- Protocolo ---
+
+    def _message(self, destination, payload=None):
+        self._correlation += 1
+        message = {
+            "destination": destination,
+            "correlationId": str(self._correlation),
+            "cst": self.capital_client_api.cst_token,
+            "securityToken": self.capital_client_api.x_security_token,
+        }
+        if payload is not None:
+            message["payload"] = payload
+        return json.dumps(message)
+
+    async def _send(self, destination, payload=None):
+        await self._ws.send(self._message(destination, payload))
+
+    async def _ping_loop(self):
+        while self.running:
+            await asyncio.sleep(PING_INTERVAL_SECONDS)
+            await self._send("ping")
+
+    def _handle(self, message):
+        destination = message.get("destination")
+        payload = message.get("payload") or {}
+        if destination == "quote":
+            bid, offer = payload.get("bid"), payload.get("ofr")
+            if bid and offer:
+                self._quotes[payload.get("epic")] = (float(bid), float(offer), time.time())
+        elif message.get("status") not in (None, "OK"):
+            # Normalmente tokens caducados: se renuevan por REST y se reconecta
+            raise PermissionError(f"Stream de Capital.com: {destination} -> {message.get('status')} {payload}")
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        while self.running:
+            ping_task = None
+            try:
+                async with websockets.connect(self.url) as ws:
+                    self._ws = ws
+                    if self.epics:
+                        await self._send("marketData.subscribe", {"epics": self.epics})
+                    ping_task = asyncio.create_task(self._ping_loop())
+                    self.connected = True
+                    logger.info(f"Conectado al stream de precios de Capital.com ({', '.join(self.epics)})")
+                    while self.running:
+                        self._handle(json.loads(await asyncio.wait_for(ws.recv(), timeout=60.0)))
+            except PermissionError as e:
+                logger.warning(f"{e}. Renovando sesión...")
+                try:
+                    self.capital_client_api._authenticate()
+                except Exception as auth_error:
+                    logger.error(f"No se pudo renovar la sesión para el stream de precios: {auth_error}")
+                    await asyncio.sleep(5)
+            except asyncio.TimeoutError:
+                logger.warning("Sin cotizaciones de Capital.com en 60s. Reconectando...")
+            except Exception as e:
+                if self.running:
+                    logger.error(f"Error en el stream de precios de Capital.com: {e}")
+                    await asyncio.sleep(5)
+            finally:
+                self.connected = False
+                self._ws = None
+                if ping_task is not None:
+                    ping_task.cancel()
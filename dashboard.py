@@ -6,6 +6,7 @@ import time
 import requests
 from dotenv import load_dotenv
 from capital_bot import CapitalComAPIClient, BinanceAPIClient, TradingBot, TelegramListener, load_strategy_classes, load_config, get_default_strategy_params, config_lock
+from utils.trade_store import TradeStore, read_trade_history
 import threading
 from datetime import datetime, timedelta # Importar datetime y timedelta
 import logging
@@ -37,12 +38,24 @@ def read_bot_logs(log_file="bot_logs.log", num_lines=100):
         return [f"Error al leer logs: {e}"]
 
 # --- Funciones de Utilidad ---
+def _trade_store(file_path="trade_history.csv"):
+    """TradeStore del bot en marcha o, si no hay bot, uno nuevo sobre el fichero."""
+    bot = st.session_state.get('bot')
+    if bot is not None and getattr(bot, 'trade_history_file', None) == file_path:
+        return bot.trade_store
+    return TradeStore(file_path)
+
 def load_trade_history(file_path="trade_history.csv"):
     if not os.path.exists(file_path):
         st.warning(f"Archivo de historial de operaciones no encontrado: {file_path}")
         return pd.DataFrame()
     try:
-        df = pd.read_csv(file_path, on_bad_lines='skip')
+        bot = st.session_state.get('bot')
+        if bot is not None and getattr(bot, 'trade_history_file', None) == file_path:
+            # El bot ya tiene el historial indexado en memoria: no se vuelve a parsear el CSV
+            df = bot.trade_store.to_dataframe()
+        else:
+            df = read_trade_history(file_path)
         original_rows = len(df)
         
         # Count open trades before any modification
@@ -229,8 +242,11 @@ def sync_ui():
                 
                 local_df = pd.read_csv(uploaded_file)
                 
-                if os.path.exists(history_file_path):
-                    remote_df = pd.read_csv(history_file_path)
+                store = _trade_store(history_file_path)
+                # Integra en el CSV los cierres pendientes del journal antes de combinar
+                store.compact()
+                if len(store):
+                    remote_df = store.to_dataframe()
                     combined_df = pd.concat([remote_df, local_df])
                 else:
                     combined_df = local_df
@@ -241,6 +257,11 @@ def sync_ui():
                 combined_df.sort_values(by="open_time", ascending=False, inplace=True)
                 
                 combined_df.to_csv(history_file_path, index=False)
+                bot = st.session_state.get('bot')
+                if bot is not None and store is bot.trade_store:
+                    bot.reload_trade_history()
+                else:
+                    store.reload()
                 
                 st.success("¡Historial combinado y guardado con éxito!")
                 time.sleep(2)
@@ -252,6 +273,9 @@ def sync_ui():
         # --- Lógica de Descarga ---
         history_file_path = "trade_history.csv"
         if os.path.exists(history_file_path):
+            store = _trade_store(history_file_path)
+            if store.pending_updates:
+                store.compact()
             with open(history_file_path, "rb") as f:
                 st.download_button(
                     label="Descargar Historial de Render",
@@ -0,0 +1,155 @@
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("TradingBotLogger")
+
+# Intervalos entre consultas a /confirms: rápidos al principio (la mayoría de órdenes se
+# confirman en unos cientos de ms) y luego más espaciados; el último se repite.
+DEFAULT_SCHEDULE = (0.1, 0.15, 0.25, 0.4, 0.6, 1.0, 1.5, 2.0)
+
+
+def is_resolved(confirmation):
+    """Una confirmación es definitiva cuando Capital.com la acepta con deals afectados o la rechaza."""
+    if not confirmation:
+        return False
+    if confirmation.get("dealStatus") == "REJECTED":
+        return True
+    return confirmation.get("status") == "OPEN" and bool(confirmation.get("affectedDeals"))
+
+
+class DealConfirmationService:
+    """
+    Resuelve dealReferences de órdenes recién enviadas sin un hilo por orden.
+
+    Un único hilo mantiene un heap con la próxima consulta de cada referencia pendiente
+    y, en cada vuelta, consulta juntas todas las que tocan (en paralelo si el cliente es
+    CapitalAsyncBridge). Cada referencia sigue un calendario de reintentos rápido y luego
+    lento hasta timeout_seconds. El callback(deal_reference, confirmation, error) se
+    ejecuta en un pool pequeño para que amend/notificaciones no retrasen otras consultas.
+
+    resolve() permite que otra fuente (p. ej. un stream) entregue la confirmación antes.
+    """
+
+    def __init__(self, capital_client_api, schedule=DEFAULT_SCHEDULE, timeout_seconds=120, callback_workers=2):
+        self.capital_client_api = capital_client_api
+        self.schedule = tuple(schedule)
+        self.timeout_seconds = timeout_seconds
+        self.condition = threading.Condition()
+        self._pending = {}   # deal_reference -> {"callback", "attempt", "deadline", "submitted"}
+        self._heap = []      # (próxima consulta, deal_reference)
+        self._callbacks = ThreadPoolExecutor(max_workers=callback_workers, thread_name_prefix="deal-confirm")
+        self._running = True
+        self.thread = threading.Thread(target=self._run, name="deal-confirmations", daemon=True)
+        self.thread.start()
+
+    def submit(self, deal_reference, callback):
+        now = time.monotonic()
+        with self.condition:
+            self._pending[deal_reference] = {
+                "callback": callback, "attempt": 0, "deadline": now + self.timeout_seconds, "submitted": now,
+            }
+            heapq.heappush(self._heap, (now + self.schedule[0], deal_reference))
+            self.condition.notify()
+
+    def resolve(self, deal_reference, confirmation):
+        """Entrega una confirmación obtenida por otra vía. Devuelve False si la referencia no estaba pendiente."""
+        with self.condition:
+            entry = self._pending.pop(deal_reference, None)
+        if entry is None:
+            return False
+        self._finish(deal_reference, entry, confirmation, None)
+        return True
+
+    @property
+    def pending(self):
+        with self.condition:
+            return len(self._pending)
+
+    def stop(self):
+        with self.condition:
+            self._running = False
+            self.condition.notify()
+        self._callbacks.shutdown(wait=False)
+
+    # --- Hilo de consultas ---
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self._running and not self._due_now():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self.condition.wait(timeout)
+                if not self._running:
+                    return
+                due = self._pop_due()
+            if due:
+                self._poll(due)
+
+    def _due_now(self):
+        # Descarta entradas del heap de referencias ya resueltas
+        while self._heap and self._heap[0][1] not in self._pending:
+            heapq.heappop(self._heap)
+        return bool(self._heap) and self._heap[0][0] <= time.monotonic()
+
+    def _pop_due(self):
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, deal_reference = heapq.heappop(self._heap)
+            if deal_reference in self._pending:
+                due.append(deal_reference)
+        return due
+
+    def _fetch(self, deal_references):
+        """Consulta /confirms de todas las referencias; devuelve [(ref, confirmación o excepción)]."""
+        client = self.capital_client_api
+        if len(deal_references) > 1 and hasattr(client, "gather"):
+            results = client.gather(*(client.async_client.get_confirmation(ref) for ref in deal_references))
+            return list(zip(deal_references, results))
+        results = []
+        for ref in deal_references:
+            try:
+                results.append((ref, client._make_authenticated_request("GET", f"/confirms/{ref}")))
+            except Exception as e:
+                results.append((ref, e))
+        return results
+
+    def _poll(self, deal_references):
+        try:
+            results = self._fetch(deal_references)
+        except Exception as e:
+            results = [(ref, e) for ref in deal_references]
+        now = time.monotonic()
+        for deal_reference, result in results:
+            with self.condition:
+                entry = self._pending.get(deal_reference)
+                if entry is None:
+                    continue  # Resuelta mientras tanto por resolve()
+                if not isinstance(result, Exception) and is_resolved(result):
+                    del self._pending[deal_reference]
+                elif now >= entry["deadline"]:
+                    del self._pending[deal_reference]
+                    result = TimeoutError(f"Sin confirmación en {self.timeout_seconds}s")
+                else:
+                    # 404 mientras la orden se procesa, o aún sin affectedDeals: siguiente intento
+                    entry["attempt"] += 1
+                    delay = self.schedule[min(entry["attempt"], len(self.schedule) - 1)]
+                    heapq.heappush(self._heap, (min(now + delay, entry["deadline"]), deal_reference))
+                    continue
+            if isinstance(result, Exception):
+                self._finish(deal_reference, entry, None, result)
+            else:
+                self._finish(deal_reference, entry, result, None)
+
+    def _finish(self, deal_reference, entry, confirmation, error):
+        elapsed = time.monotonic() - entry["submitted"]
+        if error is None:
+            logger.debug(f"Confirmación de {deal_reference} en {elapsed:.2f}s ({entry['attempt'] + 1} consultas).")
+        try:
+            self._callbacks.submit(entry["callback"], deal_reference, confirmation, error)
+        except RuntimeError:
+            # Pool ya cerrado (bot parándose): se ejecuta aquí mismo
+            entry["callback"](deal_reference, confirmation, error)
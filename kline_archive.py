@@ -0,0 +1,231 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils.kline_store import KLINE_COLUMNS, KLINE_DTYPE
+from utils.klines_utils import INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 86_400_000
+
+
+def _day(open_time):
+    return datetime.fromtimestamp(open_time / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _date_to_ms(text):
+    return int(datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def to_records(klines):
+    """list[dict] en formato REST ('open_time', ...) o WebSocket ('t', 'o', ...) -> array KLINE_DTYPE."""
+    data = np.empty(len(klines), dtype=KLINE_DTYPE)
+    for i, k in enumerate(klines):
+        if "t" in k:
+            data[i] = (int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]))
+        else:
+            data[i] = tuple(k[col] for col in KLINE_COLUMNS)
+    return data
+
+
+def _concat_unique(parts):
+    """Concatena tramos ordenados; si se solapan (velas pendientes ya escritas) se queda con la última."""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return np.empty(0, dtype=KLINE_DTYPE)
+    data = np.concatenate(parts)
+    if len(parts) > 1:
+        order = np.argsort(data["open_time"], kind="stable")
+        data = data[order]
+        last = np.r_[data["open_time"][1:] != data["open_time"][:-1], True]
+        data = data[last]
+    return data
+
+
+def to_columns(data):
+    """Array KLINE_DTYPE -> {columna: ndarray}, el formato de BacktestDataFeed."""
+    return {col: np.asarray(data[col]) for col in KLINE_COLUMNS}
+
+
+class KlineArchive:
+    """
+    Archivo histórico de velas en disco: root/SÍMBOLO/intervalo/AAAA-MM-DD.npy.
+
+    Cada día es un .npy estructurado (KLINE_DTYPE) ordenado por open_time y sin
+    duplicados; las consultas por rango abren los días con mmap y recortan con
+    searchsorted, así que leer una semana de 1m no descarga nada de la red.
+    record() acumula las velas del WebSocket y las escribe cada flush_every velas.
+    """
+
+    def __init__(self, root="kline_archive", flush_every=60):
+        self.root = root
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self._pending = {}  # (symbol, interval) -> [velas en formato WebSocket]
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, symbol.upper(), interval)
+
+    def _path(self, symbol, interval, day):
+        return os.path.join(self._dir(symbol, interval), f"{day}.npy")
+
+    def days(self, symbol, interval):
+        directory = self._dir(symbol, interval)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(directory) if name.endswith(".npy"))
+
+    def _load_day(self, symbol, interval, day, mmap=True):
+        path = self._path(symbol, interval, day)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=KLINE_DTYPE)
+        return np.load(path, mmap_mode="r" if mmap else None)
+
+    def _pending_records(self, symbol, interval):
+        """Velas recibidas que aún no se han escrito (record() sin flush)."""
+        with self.lock:
+            pending = list(self._pending.get((symbol.upper(), interval), ()))
+        return to_records(pending)
+
+    # --- Escritura ---
+
+    def append(self, symbol, interval, data):
+        """Añade velas (array KLINE_DTYPE o list[dict]); las repetidas sustituyen a las guardadas."""
+        if not isinstance(data, np.ndarray):
+            data = to_records(data)
+        if not len(data):
+            return 0
+        data = np.sort(data, order="open_time")
+        os.makedirs(self._dir(symbol, interval), exist_ok=True)
+        day_keys = data["open_time"] // DAY_MS
+        with self.lock:
+            for day_key in np.unique(day_keys):
+                chunk = data[day_keys == day_key]
+                day = _day(int(day_key) * DAY_MS)
+                # Sin mmap: el fichero se sustituye a continuación
+                existing = self._load_day(symbol, interval, day, mmap=False)
+                merged = np.concatenate([existing[~np.isin(existing["open_time"], chunk["open_time"])], chunk])
+                merged = np.sort(merged, order="open_time")
+                path = self._path(symbol, interval, day)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, merged)
+                os.replace(tmp_path, path)
+        return len(data)
+
+    def record(self, symbol, interval, kline):
+        """Acumula una vela cerrada del WebSocket; se escriben en bloque cada flush_every."""
+        key = (symbol.upper(), interval)
+        with self.lock:
+            pending = self._pending.setdefault(key, [])
+            pending.append(kline)
+            if len(pending) < self.flush_every:
+                return
+            self._pending[key] = []
+        self.append(symbol, interval, pending)
+
+    def flush(self):
+        with self.lock:
+            pending, self._pending = self._pending, {}
+        for (symbol, interval), klines in pending.items():
+            if klines:
+                self.append(symbol, interval, klines)
+
+    def import_from_binance(self, binance_client_api, symbol, interval, start_ms, end_ms, page=1000):
+        """Descarga por REST [start_ms, end_ms] en páginas de `page` velas y las archiva."""
+        step = INTERVAL_MS[interval]
+        total = 0
+        cursor = start_ms
+        while cursor <= end_ms:
+            page_end = min(end_ms, cursor + page * step - 1)
+            prices = binance_client_api.get_historical_klines(symbol, interval, limit=page, start_time=cursor, end_time=page_end).get("prices", [])
+            total += self.append(symbol, interval, [k for k in prices if cursor <= int(k["open_time"]) <= page_end])
+            cursor = page_end + 1
+        return total
+
+    # --- Lectura ---
+
+    def range(self, symbol, interval, start_ms=None, end_ms=None):
+        """Velas con start_ms <= open_time <= end_ms como array KLINE_DTYPE (copia contigua)."""
+        parts = []
+        first_day = _day(start_ms) if start_ms is not None else None
+        last_day = _day(end_ms) if end_ms is not None else None
+        for day in self.days(symbol, interval):
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            data = self._load_day(symbol, interval, day)
+            open_time = data["open_time"]
+            lo = np.searchsorted(open_time, start_ms, side="left") if start_ms is not None else 0
+            hi = np.searchsorted(open_time, end_ms, side="right") if end_ms is not None else len(data)
+            if hi > lo:
+                parts.append(data[lo:hi])
+        pending = self._pending_records(symbol, interval)
+        if len(pending):
+            keep = np.ones(len(pending), dtype=bool)
+            if start_ms is not None:
+                keep &= pending["open_time"] >= start_ms
+            if end_ms is not None:
+                keep &= pending["open_time"] <= end_ms
+            parts.append(pending[keep])
+        return _concat_unique(parts)
+
+    def tail(self, symbol, interval, n, end_ms=None):
+        """Últimas n velas (hasta end_ms), recorriendo los días hacia atrás."""
+        pending = self._pending_records(symbol, interval)
+        if end_ms is not None:
+            pending = pending[pending["open_time"] <= end_ms]
+        parts, count = [pending], len(pending)
+        last_day = _day(end_ms) if end_ms is not None else None
+        for day in reversed(self.days(symbol, interval)):
+            if last_day and day > last_day:
+                continue
+            data = self._load_day(symbol, interval, day)
+            if end_ms is not None:
+                data = data[:np.searchsorted(data["open_time"], end_ms, side="right")]
+            parts.append(data)
+            count += len(data)
+            if count >= n:
+                break
+        return _concat_unique(parts[::-1])[-n:]
+
+    def last_open_time(self, symbol, interval):
+        days = self.days(symbol, interval)
+        if not days:
+            return None
+        data = self._load_day(symbol, interval, days[-1])
+        return int(data["open_time"][-1]) if len(data) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa velas de Binance al archivo local o consulta un rango.")
+    parser.add_argument("--root", default="kline_archive")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--intervals", nargs="*", default=["1m"])
+    parser.add_argument("--from", dest="start", required=True, help="Fecha inicial AAAA-MM-DD (UTC).")
+    parser.add_argument("--to", dest="end", help="Fecha final AAAA-MM-DD incluida (por defecto, ahora).")
+    parser.add_argument("--info", action="store_true", help="Solo muestra cuántas velas hay archivadas en el rango.")
+    args = parser.parse_args()
+
+    archive = KlineArchive(args.root)
+    start_ms = _date_to_ms(args.start)
+    end_ms = _date_to_ms(args.end) + DAY_MS - 1 if args.end else int(time.time() * 1000)
+    client = None
+    if not args.info:
+        from dotenv import load_dotenv
+        from capital_bot import BinanceAPIClient
+        load_dotenv()
+        client = BinanceAPIClient(os.getenv("BINANCE_API_KEY"), os.getenv("BINANCE_API_SECRET"))
+    for interval in args.intervals:
+        if client is not None:
+            print(f"{args.symbol}@{interval}: {archive.import_from_binance(client, args.symbol, interval, start_ms, end_ms)} velas importadas")
+        print(f"{args.symbol}@{interval}: {len(archive.range(args.symbol, interval, start_ms, end_ms))} velas archivadas en el rango")
+
+
+if __name__ == "__main__":
+    main()
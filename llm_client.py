@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("TradingBotLogger")
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_GEMINI_MODEL = "gemini-1.5-flash"
+
+
+class LLMError(Exception):
+    """Fallo al consultar el modelo (red, HTTP, respuesta vacía o JSON inválido)."""
+
+
+def parse_json(text):
+    """
+    JSON de la respuesta del modelo: el texto completo (modo JSON), un bloque ```json ... ```
+    o, en último caso, el primer objeto/lista que aparezca en el texto.
+    """
+    text = (text or "").strip()
+    candidates = [text]
+    fence = re.search(r"```(?:json)?\s*\n(.*?)\n\s*```", text, re.DOTALL)
+    if fence:
+        candidates.append(fence.group(1))
+    brace = re.search(r"(\{.*\}|\[.*\])", text, re.DOTALL)
+    if brace:
+        candidates.append(brace.group(1))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    raise LLMError(f"No se pudo encontrar JSON en la respuesta del modelo: {text[:500]}")
+
+
+# --- Backends ---
+
+class GeminiBackend:
+    """API generateContent de Gemini con una sesión HTTP keep-alive compartida entre hilos."""
+
+    name = "gemini"
+    label = "Gemini"
+
+    def __init__(self, api_key=None, model=DEFAULT_GEMINI_MODEL, timeout_seconds=30, pool_size=8):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.model = model
+        self.timeout_seconds = timeout_seconds
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    def generate(self, prompt, json_mode=False, timeout=None, task=None):
+        """Devuelve (texto, {"prompt_tokens", "output_tokens"})."""
+        if not self.api_key:
+            raise LLMError("GEMINI_API_KEY no está configurada en el archivo .env")
+        data = {"contents": [{"parts": [{"text": prompt}]}]}
+        if json_mode:
+            data["generationConfig"] = {"responseMimeType": "application/json"}
+        try:
+            response = self.session.post(
+                f"{GEMINI_BASE_URL}/models/{self.model}:generateContent",
+                headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key},
+                json=data, timeout=timeout or self.timeout_seconds,
+            )
+            response.raise_for_status()
+            result = response.json()
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"Fallo en la comunicación con Gemini: {e}") from e
+        try:
+            text = result["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"Respuesta de Gemini sin texto: {result}") from e
+        usage = result.get("usageMetadata", {})
+        return text, {"prompt_tokens": usage.get("promptTokenCount", 0), "output_tokens": usage.get("candidatesTokenCount", 0)}
+
+
+class LocalBackend:
+    """
+    Sustituto determinista y sin red: la misma entrada produce siempre la misma salida
+    (semilla = hash del prompt), con la forma que espera cada tarea. Sirve para probar
+    y medir las rutas de IA del bot sin clave ni conexión. latency_seconds simula la
+    latencia del modelo.
+    """
+
+    name = "local"
+    label = "local"
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+
+    def generate(self, prompt, json_mode=False, timeout=None, task=None):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        if task == "sl_tp":
+            payload = {"sl_multiplier": round(rng.uniform(0.5, 1.5), 2), "tp_multiplier": round(rng.uniform(1.0, 3.0), 2)}
+        elif task == "trade_management":
+            payload = self._decision(rng)
+        elif task == "trade_management_batch":
+            deal_ids = list(dict.fromkeys(re.findall(r'"dealId":\s*"([^"<>]+)"', prompt)))
+            payload = [dict(self._decision(rng), dealId=deal_id) for deal_id in deal_ids]
+        else:
+            payload = None
+        if payload is not None:
+            text = json.dumps(payload) if json_mode else f"```json\n{json.dumps(payload, indent=2)}\n```"
+        else:
+            text = f"Respuesta local determinista ({task or 'texto'}, {len(prompt)} caracteres de prompt)."
+        return text, {"prompt_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+
+    @staticmethod
+    def _decision(rng):
+        decision = rng.choice(("HOLD", "HOLD", "ADJUST_SLTP", "CLOSE"))
+        payload = {"decision": decision, "reason": "Decisión local determinista."}
+        if decision == "ADJUST_SLTP":
+            payload.update(sl_multiplier=round(rng.uniform(0.5, 1.5), 2), tp_multiplier=round(rng.uniform(1.0, 3.0), 2))
+        return payload
+
+
+BACKENDS = {"gemini": GeminiBackend, "local": LocalBackend}
+
+
+# --- Cliente ---
+
+class LLMClient:
+    """
+    Punto único de acceso al modelo para el bot y el agente MCP.
+
+    - Caché de respuestas por hash de (backend, tarea, modo JSON, prompt) con caducidad
+      cache_ttl_seconds (0 desactiva; cada llamada puede fijar la suya).
+    - complete_json() pide modo JSON al backend y parsea la respuesta con parse_json().
+    - Métricas por tarea: llamadas, aciertos de caché, errores, latencia y tokens.
+    """
+
+    def __init__(self, backend, cache_ttl_seconds=300, max_cache_entries=256):
+        self.backend = backend
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.max_cache_entries = max_cache_entries
+        self.lock = threading.Lock()
+        self._cache = OrderedDict()  # hash -> (time.time(), texto)
+        self._metrics = {}           # tarea -> contadores
+
+    def _key(self, prompt, task, json_mode):
+        raw = f"{self.backend.name}|{task}|{int(json_mode)}|{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _record(self, task, **values):
+        with self.lock:
+            metrics = self._metrics.setdefault(task, {
+                "calls": 0, "cache_hits": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0,
+                "prompt_tokens": 0, "output_tokens": 0,
+            })
+            for name, value in values.items():
+                if name == "latency":
+                    metrics["latency_total"] += value
+                    metrics["latency_max"] = max(metrics["latency_max"], value)
+                else:
+                    metrics[name] += value
+
+    def complete(self, prompt, task="text", json_mode=False, cache_ttl=None, timeout=None):
+        """Texto de la respuesta; lanza LLMError si falla."""
+        ttl = self.cache_ttl_seconds if cache_ttl is None else cache_ttl
+        key = self._key(prompt, task, json_mode)
+        if ttl > 0:
+            with self.lock:
+                cached = self._cache.get(key)
+                if cached is not None and time.time() - cached[0] <= ttl:
+                    self._cache.move_to_end(key)
+                    hit = cached[1]
+                else:
+                    hit = None
+            if hit is not None:
+                self._record(task, cache_hits=1)
+                return hit
+
+        started = time.monotonic()
+        try:
+            text, usage = self.backend.generate(prompt, json_mode=json_mode, timeout=timeout, task=task)
+        except Exception as e:
+            self._record(task, calls=1, errors=1, latency=time.monotonic() - started)
+            raise e if isinstance(e, LLMError) else LLMError(str(e)) from e
+        latency = time.monotonic() - started
+        self._record(task, calls=1, latency=latency, prompt_tokens=usage.get("prompt_tokens", 0), output_tokens=usage.get("output_tokens", 0))
+        logger.debug(f"LLM {self.backend.name}/{task}: {latency:.2f}s, tokens {usage.get('prompt_tokens', 0)}/{usage.get('output_tokens', 0)}")
+
+        if ttl > 0:
+            with self.lock:
+                self._cache[key] = (time.time(), text)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_cache_entries:
+                    self._cache.popitem(last=False)
+        return text
+
+    def complete_json(self, prompt, task="json", cache_ttl=None, timeout=None):
+        """Respuesta parseada como JSON (dict o lista); lanza LLMError si falla."""
+        return parse_json(self.complete(prompt, task=task, json_mode=True, cache_ttl=cache_ttl, timeout=timeout))
+
+    def metrics(self):
+        """Copia de las métricas por tarea con la latencia media calculada."""
+        with self.lock:
+            snapshot = {task: dict(values) for task, values in self._metrics.items()}
+        for values in snapshot.values():
+            values["latency_avg"] = values["latency_total"] / values["calls"] if values["calls"] else 0.0
+        return snapshot
+
+
+def build_llm_client(settings):
+    """LLMClient según global_settings: llm_backend ('gemini' o 'local'), llm_model, llm_timeout_seconds, llm_cache_ttl_seconds."""
+    backend_name = settings.get("llm_backend", "gemini")
+    if backend_name == "local":
+        backend = LocalBackend(latency_seconds=settings.get("llm_local_latency_seconds", 0.0))
+    elif backend_name == "gemini":
+        backend = GeminiBackend(model=settings.get("llm_model", DEFAULT_GEMINI_MODEL),
+                                timeout_seconds=settings.get("llm_timeout_seconds", 30))
+    else:
+        raise ValueError(f"llm_backend desconocido: {backend_name}. Opciones: {', '.join(BACKENDS)}")
+    return LLMClient(backend, cache_ttl_seconds=settings.get("llm_cache_ttl_seconds", 300))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de las rutas de IA con el backend local (sin red).")
+    parser.add_argument("--calls", type=int, default=1000, help="Llamadas por tarea.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia simulada del modelo en segundos.")
+    parser.add_argument("--distinct", type=int, default=100, help="Prompts distintos por tarea (el resto son aciertos de caché).")
+    args = parser.parse_args()
+
+    client = LLMClient(LocalBackend(latency_seconds=args.latency))
+    started = time.monotonic()
+    for i in range(args.calls):
+        n = i % args.distinct
+        client.complete_json(f"SL/TP prueba {n}", task="sl_tp")
+        client.complete_json(f'Operaciones: [{{"dealId": "D{n}"}}, {{"dealId": "E{n}"}}]', task="trade_management_batch")
+        client.complete(f"Análisis {n}", task="analysis")
+    elapsed = time.monotonic() - started
+    print(f"{3 * args.calls} llamadas en {elapsed:.3f}s")
+    for task, values in client.metrics().items():
+        print(f"{task}: {values['calls']} al modelo, {values['cache_hits']} de caché, {values['errors']} errores, "
+              f"latencia media {values['latency_avg'] * 1000:.2f} ms, tokens {values['prompt_tokens']}/{values['output_tokens']}")
+
+
+if __name__ == "__main__":
+    main()
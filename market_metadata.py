@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger("TradingBotLogger")
+
+DEFAULT_CACHE_FILE = "market_metadata.json"
+DEFAULT_TTL_SECONDS = 24 * 3600
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _rule_value(rules, key):
+    value = (rules.get(key) or {}).get("value")
+    return float(value) if value is not None else None
+
+
+def parse_market_details(details):
+    """Respuesta de /markets/{epic} -> metadatos que se guardan (reglas de tamaño, tick y horario)."""
+    instrument = details.get("instrument", {})
+    rules = details.get("dealingRules", {})
+    snapshot = details.get("snapshot", {})
+    decimals = snapshot.get("decimalPlacesFactor")
+    return {
+        "epic": instrument.get("epic"),
+        "name": instrument.get("name"),
+        "min_deal_size": _rule_value(rules, "minDealSize"),
+        "max_deal_size": _rule_value(rules, "maxDealSize"),
+        "tick_size": 10 ** -int(decimals) if decimals is not None else None,
+        "opening_hours": instrument.get("openingHours"),
+    }
+
+
+def _session_minutes(session):
+    """"22:05 - 00:00" -> (1325, 1440). Un fin 00:00 es medianoche (fin del día)."""
+    start, end = (part.strip() for part in session.split("-"))
+    start_minutes = int(start[:2]) * 60 + int(start[3:5]) if start else 0
+    end_minutes = int(end[:2]) * 60 + int(end[3:5]) if end else 0
+    return start_minutes, end_minutes or 24 * 60
+
+
+def is_open(opening_hours, now=None):
+    """
+    True si `now` cae dentro de openingHours ({"mon": ["00:00 - 23:59"], ..., "zone": "UTC"}).
+    Una sesión con fin anterior al inicio ("22:00 - 02:00") sigue abierta al día siguiente.
+    Sin horario o con un formato desconocido no se bloquea nada.
+    """
+    if not opening_hours:
+        return True
+    try:
+        zone = opening_hours.get("zone") or "UTC"
+        if zone.upper() == "UTC":
+            tz = timezone.utc
+        else:
+            from zoneinfo import ZoneInfo
+            tz = ZoneInfo(zone)
+        now = (now or datetime.now(timezone.utc)).astimezone(tz)
+        minutes = now.hour * 60 + now.minute
+        weekday = now.weekday()
+        for session in opening_hours.get(WEEKDAYS[weekday], []):
+            start_minutes, end_minutes = _session_minutes(session)
+            if start_minutes <= minutes <= end_minutes or (end_minutes < start_minutes and minutes >= start_minutes):
+                return True
+        # Sesiones del día anterior que cruzan la medianoche
+        for session in opening_hours.get(WEEKDAYS[weekday - 1], []):
+            start_minutes, end_minutes = _session_minutes(session)
+            if end_minutes < start_minutes and minutes <= end_minutes:
+                return True
+        return False
+    except Exception as e:
+        logger.debug(f"Horario de mercado no interpretable ({opening_hours}): {e}")
+        return True
+
+
+class MarketMetadataCache:
+    """
+    Metadatos de mercados de Capital.com sin descargar la lista completa de /markets.
+
+    - find_epic(name) busca con GET /markets?searchTerm=... y se queda con el mercado cuyo
+      instrumentName coincide exactamente.
+    - get(epic) pide GET /markets/{epic} y guarda tamaño mínimo/máximo, tick y horario
+      de negociación.
+    Ambos resultados se guardan en memoria y en un JSON en disco con caducidad ttl_seconds,
+    así que en un arranque normal no se hace ninguna petición.
+    """
+
+    def __init__(self, capital_client_api, cache_file=DEFAULT_CACHE_FILE, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.capital_client_api = capital_client_api
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self._epics = {}    # instrumentName -> {"epic", "time"}
+        self._markets = {}  # epic -> metadatos de parse_market_details + "time"
+        self._load()
+
+    # --- Persistencia ---
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+            self._epics = data.get("epics", {})
+            self._markets = data.get("markets", {})
+        except (IOError, json.JSONDecodeError) as e:
+            logger.warning(f"No se pudo leer {self.cache_file}: {e}. Se reconstruirá.")
+
+    def _save(self):
+        tmp_path = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"epics": self._epics, "markets": self._markets}, f, indent=2)
+            os.replace(tmp_path, self.cache_file)
+        except IOError as e:
+            logger.warning(f"No se pudo guardar {self.cache_file}: {e}")
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry.get("time", 0) <= self.ttl_seconds
+
+    # --- Resolución de epics ---
+
+    def find_epic(self, name, search_term=None):
+        """Epic del mercado con instrumentName == name, o None si no existe."""
+        with self.lock:
+            entry = self._epics.get(name)
+        if self._fresh(entry):
+            return entry["epic"]
+        # "Bitcoin/USD" -> "Bitcoin": la búsqueda de Capital.com es por texto, no por nombre exacto
+        search_term = search_term or name.split("/")[0]
+        markets = self.capital_client_api.search_markets(search_term).get("markets", [])
+        epic = next((market.get("epic") for market in markets if market.get("instrumentName") == name), None)
+        if epic is None:
+            logger.warning(f"La búsqueda '{search_term}' en Capital.com no devolvió '{name}' ({len(markets)} resultados).")
+            return entry["epic"] if entry else None
+        with self.lock:
+            self._epics[name] = {"epic": epic, "time": time.time()}
+            self._save()
+        return epic
+
+    # --- Metadatos por epic ---
+
+    def get(self, epic):
+        """Metadatos del epic (de la caché si no han caducado); None si no se pueden obtener."""
+        with self.lock:
+            entry = self._markets.get(epic)
+        if self._fresh(entry):
+            return entry
+        try:
+            metadata = parse_market_details(self.capital_client_api.get_market_data(epic))
+        except Exception as e:
+            logger.error(f"No se pudieron obtener los metadatos de {epic}: {e}")
+            return entry  # Mejor caducados que ninguno
+        metadata["epic"] = metadata["epic"] or epic
+        metadata["time"] = time.time()
+        with self.lock:
+            self._markets[epic] = metadata
+            self._save()
+        return metadata
+
+    def round_price(self, epic, level):
+        metadata = self.get(epic) or {}
+        tick = metadata.get("tick_size")
+        return round(round(level / tick) * tick, 10) if tick else level
+
+    def validate_order(self, epic, size, now=None):
+        """Motivo por el que no se puede enviar la orden (tamaño u horario), o None si es válida."""
+        metadata = self.get(epic)
+        if metadata is None:
+            return None  # Sin metadatos decide Capital.com
+        min_size, max_size = metadata.get("min_deal_size"), metadata.get("max_deal_size")
+        if min_size is not None and size < min_size:
+            return f"Tamaño {size} menor que el mínimo de {epic} ({min_size})."
+        if max_size is not None and size > max_size:
+            return f"Tamaño {size} mayor que el máximo de {epic} ({max_size})."
+        if not is_open(metadata.get("opening_hours"), now):
+            return f"Mercado {epic} fuera de horario de negociación."
+        return None
@@ -1,6 +1,4 @@
-import os
 import json
-import requests
 import pandas as pd
 import ta
 import logging
@@ -10,18 +8,20 @@ import re
 
 # Assuming these are available in the project root or via sys.path
 
-from utils.klines_utils import normalize_klines
+from utils.klines_utils import normalize_klines, INTERVAL_MS
 from utils.indicators import add_ema, add_rsi # Example indicators
+from llm_client import LLMError, build_llm_client
 
 logger = logging.getLogger(__name__)
 
 class MCPAgent:
-    def __init__(self, capital_client, binance_client, config: dict):
+    def __init__(self, capital_client, binance_client, config: dict, kline_archive=None, llm_client=None):
         self.capital_client = capital_client
         self.binance_client = binance_client
         self.config = config
-        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
-        if not self.gemini_api_key:
+        self.kline_archive = kline_archive  # KlineArchive local: evita pedir velas por REST si está al día
+        self.llm_client = llm_client or build_llm_client(config.get("global_settings", {}))
+        if self.llm_client.backend.name == "gemini" and not self.llm_client.backend.api_key:
             raise ValueError("GEMINI_API_KEY no está configurada en el archivo .env")
         
         self.tools = self._register_tools()
@@ -47,22 +47,13 @@ class MCPAgent:
         return tools
 
     def _call_llm(self, prompt: str) -> str:
-        """Sends a prompt to the Gemini API and returns the response."""
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={self.gemini_api_key}"
-        headers = {'Content-Type': 'application/json'}
-        data = {"contents": [{"parts": [{"text": prompt}]}]}
-        
+        """Sends a prompt to the LLM and returns the response."""
         try:
-            response = requests.post(api_url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            return result['candidates'][0]['content']['parts'][0]['text']
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error al llamar a la API de Gemini: {e}")
+            # Sin caché: la respuesta puede depender del mercado aunque la consulta se repita
+            return self.llm_client.complete(prompt, task="mcp", cache_ttl=0, timeout=60)
+        except LLMError as e:
+            logger.error(f"Error al llamar al LLM: {e}")
             return f"ERROR: Fallo en la comunicación con el LLM: {e}"
-        except (KeyError, IndexError) as e:
-            logger.error(f"Error al parsear la respuesta del LLM: {e}, Respuesta: {result}")
-            return f"ERROR: Fallo al parsear la respuesta del LLM: {e}"
 
     def _execute_tool(self, tool_name: str, **kwargs):
         """Executes a registered tool."""
@@ -123,8 +114,10 @@ class MCPAgent:
             # Necesitamos suficientes klines para calcular los indicadores
             # Ajustar el límite según los indicadores solicitados
             limit = 200 # Un límite razonable para la mayoría de los indicadores
-            klines = self.binance_client.get_historical_klines(symbol, timeframe, limit=limit).get("prices", [])
-            df = normalize_klines(klines, min_length=limit - 10)
+            df = self._archived_klines(symbol, timeframe, limit)
+            if df is None:
+                klines = self.binance_client.get_historical_klines(symbol, timeframe, limit=limit).get("prices", [])
+                df = normalize_klines(klines, min_length=limit - 10)
             if df.empty:
                 return {"error": "Datos insuficientes para calcular indicadores."}
 
@@ -147,6 +140,17 @@ class MCPAgent:
             logger.error(f"Error en get_indicators para {symbol}-{timeframe}-{indicators_list}: {e}")
             return {"error": str(e)}
 
+    def _archived_klines(self, symbol, timeframe, limit):
+        """Últimas `limit` velas del archivo local si llega hasta la vela anterior a la actual; si no, None."""
+        step = INTERVAL_MS.get(timeframe)
+        if self.kline_archive is None or step is None:
+            return None
+        data = self.kline_archive.tail(symbol, timeframe, limit)
+        now_ms = int(datetime.now().timestamp() * 1000)
+        if len(data) < limit or now_ms - int(data["open_time"][-1]) > 2 * step:
+            return None
+        return normalize_klines(pd.DataFrame(data), min_length=limit - 10)
+
     def place_order(self, symbol: str, direction: str, size: float, stop_loss: float = None, take_profit: float = None) -> dict:
         """
         Ejecuta una orden de mercado.
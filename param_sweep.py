@@ -0,0 +1,264 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from backtester import BacktestDataFeed, Backtester, direction_mismatches, load_klines_csv, summarize, synthetic_klines
+from utils.kline_store import KLINE_COLUMNS, KLINE_DTYPE
+from utils.strategy_loader import load_strategy_classes
+
+logger = logging.getLogger(__name__)
+
+RANKINGS = {
+    # Clave de ordenación (menor es mejor) para cada criterio; los demás desempatan
+    "profit_loss": lambda r: (-r["profit_loss"], -r["win_rate"], r["max_drawdown"]),
+    "win_rate": lambda r: (-r["win_rate"], -r["profit_loss"], r["max_drawdown"]),
+    "drawdown": lambda r: (r["max_drawdown"], -r["profit_loss"], -r["win_rate"]),
+}
+RESULT_FIELDNAMES = ["strategy", "aggressiveness_level", "params", "mode", "trades", "profit_loss", "win_rate", "max_drawdown", "seconds"]
+
+
+def save_dataset(klines, path):
+    """Guarda las velas de 1m en un .npy estructurado que los procesos abren con mmap."""
+    dataset = np.empty(len(klines["open_time"]), dtype=KLINE_DTYPE)
+    for col in KLINE_COLUMNS:
+        dataset[col] = klines[col]
+    np.save(path, dataset)
+
+
+def load_dataset(path):
+    """Abre el dataset en modo mmap: las páginas se comparten entre todos los procesos del pool."""
+    dataset = np.load(path, mmap_mode="r")
+    return {col: dataset[col] for col in KLINE_COLUMNS}
+
+
+def expand_grid(grid):
+    """{param: [valores]} -> lista de dicts con todas las combinaciones."""
+    if not grid:
+        return [{}]
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def parse_levels(text):
+    """'1-10' o '3,5,9' -> [niveles]."""
+    levels = set()
+    for part in text.split(","):
+        if "-" in part:
+            low, high = part.split("-", 1)
+            levels.update(range(int(low), int(high) + 1))
+        elif part.strip():
+            levels.add(int(part))
+    return sorted(level for level in levels if 1 <= level <= 10)
+
+
+def parse_grid_args(items):
+    """['sl_multiplier=0.1,0.2', ...] -> {'sl_multiplier': [0.1, 0.2]}."""
+    grid = {}
+    for item in items or []:
+        name, _, values = item.partition("=")
+        parsed = []
+        for value in values.split(","):
+            try:
+                parsed.append(json.loads(value))
+            except json.JSONDecodeError:
+                parsed.append(value)
+        grid[name.strip()] = parsed
+    return grid
+
+
+_worker = {}
+
+
+def _init_worker(dataset_path, config, spread_pct):
+    # Cada proceso construye su feed una sola vez sobre el dataset mapeado en memoria
+    feed = BacktestDataFeed(load_dataset(dataset_path))
+    _worker["backtester"] = Backtester(feed, config, spread_pct=spread_pct, epic="SWEEP")
+    _worker["classes"] = load_strategy_classes("strategies")
+    _worker["config"] = config
+
+
+def _evaluate(name, level, params, vectorized=True, check_samples=50):
+    """
+    Simula una combinación. Con vectorized, usa generate_signals() solo si --check-signals
+    sobre check_samples velas no encuentra ninguna dirección distinta de run(); si no, run().
+    """
+    backtester = _worker["backtester"]
+    strategy_config = dict(_worker["config"].get(name, {}))
+    strategy_config.update(params)
+    instance = _worker["classes"][name](strategy_config, aggressiveness_level=level)
+    start = time.time()
+    trades = None
+    if vectorized:
+        try:
+            signals = instance.generate_signals(backtester.feed.frames)
+        except NotImplementedError:
+            signals = None
+        if signals is not None:
+            mismatches = direction_mismatches(backtester.check_signals(name, instance, samples=check_samples, signals=signals))
+            if mismatches:
+                logger.warning(f"{name} nivel {level} {params}: generate_signals() difiere de run() en "
+                               f"{len(mismatches)} velas; se evalúa con run().")
+            else:
+                trades = backtester.run_vectorized(name, instance, signals)
+    mode = "vectorized" if trades is not None else "run"
+    if trades is None:
+        trades = backtester.run_strategy(name, instance)
+    stats = summarize(trades).get(name, {"trades": 0, "profit_loss": 0.0, "win_rate": 0.0, "max_drawdown": 0.0})
+    return {
+        "strategy": name, "aggressiveness_level": level, "params": params, "mode": mode,
+        **stats, "seconds": round(time.time() - start, 2),
+    }
+
+
+def run_sweep(dataset_path, config, tasks, workers, spread_pct=0.0, vectorized=True, check_samples=50):
+    """
+    Evalúa las combinaciones [(estrategia, nivel, params), ...] en un pool de procesos.
+    Devuelve la lista de resultados (uno por combinación) a medida que terminan.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dataset_path, config, spread_pct)) as executor:
+        futures = {
+            executor.submit(_evaluate, name, level, params, vectorized, check_samples): (name, level, params)
+            for name, level, params in tasks
+        }
+        for future in as_completed(futures):
+            name, level, params = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Falló la combinación {name} nivel {level} {params}: {e}")
+    return results
+
+
+def rank_results(results, rank_by="profit_loss", min_trades=1):
+    """Agrupa por estrategia y ordena cada grupo (mejor primero), descartando las de pocas operaciones."""
+    key = RANKINGS[rank_by]
+    ranked = {}
+    for result in results:
+        if result["trades"] >= min_trades:
+            ranked.setdefault(result["strategy"], []).append(result)
+    return {name: sorted(group, key=key) for name, group in ranked.items()}
+
+
+def verify_top(dataset_path, config, ranked, top, workers, spread_pct=0.0, rank_by="profit_loss", min_trades=1):
+    """
+    Repite con run() vela a vela las `top` mejores combinaciones de cada estrategia que se
+    evaluaron con generate_signals() y vuelve a ordenarlas con esos resultados: la
+    clasificación final (y lo que escribe --apply) sale siempre de run_strategy.
+    Devuelve (clasificación final, resultados de la verificación).
+    """
+    candidates = [result for group in ranked.values() for result in group[:top]]
+    tasks = [(r["strategy"], r["aggressiveness_level"], r["params"]) for r in candidates if r["mode"] == "vectorized"]
+    verified = run_sweep(dataset_path, config, tasks, workers, spread_pct, vectorized=False) if tasks else []
+    final = [r for r in candidates if r["mode"] == "run"] + verified
+    return rank_results(final, rank_by, min_trades), verified
+
+
+def write_results(results, path):
+    with open(path, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDNAMES, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            writer.writerow({**result, "params": json.dumps(result["params"], sort_keys=True)})
+
+
+def apply_best(ranked, config_file="config.json"):
+    """
+    Escribe en config.json el nivel de agresividad y los parámetros ganadores de cada
+    estrategia. Se relee el fichero justo antes de escribir para no pisar cambios hechos
+    mientras corría el barrido, y se sustituye de forma atómica.
+    """
+    with open(config_file, "r") as f:
+        config = json.load(f)
+    for name, group in ranked.items():
+        best = group[0]
+        strategy_config = config.setdefault(name, {})
+        strategy_config["aggressiveness_level"] = best["aggressiveness_level"]
+        strategy_config.update(best["params"])
+    tmp_file = f"{config_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_file, config_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de parámetros: estrategia x nivel de agresividad x rejilla de config.json.")
+    parser.add_argument("--data", help="CSV de velas de 1m. Se convierte al dataset .npy.")
+    parser.add_argument("--synthetic-days", type=int, default=30, help="Días de velas sintéticas si no hay --data ni dataset previo.")
+    parser.add_argument("--dataset", default="sweep_klines.npy", help="Dataset .npy compartido por mmap entre los procesos.")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--strategies", nargs="*", help="Estrategias a barrer (por defecto todas).")
+    parser.add_argument("--levels", default="1-10", help="Niveles de agresividad, p. ej. '1-10' o '3,5,9'.")
+    parser.add_argument("--grid", nargs="*", metavar="PARAM=V1,V2", help="Rejilla común a todas las estrategias, p. ej. sl_multiplier=0.1,0.16.")
+    parser.add_argument("--grid-file", help="JSON {estrategia: {param: [valores]}}; la clave '*' aplica a todas.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--spread-pct", type=float, default=0.0)
+    parser.add_argument("--no-vectorized", action="store_true", help="Evalúa siempre con run() vela a vela.")
+    parser.add_argument("--check-samples", type=int, default=50,
+                        help="Velas en las que se compara generate_signals() con run() antes de usar la vía vectorizada.")
+    parser.add_argument("--rank-by", choices=sorted(RANKINGS), default="profit_loss")
+    parser.add_argument("--min-trades", type=int, default=10, help="Operaciones mínimas para que una combinación cuente.")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--output", default="sweep_results.csv")
+    parser.add_argument("--apply", action="store_true", help="Escribe la mejor combinación de cada estrategia en config.json.")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    if args.data:
+        save_dataset(load_klines_csv(args.data), args.dataset)
+    elif not os.path.exists(args.dataset):
+        save_dataset(synthetic_klines(args.synthetic_days * 1440), args.dataset)
+
+    grid_file = {}
+    if args.grid_file:
+        with open(args.grid_file, "r") as f:
+            grid_file = json.load(f)
+    common_grid = parse_grid_args(args.grid)
+    levels = parse_levels(args.levels)
+
+    tasks = []
+    for name in load_strategy_classes("strategies"):
+        if args.strategies and name not in args.strategies:
+            continue
+        grid = {**grid_file.get("*", {}), **grid_file.get(name, {}), **common_grid}
+        tasks.extend((name, level, params) for level in levels for params in expand_grid(grid))
+    print(f"Evaluando {len(tasks)} combinaciones en {args.workers} procesos ({len(levels)} niveles)...")
+
+    start = time.time()
+    results = run_sweep(args.dataset, config, tasks, args.workers, args.spread_pct,
+                        vectorized=not args.no_vectorized, check_samples=args.check_samples)
+    print(f"Barrido completado en {time.time() - start:.1f}s")
+
+    ranked = rank_results(results, args.rank_by, args.min_trades)
+    ranked, verified = verify_top(args.dataset, config, ranked, args.top, args.workers, args.spread_pct,
+                                  args.rank_by, args.min_trades)
+    if verified:
+        print(f"{len(verified)} combinaciones del top {args.top} verificadas con run() vela a vela.")
+    write_results(results + verified, args.output)
+    print(f"Resultados guardados en {args.output}")
+    for name, group in sorted(ranked.items()):
+        print(f"Estrategia: {name}")
+        for result in group[:args.top]:
+            print(f"  Nivel {result['aggressiveness_level']} {json.dumps(result['params'], sort_keys=True)}: "
+                  f"P/L {result['profit_loss']:.2f} | Acierto {result['win_rate']:.2f}% | "
+                  f"Drawdown {result['max_drawdown']:.2f} | {result['trades']} operaciones")
+        print("-" * 30)
+
+    if args.apply:
+        if ranked:
+            apply_best(ranked, args.config)
+            print(f"Parámetros ganadores escritos en {args.config}. Recarga las estrategias del bot para aplicarlos.")
+        else:
+            print(f"Ninguna combinación alcanzó {args.min_trades} operaciones; no se modifica {args.config}.")
+
+
+if __name__ == "__main__":
+    main()
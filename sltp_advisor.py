@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("TradingBotLogger")
+
+ATR_BUCKET_WIDTH = 0.0005     # Tramos de ATR/precio de 5 pb: volatilidades parecidas comparten consejo
+MAX_MULTIPLIER = 10.0         # Un multiplicador mayor en una respuesta de la IA se considera inválido
+
+
+def atr_bucket(atr, price, width=ATR_BUCKET_WIDTH):
+    """Tramo de volatilidad relativa (ATR / precio); comparable entre instrumentos."""
+    if not atr or not price:
+        return 0
+    return int(atr / price / width)
+
+
+def valid_multipliers(sl_multiplier, tp_multiplier):
+    try:
+        sl_multiplier, tp_multiplier = float(sl_multiplier), float(tp_multiplier)
+    except (TypeError, ValueError):
+        return None
+    if not (0 < sl_multiplier <= MAX_MULTIPLIER and 0 < tp_multiplier <= MAX_MULTIPLIER):
+        return None
+    return sl_multiplier, tp_multiplier
+
+
+class SLTPAdvisor:
+    """
+    Multiplicadores de SL/TP sin esperar nunca a la red.
+
+    advise() responde al momento: con el último consejo de la IA para la clave
+    (estrategia, dirección, tendencia, tramo de ATR) si lo hay, y si no con los
+    multiplicadores por defecto de la estrategia (config.json). Si el consejo falta o
+    tiene más de ttl_seconds, se pide uno nuevo en segundo plano con como mucho
+    max_concurrent peticiones a la vez y max_pending en cola; la siguiente señal con
+    esa clave ya lo usa. Tras un fallo la clave no se reintenta en retry_seconds.
+
+    fetch(**context) hace la consulta (puede tardar o lanzar excepciones) y devuelve
+    (sl_multiplier, tp_multiplier).
+    """
+
+    def __init__(self, fetch, ttl_seconds=6 * 3600, max_concurrent=2, max_pending=8,
+                 retry_seconds=300, bucket_width=ATR_BUCKET_WIDTH):
+        self.fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self.max_pending = max_pending
+        self.retry_seconds = retry_seconds
+        self.bucket_width = bucket_width
+        self.lock = threading.Lock()
+        self._advice = {}        # clave -> (sl_multiplier, tp_multiplier, time.time())
+        self._in_flight = set()  # claves con una consulta en cola o en curso
+        self._failed = {}        # clave -> time.time() del último fallo
+        self.max_concurrent = max_concurrent
+        self._executor = None    # Se crea con la primera consulta y de nuevo tras shutdown()
+
+    def key(self, strategy_name, direction, trend, atr, price):
+        return (strategy_name, direction, trend, atr_bucket(atr, price, self.bucket_width))
+
+    def advise(self, strategy_name, direction, trend, atr, price, default, **context):
+        """Devuelve (sl_multiplier, tp_multiplier, origen) con origen 'ia' o 'config'."""
+        key = self.key(strategy_name, direction, trend, atr, price)
+        now = time.time()
+        with self.lock:
+            advice = self._advice.get(key)
+        if advice is None or now - advice[2] > self.ttl_seconds:
+            self._schedule(key, dict(context, strategy_name=strategy_name, direction=direction,
+                                     entry_price=price, current_trend=trend, atr_5m=atr))
+        if advice is not None:
+            return advice[0], advice[1], "ia"
+        return default[0], default[1], "config"
+
+    @property
+    def pending(self):
+        with self.lock:
+            return len(self._in_flight)
+
+    def shutdown(self):
+        """Cancela las consultas en cola; la siguiente señal vuelve a crear el pool."""
+        with self.lock:
+            executor, self._executor = self._executor, None
+            self._in_flight.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self, key, context):
+        with self.lock:
+            if key in self._in_flight or len(self._in_flight) >= self.max_pending:
+                return
+            if time.time() - self._failed.get(key, 0) < self.retry_seconds:
+                return
+            self._in_flight.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="sltp-advisor")
+            executor = self._executor
+        try:
+            executor.submit(self._refresh, key, context)
+        except RuntimeError:
+            # Executor cerrado (bot parándose)
+            with self.lock:
+                self._in_flight.discard(key)
+
+    def _refresh(self, key, context):
+        try:
+            multipliers = valid_multipliers(*self.fetch(**context))
+            if multipliers is None:
+                raise ValueError("multiplicadores inválidos")
+            with self.lock:
+                self._advice[key] = (*multipliers, time.time())
+                self._failed.pop(key, None)
+            logger.debug(f"Consejo SL/TP de la IA para {key}: {multipliers}")
+        except Exception as e:
+            logger.warning(f"No se pudo actualizar el consejo SL/TP de la IA para {key}: {e}")
+            with self.lock:
+                self._failed[key] = time.time()
+        finally:
+            with self.lock:
+                self._in_flight.discard(key)
@@ -1,9 +1,23 @@
 import logging
+import numpy as np
+import pandas as pd
 from strategies.utils import normalize_strategy_result
+from utils.indicators import compute_indicator, window_indicator as compute_window_indicator
+from utils.klines_utils import INTERVAL_MS
 
 logger = logging.getLogger(__name__)
 
 class BaseStrategy:
+    # Intervalos de vela de los que depende la estrategia: se evalúa cuando cierra una vela de alguno de ellos
+    intervals = ("1m", "5m")
+    # True: la estrategia también se evalúa sobre la vela en curso (modo partial_klines),
+    # viendo esa vela como última fila de _get_binance_klines_data
+    evaluate_on_partial = False
+    # Velas que piden todas las estrategias para calcular indicadores en cada intervalo: con la
+    # misma ventana, IndicatorCache comparte las series entre ellas (y los valores no dependen
+    # de cuántas velas necesite cada estrategia para sus condiciones)
+    indicator_windows = {"1m": 150, "5m": 300}
+
     def __init__(self, config=None, aggressiveness_level=3):
         self.config = config or {}
         self.aggressiveness_level = aggressiveness_level
@@ -11,6 +25,122 @@ class BaseStrategy:
     def run(self, capital_client_api, binance_data_provider, symbol="BTCUSDT"):
         raise NotImplementedError("El método 'run' debe ser implementado por las subclases.")
 
+    def indicator_window(self, interval, limit):
+        """Velas a pedir en `interval` para los indicadores: la ventana común, o `limit` si es mayor."""
+        return max(limit, self.indicator_windows.get(interval, limit))
+
+    def indicator(self, trading_bot_instance, df, symbol, interval, name, *params):
+        """
+        Devuelve el indicador `name` alineado con las filas de df.
+        Usa la caché compartida del ciclo (trading_bot_instance.indicator_cache) si existe,
+        de modo que varias estrategias no recalculan la misma serie sobre las mismas velas.
+        """
+        cache = getattr(trading_bot_instance, "indicator_cache", None)
+        if cache is None:
+            return compute_indicator(df, name, params)
+        return cache.series(symbol, interval, name, params, df)
+
+    def latest_indicator(self, trading_bot_instance, symbol, interval, name, *params):
+        """
+        Devuelve (valor anterior, último valor) del indicador incremental `name` sin
+        construir DataFrames. Devuelve (nan, nan) si el bot no tiene motor incremental.
+        """
+        engine = getattr(trading_bot_instance, "streaming_indicators", None)
+        if engine is None:
+            return float("nan"), float("nan")
+        return engine.latest_pair(symbol, interval, name, *params)
+
+    # --- Modo vectorizado (backtests) ---
+
+    def generate_signals(self, data):
+        """
+        Versión vectorizada de run() para backtests masivos. Opcional.
+        data: {intervalo: DataFrame con todo el histórico de velas cerradas}.
+        Devuelve un DataFrame alineado con data["1m"] (ver signal_frame) con la señal que
+        daría run() al cierre de cada vela de 1m, calculada en una sola pasada.
+        """
+        raise NotImplementedError(f"La estrategia {self.__class__.__name__} no implementa generate_signals.")
+
+    def window_indicator(self, data, interval, limit, name, *params, lags=1):
+        """
+        Indicador `name` tal y como lo calcula run() al cierre de cada vela de `interval`: solo
+        sobre las indicator_window(interval, limit) velas que pide run(), con la misma semilla en
+        EMA, RSI, ATR, ADX y MACD. Con lags=1 devuelve el último valor de cada ventana
+        (df.iloc[-1]); con lags > 1, un array (lags, n) cuya fila k es df.iloc[-1 - k].
+        """
+        window = self.indicator_window(interval, limit)
+        values = compute_window_indicator(data[interval], name, params, window, lags)
+        return values[0] if lags == 1 else values
+
+    @staticmethod
+    def closed_bars(data, interval):
+        """Nº de velas de `interval` cerradas al cierre de cada vela de 1m."""
+        minute_close = data["1m"]["open_time"].to_numpy(dtype=np.int64) + INTERVAL_MS["1m"]
+        bar_close = data[interval]["open_time"].to_numpy(dtype=np.int64) + INTERVAL_MS[interval]
+        return np.searchsorted(bar_close, minute_close, side="right")
+
+    def align(self, data, interval, values):
+        """
+        Lleva una serie por vela de `interval` a las velas de 1m: cada vela de 1m recibe el
+        valor de la última vela cerrada de `interval` (NaN si todavía no hay ninguna).
+        """
+        values = np.asarray(values, dtype=float)
+        closed = self.closed_bars(data, interval)
+        if not len(values):
+            return np.full(len(closed), np.nan)
+        return np.where(closed > 0, values[np.maximum(closed - 1, 0)], np.nan)
+
+    @staticmethod
+    def lag(values, periods=1):
+        """Valor de `periods` velas antes (equivale a df.iloc[-1 - periods]); NaN/False al inicio."""
+        values = np.asarray(values)
+        if values.dtype == bool:
+            out = np.zeros(len(values), dtype=bool)
+        else:
+            out = np.full(len(values), np.nan)
+        if periods < len(values):
+            out[periods:] = values[:len(values) - periods]
+        return out
+
+    @staticmethod
+    def window_ewm(values, span, window, lag=0):
+        """
+        EWM (adjust=False) calculada solo sobre las últimas `window` filas, como cuando run()
+        aplica .ewm() a un DataFrame de `window` velas: para cada fila i devuelve el valor en
+        i - lag de la EWM que empieza en la primera fila de la ventana que termina en i.
+        Se obtiene de la EWM de todo el histórico descontando la semilla inicial.
+        """
+        values = np.asarray(values, dtype=float)
+        full = pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+        index = np.arange(len(values))
+        start = np.maximum(0, index - window + 1)
+        end = index - lag
+        valid = end >= start
+        end = np.where(valid, end, start)
+        decay = (1.0 - 2.0 / (span + 1)) ** (end - start)
+        out = full[end] - decay * (full[start] - values[start])
+        out[~valid] = np.nan
+        return out
+
+    @staticmethod
+    def signal_frame(data, buy=False, sell=False, sl_pct=0.0, tp_pct=0.0, atr=0.0):
+        """
+        Construye la salida de generate_signals: columnas open_time, signal (BUY/SELL/HOLD,
+        con BUY prioritaria como en los run() que comprueban primero la compra), sl_pct,
+        tp_pct y atr (el detailed_status["ATR"] que usa el bot si no hay sl_pct/tp_pct).
+        """
+        open_time = data["1m"]["open_time"].to_numpy()
+        n = len(open_time)
+        buy = np.zeros(n, dtype=bool) | np.asarray(buy, dtype=bool)
+        sell = np.zeros(n, dtype=bool) | np.asarray(sell, dtype=bool)
+        return pd.DataFrame({
+            "open_time": open_time,
+            "signal": np.where(buy, "BUY", np.where(sell, "SELL", "HOLD")),
+            "sl_pct": np.zeros(n) + np.asarray(sl_pct, dtype=float),
+            "tp_pct": np.zeros(n) + np.asarray(tp_pct, dtype=float),
+            "atr": np.zeros(n) + np.asarray(atr, dtype=float),
+        })
+
     def safe_run(self, capital_client_api, binance_data_provider, symbol="BTCUSDT"):
         try:
             out = self.run(capital_client_api, binance_data_provider, symbol)
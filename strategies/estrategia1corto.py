@@ -1,8 +1,6 @@
 # En strategies/estrategia1corto.py
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi
 import pandas as pd
-import ta
 import logging # Añadido
 from strategies.base import BaseStrategy # Añadido
 
@@ -70,35 +68,30 @@ class estrategia1corto(BaseStrategy): # Heredar de BaseStrategy
         }
         try:
             # --- Timeframes ---
-            prices_5m = trading_bot_instance._get_binance_klines_data("BTCUSDT", "5m", limit=max(self.ema50_period, self.atr_period, self.adx_period) + 50).get("prices", []) # Ajustar límite
+            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=self.indicator_window("5m", max(self.ema50_period, self.atr_period, self.adx_period) + 50)).get("prices", []) # Ajustar límite
             df_5m = normalize_klines(prices_5m, min_length=max(self.ema50_period, self.atr_period, self.adx_period) + 5) # Ajustar min_length
             if df_5m.empty:
                 detailed_status["error"] = "Datos 5m insuficientes."
                 return {"signal": "HOLD", "message": "Datos 5m insuficientes.", "detailed_status": detailed_status}
 
-            prices_1m = trading_bot_instance._get_binance_klines_data("BTCUSDT", "1m", limit=self.rsi_period + 50).get("prices", []) # Ajustar límite
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", self.rsi_period + 50)).get("prices", []) # Ajustar límite
             df_1m = normalize_klines(prices_1m, min_length=self.rsi_period + 5) # Ajustar min_length
             if df_1m.empty:
                 detailed_status["error"] = "Datos 1m insuficientes."
                 return {"signal": "HOLD", "message": "Datos 1m insuficientes.", "detailed_status": detailed_status}
 
             # --- Indicadores (5m) ---
-            df_5m = add_ema(df_5m, self.ema20_period)
-            df_5m = add_ema(df_5m, self.ema50_period)
-            df_5m["ATR"] = ta.volatility.AverageTrueRange(
-                high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.atr_period
-            ).average_true_range() # Nuevo
-            df_5m["ADX"] = ta.trend.ADXIndicator(
-                high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.adx_period
-            ).adx() # Nuevo
+            for period in (self.ema20_period, self.ema50_period):
+                df_5m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "EMA", period)
+            df_5m["ATR"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ATR", self.atr_period)
+            df_5m["ADX"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ADX", self.adx_period)
             
             # --- Indicadores (1m) ---
-            df_1m = add_ema(df_1m, self.ema9_period)
-            df_1m = add_rsi(df_1m, self.rsi_period)
-            macd_1m = ta.trend.MACD(df_1m['close'])
-            df_1m['MACD'] = macd_1m.macd()
-            df_1m['MACD_Signal'] = macd_1m.macd_signal()
-            df_1m['MACD_Diff'] = macd_1m.macd_diff()
+            df_1m[f"EMA{self.ema9_period}"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "EMA", self.ema9_period)
+            df_1m["RSI"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "RSI", self.rsi_period)
+            df_1m['MACD'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD", 12, 26, 9)
+            df_1m['MACD_Signal'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_SIGNAL", 12, 26, 9)
+            df_1m['MACD_Diff'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_DIFF", 12, 26, 9)
 
             latest_5m = df_5m.iloc[-1]
             latest_1m = df_1m.iloc[-1]
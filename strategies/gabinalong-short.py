@@ -1,9 +1,7 @@
 from utils.klines_utils import normalize_klines
 from utils.indicators import add_ema, add_rsi, scale_aggressiveness
+import numpy as np
 import pandas as pd
-import ta.trend
-import ta.volatility
-import ta.volume
 import logging
 from strategies.base import BaseStrategy # Añadido
 
@@ -12,6 +10,8 @@ logger = logging.getLogger(__name__)
 class GabinalongShort(BaseStrategy): # Heredar de BaseStrategy
     """Estrategia GabinalongShort: Scalping basado en niveles clave de soporte y resistencia con confirmaciones de volumen y velas."""
 
+    intervals = ("1m",)
+
     def __init__(self, config=None, aggressiveness_level=3):
         super().__init__(config, aggressiveness_level) # Llamada al constructor de la clase base
         # El resto del código de __init__ se mantiene igual
@@ -66,19 +66,18 @@ class GabinalongShort(BaseStrategy): # Heredar de BaseStrategy
         try:
             # --- 1. OBTENER DATOS ---
             limit_1m = max(self.atr_period, 20, self.macd_slow, self.atr_sma_period) + 50
-            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=limit_1m).get("prices", [])
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", limit_1m)).get("prices", [])
             df_1m = normalize_klines(prices_1m, min_length=limit_1m - 10)
             if df_1m.empty:
                 detailed_status["error"] = "Datos 1m insuficientes."
                 return {"signal": "HOLD", "message": detailed_status["error"], "detailed_status": detailed_status}
 
             # --- 2. CALCULAR INDICADORES ---
-            df_1m["volume_avg"] = df_1m["volume"].rolling(window=20).mean()
-            df_1m["ATR"] = ta.volatility.AverageTrueRange(high=df_1m["high"], low=df_1m["low"], close=df_1m["close"], window=self.atr_period).average_true_range()
+            df_1m["volume_avg"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "VOLUME_SMA", 20)
+            df_1m["ATR"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "ATR", self.atr_period)
             df_1m["ATR_SMA"] = df_1m["ATR"].rolling(window=self.atr_sma_period).mean()
-            macd = ta.trend.MACD(df_1m["close"], window_fast=self.macd_fast, window_slow=self.macd_slow, window_sign=self.macd_signal)
-            df_1m["MACD"] = macd.macd()
-            df_1m["MACD_Signal"] = macd.macd_signal()
+            df_1m["MACD"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD", self.macd_fast, self.macd_slow, self.macd_signal)
+            df_1m["MACD_Signal"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_SIGNAL", self.macd_fast, self.macd_slow, self.macd_signal)
             latest_1m = df_1m.iloc[-1]
 
             daily_klines = trading_bot_instance._get_binance_klines_data(symbol, "1d", limit=2).get("prices", [])
@@ -203,3 +202,44 @@ class GabinalongShort(BaseStrategy): # Heredar de BaseStrategy
             logger.error(f"GabinalongShort error: {str(e)}")
             detailed_status["error"] = str(e)
             return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df_1m = data["1m"]
+        limit_1m = max(self.atr_period, 20, self.macd_slow, self.atr_sma_period) + 50
+        ready = (self.closed_bars(data, "1m") >= limit_1m - 10) & (self.closed_bars(data, "1d") >= 1)
+
+        open_ = df_1m["open"].to_numpy(dtype=float)
+        close = df_1m["close"].to_numpy(dtype=float)
+        volume = df_1m["volume"].to_numpy(dtype=float)
+        volume_avg = self.window_indicator(data, "1m", limit_1m, "VOLUME_SMA", 20)
+        # ATR_SMA: media de los últimos atr_sma_period ATR de la misma ventana de limit_1m velas
+        atr_bars = self.window_indicator(data, "1m", limit_1m, "ATR", self.atr_period, lags=self.atr_sma_period)
+        atr, atr_sma = atr_bars[0], np.mean(atr_bars, axis=0)
+        macd = self.window_indicator(data, "1m", limit_1m, "MACD", self.macd_fast, self.macd_slow, self.macd_signal)
+        macd_signal = self.window_indicator(data, "1m", limit_1m, "MACD_SIGNAL", self.macd_fast, self.macd_slow, self.macd_signal)
+        resistance_level = self.align(data, "1d", data["1d"]["high"])
+        support_level = self.align(data, "1d", data["1d"]["low"])
+
+        cond_volume_strong = volume > volume_avg * self.volume_multiplier
+        cond_atr_strong = atr > atr_sma
+        buy_conditions = [
+            np.abs(close - support_level) <= support_level * self.price_tolerance_factor,
+            open_ < close,
+            cond_volume_strong,
+            macd > macd_signal,
+            cond_atr_strong,
+        ]
+        sell_conditions = [
+            np.abs(close - resistance_level) <= resistance_level * self.price_tolerance_factor,
+            open_ > close,
+            cond_volume_strong,
+            macd < macd_signal,
+            cond_atr_strong,
+        ]
+        buy = ready & (np.sum(buy_conditions, axis=0) >= 4)
+        sell = ready & (np.sum(sell_conditions, axis=0) >= 4)
+        atr_valid = ~np.isnan(atr) & (atr > 0) & (close > 0)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr / close, self.sl_multiplier * 0.01)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr / close, self.tp_multiplier * 0.01)
+        return self.signal_frame(data, buy=buy, sell=sell, sl_pct=sl_pct, tp_pct=tp_pct)
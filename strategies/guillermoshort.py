@@ -1,7 +1,7 @@
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi, scale_aggressiveness
+from utils.indicators import scale_aggressiveness
+import numpy as np
 import pandas as pd
-import ta
 import logging
 from strategies.base import BaseStrategy # Añadido
 
@@ -10,6 +10,8 @@ logger = logging.getLogger(__name__)
 class Guillermoshort(BaseStrategy): # Heredar de BaseStrategy
     """Estrategia Guillermoshort: Scalping bajista con ruptura de soporte + retesteo + gestión de riesgo en 1m."""
 
+    intervals = ("1m",)
+
     def __init__(self, config=None, aggressiveness_level=3):
         super().__init__(config, aggressiveness_level) # Llamada al constructor de la clase base
         # El resto del código de __init__ se mantiene igual
@@ -78,7 +80,7 @@ class Guillermoshort(BaseStrategy): # Heredar de BaseStrategy
             ) + 30
 
             prices = trading_bot_instance._get_binance_klines_data(
-                symbol, "1m", limit=limit
+                symbol, "1m", limit=self.indicator_window("1m", limit)
             ).get("prices", [])
             df = normalize_klines(prices, min_length=limit - 10)
             if df.empty:
@@ -87,18 +89,17 @@ class Guillermoshort(BaseStrategy): # Heredar de BaseStrategy
                 return {"signal": "HOLD", "message": detailed_status["error"], "detailed_status": detailed_status}
 
             # Indicadores
-            df = add_ema(df, self.ema_fast_period)
-            df = add_ema(df, self.ema_slow_period)
-            df = add_rsi(df, self.rsi_period)
-            df["volume_avg"] = df["volume"].rolling(window=self.volume_lookback).mean()
-            df["ATR"] = ta.volatility.AverageTrueRange(
-                high=df["high"], low=df["low"], close=df["close"], window=self.atr_period
-            ).average_true_range()
+            for period in (self.ema_fast_period, self.ema_slow_period):
+                df[f"EMA{period}"] = self.indicator(trading_bot_instance, df, symbol, "1m", "EMA", period)
+            df["RSI"] = self.indicator(trading_bot_instance, df, symbol, "1m", "RSI", self.rsi_period)
+            df["volume_avg"] = self.indicator(trading_bot_instance, df, symbol, "1m", "VOLUME_SMA", self.volume_lookback)
+            df["ATR"] = self.indicator(trading_bot_instance, df, symbol, "1m", "ATR", self.atr_period)
             
             # NEW MACD Calculation
-            df["MACD"] = ta.trend.MACD(df['close'], window_slow=26, window_fast=12, window_sign=9).macd()
-            df["MACD_Signal"] = ta.trend.MACD(df['close'], window_slow=26, window_fast=12, window_sign=9).macd_signal()
-
+            df["MACD"] = self.indicator(trading_bot_instance, df, symbol, "1m", "MACD", 12, 26, 9)
+            df["MACD_Signal"] = self.indicator(trading_bot_instance, df, symbol, "1m", "MACD_SIGNAL", 12, 26, 9)
+            # Soporte y ruptura se buscan en las últimas `limit` velas
+            df = df.iloc[-limit:]
 
             latest = df.iloc[-1]
             detailed_status["current_price"] = latest['close']
@@ -226,3 +227,46 @@ class Guillermoshort(BaseStrategy): # Heredar de BaseStrategy
             logger.error(f"Guillermoshort error: {str(e)}")
             detailed_status["error"] = str(e)
             return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df = data["1m"]
+        limit = max(
+            self.ema_slow_period,
+            self.lookback_period_for_support,
+            self.rsi_period,
+            self.volume_lookback,
+            self.atr_period
+        ) + 30
+        ready = self.closed_bars(data, "1m") >= limit - 10
+
+        close = df["close"].to_numpy(dtype=float)
+        volume = df["volume"].to_numpy(dtype=float)
+        ema_fast = self.window_indicator(data, "1m", limit, "EMA", self.ema_fast_period)
+        ema_slow = self.window_indicator(data, "1m", limit, "EMA", self.ema_slow_period)
+        rsi = self.window_indicator(data, "1m", limit, "RSI", self.rsi_period)
+        volume_avg = self.window_indicator(data, "1m", limit, "VOLUME_SMA", self.volume_lookback)
+        atr = self.window_indicator(data, "1m", limit, "ATR", self.atr_period)
+        macd = self.window_indicator(data, "1m", limit, "MACD", 12, 26, 9)
+        macd_signal = self.window_indicator(data, "1m", limit, "MACD_SIGNAL", 12, 26, 9)
+
+        # Soporte: mínimo de las lookback velas anteriores; ruptura: algún cierre de la ventana por debajo
+        support_level = self.lag(df["low"].rolling(self.lookback_period_for_support, min_periods=1).min().to_numpy())
+        window_min_close = df["close"].rolling(limit, min_periods=1).min().to_numpy()
+
+        sell = (
+            ready
+            & ~(ema_fast >= ema_slow * 1.005)
+            & ~(atr < self.min_atr)
+            & ~np.isnan(support_level)
+            & (window_min_close < support_level)
+            & (support_level * (1 - self.retest_range_factor) <= close)
+            & (close <= support_level * (1 + self.retest_range_factor))
+            & (rsi < self.rsi_sell_threshold)
+            & (volume > volume_avg * self.volume_multiplier)
+            & (macd < macd_signal)
+        )
+        atr_valid = ~np.isnan(atr) & (atr > 0) & (close > 0)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr / close, self.sl_multiplier * 0.01)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr / close, self.tp_multiplier * 0.01)
+        return self.signal_frame(data, sell=sell, sl_pct=sl_pct, tp_pct=tp_pct)
@@ -1,7 +1,7 @@
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi, scale_aggressiveness
+from utils.indicators import scale_aggressiveness
+import numpy as np
 import pandas as pd
-import ta
 import logging
 
 from strategies.base import BaseStrategy
@@ -78,7 +78,7 @@ class LadisLong(BaseStrategy):
         try:
             # Datos 5m para tendencia y ATR
             limit_5m = max(self.ema_slow, self.atr_period, self.ema_long_trend_period) + 50 # Update limit_5m
-            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=limit_5m).get("prices", [])
+            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=self.indicator_window("5m", limit_5m)).get("prices", [])
             df_5m = normalize_klines(prices_5m, min_length=limit_5m - 10)
             if df_5m.empty:
                 detailed_status["data_5m_ok"] = False
@@ -88,7 +88,7 @@ class LadisLong(BaseStrategy):
 
             # Datos 1m para pullback y señal
             limit_1m = max(self.ema_fast, self.rsi_period, self.volume_lookback) + 50
-            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=limit_1m).get("prices", [])
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", limit_1m)).get("prices", [])
             df_1m = normalize_klines(prices_1m, min_length=limit_1m - 10)
             if df_1m.empty:
                 detailed_status["data_1m_ok"] = False
@@ -96,26 +96,22 @@ class LadisLong(BaseStrategy):
                 return {"signal": "HOLD", "message": detailed_status["error"], "detailed_status": detailed_status}
             detailed_status["data_1m_ok"] = True
 
-            # EMAs en 5m
-            df_5m = add_ema(df_5m, self.ema_slow)
-            df_5m = add_ema(df_5m, self.ema_fast)
-            df_5m = add_ema(df_5m, self.ema_long_trend_period) # NEW EMA calculation
+            # EMAs en 5m (desde la caché de indicadores compartida del ciclo)
+            for period in (self.ema_slow, self.ema_fast, self.ema_long_trend_period):
+                df_5m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "EMA", period)
 
             # ATR en 5m
-            df_5m["ATR"] = ta.volatility.AverageTrueRange(
-                high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.atr_period
-            ).average_true_range()
+            df_5m["ATR"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ATR", self.atr_period)
 
             # EMAs y RSI en 1m
-            df_1m = add_ema(df_1m, self.ema_fast)
-            df_1m = add_ema(df_1m, self.ema_slow)
-            df_1m = add_rsi(df_1m, self.rsi_period)
-            df_1m['volume_avg'] = df_1m['volume'].rolling(window=self.volume_lookback).mean()
+            for period in (self.ema_fast, self.ema_slow):
+                df_1m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "EMA", period)
+            df_1m["RSI"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "RSI", self.rsi_period)
+            df_1m['volume_avg'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "VOLUME_SMA", self.volume_lookback)
 
             # MACD en 1m
-            macd = ta.trend.MACD(df_1m['close'], window_slow=26, window_fast=12, window_sign=9)
-            df_1m['MACD'] = macd.macd()
-            df_1m['MACD_Signal'] = macd.macd_signal()
+            df_1m['MACD'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD", 12, 26, 9)
+            df_1m['MACD_Signal'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_SIGNAL", 12, 26, 9)
 
             latest_5m = df_5m.iloc[-1]
             latest_1m = df_1m.iloc[-1]
@@ -216,3 +212,43 @@ class LadisLong(BaseStrategy):
             logger.error(f"LadisLong error: {str(e)}")
             detailed_status["error"] = str(e)
             return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df_1m, df_5m = data["1m"], data["5m"]
+        limit_5m = max(self.ema_slow, self.atr_period, self.ema_long_trend_period) + 50
+        limit_1m = max(self.ema_fast, self.rsi_period, self.volume_lookback) + 50
+        ready = (self.closed_bars(data, "5m") >= limit_5m - 10) & (self.closed_bars(data, "1m") >= limit_1m - 10)
+
+        ema_fast_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_fast))
+        ema_slow_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_slow))
+        ema_long_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_long_trend_period))
+        atr_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "ATR", self.atr_period))
+        close_5m = self.align(data, "5m", df_5m["close"])
+
+        close = df_1m["close"].to_numpy(dtype=float)
+        low = df_1m["low"].to_numpy(dtype=float)
+        volume = df_1m["volume"].to_numpy(dtype=float)
+        ema_fast_1m = self.window_indicator(data, "1m", limit_1m, "EMA", self.ema_fast)
+        rsi = self.window_indicator(data, "1m", limit_1m, "RSI", self.rsi_period)
+        volume_avg = self.window_indicator(data, "1m", limit_1m, "VOLUME_SMA", self.volume_lookback)
+        # Cruce en alguna de las 3 últimas velas de la misma ventana de limit_1m velas
+        macd = self.window_indicator(data, "1m", limit_1m, "MACD", 12, 26, 9, lags=4)
+        macd_signal = self.window_indicator(data, "1m", limit_1m, "MACD_SIGNAL", 12, 26, 9, lags=4)
+        macd_cross = np.any([
+            (macd[i - 1] > macd_signal[i - 1]) & (macd[i] < macd_signal[i]) for i in range(1, 4)
+        ], axis=0)
+        buy = (
+            ready
+            & ~np.isnan(atr_5m) & (atr_5m >= self.min_atr)
+            & (ema_fast_5m > ema_slow_5m)
+            & (close_5m > ema_long_5m)
+            & (low <= ema_fast_1m) & (close > ema_fast_1m)
+            & (self.rsi_min_level < rsi) & (rsi < self.rsi_max_level)
+            & (volume > volume_avg * self.volume_multiplier) & (volume > self.lag(volume))
+            & macd_cross
+        )
+        atr_valid = ~np.isnan(atr_5m) & (atr_5m > 0) & (close > 0)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr_5m / close, self.sl_multiplier * 0.01)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr_5m / close, self.tp_multiplier * 0.01)
+        return self.signal_frame(data, buy=buy, sl_pct=sl_pct, tp_pct=tp_pct)
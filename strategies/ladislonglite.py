@@ -1,7 +1,6 @@
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi
+import numpy as np
 import pandas as pd
-import ta
 import logging
 from strategies.base import BaseStrategy # Añadido
 
@@ -56,38 +55,33 @@ class LadisLongLite(BaseStrategy): # Heredar de BaseStrategy
         try:
             # --- Datos 5m ---
             limit_5m = max(self.ema_slow, self.atr_period, self.ema_long_trend_period, self.adx_period) + 50 # Update limit_5m
-            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=limit_5m).get("prices", [])
+            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=self.indicator_window("5m", limit_5m)).get("prices", [])
             df_5m = normalize_klines(prices_5m, min_length=limit_5m - 10)
             if df_5m.empty:
                 return {"signal": "HOLD", "message": f"Datos 5m insuficientes para {symbol}. Se requieren {limit_5m} velas.", "detailed_status": detailed_status}
 
             # --- Datos 1m ---
             limit_1m = max(self.ema_fast, self.rsi_period, self.volume_lookback) + 51
-            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=limit_1m).get("prices", [])
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", limit_1m)).get("prices", [])
             df_1m = normalize_klines(prices_1m, min_length=limit_1m - 10)
             if df_1m.empty:
                 return {"signal": "HOLD", "message": f"Datos 1m insuficientes para {symbol}. Se requieren {limit_1m} velas.", "detailed_status": detailed_status}
 
             # --- Indicadores 5m ---
-            df_5m = add_ema(df_5m, self.ema_slow)
-            df_5m = add_ema(df_5m, self.ema_fast)
-            df_5m = add_ema(df_5m, self.ema_long_trend_period)
-            df_5m["ATR"] = ta.volatility.AverageTrueRange(
-                high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.atr_period
-            ).average_true_range()
+            for period in (self.ema_slow, self.ema_fast, self.ema_long_trend_period):
+                df_5m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "EMA", period)
+            df_5m["ATR"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ATR", self.atr_period)
             df_5m["ATR_SMA"] = df_5m["ATR"].rolling(window=self.atr_sma_period).mean()
-            adx_indicator = ta.trend.ADXIndicator(high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.adx_period)
-            df_5m['ADX'] = adx_indicator.adx()
+            df_5m['ADX'] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ADX", self.adx_period)
 
 
             # --- Indicadores 1m ---
-            df_1m = add_ema(df_1m, self.ema_fast)
-            df_1m = add_ema(df_1m, self.ema_slow)
-            df_1m = add_rsi(df_1m, self.rsi_period)
-            df_1m["volume_avg"] = df_1m["volume"].rolling(window=self.volume_lookback).mean()
-            macd = ta.trend.MACD(df_1m['close'])
-            df_1m['MACD'] = macd.macd()
-            df_1m['MACD_Signal'] = macd.macd_signal()
+            for period in (self.ema_fast, self.ema_slow):
+                df_1m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "EMA", period)
+            df_1m["RSI"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "RSI", self.rsi_period)
+            df_1m["volume_avg"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "VOLUME_SMA", self.volume_lookback)
+            df_1m['MACD'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD", 12, 26, 9)
+            df_1m['MACD_Signal'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_SIGNAL", 12, 26, 9)
 
             # --- Últimas velas ---
             latest_5m = df_5m.iloc[-1]
@@ -182,3 +176,50 @@ class LadisLongLite(BaseStrategy): # Heredar de BaseStrategy
             logger.error(f"LadisLongLite error: {str(e)}")
             detailed_status["error"] = str(e)
             return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df_1m, df_5m = data["1m"], data["5m"]
+        limit_5m = max(self.ema_slow, self.atr_period, self.ema_long_trend_period, self.adx_period) + 50
+        limit_1m = max(self.ema_fast, self.rsi_period, self.volume_lookback) + 51
+        ready = (self.closed_bars(data, "5m") >= limit_5m - 10) & (self.closed_bars(data, "1m") >= limit_1m - 10)
+
+        ema_long_5m_bars = self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_long_trend_period, lags=2)
+        # ATR_SMA: media de los últimos atr_sma_period ATR de la misma ventana de limit_5m velas
+        atr_5m_bars = self.window_indicator(data, "5m", limit_5m, "ATR", self.atr_period, lags=self.atr_sma_period)
+        ema_fast_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_fast))
+        ema_slow_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_slow))
+        ema_long_5m = self.align(data, "5m", ema_long_5m_bars[0])
+        prev_ema_long_5m = self.align(data, "5m", ema_long_5m_bars[1])
+        atr_5m = self.align(data, "5m", atr_5m_bars[0])
+        atr_sma_5m = self.align(data, "5m", np.mean(atr_5m_bars, axis=0))
+        adx_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "ADX", self.adx_period))
+        close_5m = self.align(data, "5m", df_5m["close"])
+
+        close = df_1m["close"].to_numpy(dtype=float)
+        low = df_1m["low"].to_numpy(dtype=float)
+        volume = df_1m["volume"].to_numpy(dtype=float)
+        ema_fast_1m = self.window_indicator(data, "1m", limit_1m, "EMA", self.ema_fast, lags=2)
+        rsi = self.window_indicator(data, "1m", limit_1m, "RSI", self.rsi_period)
+        volume_avg = self.window_indicator(data, "1m", limit_1m, "VOLUME_SMA", self.volume_lookback)
+        macd = self.window_indicator(data, "1m", limit_1m, "MACD", 12, 26, 9)
+        macd_signal = self.window_indicator(data, "1m", limit_1m, "MACD_SIGNAL", 12, 26, 9)
+
+        conditions = [
+            ~np.isnan(atr_5m) & (atr_5m >= self.min_atr),
+            ema_fast_5m > ema_slow_5m,
+            close_5m > ema_long_5m,
+            (self.lag(low) <= ema_fast_1m[1]) & (close > ema_fast_1m[0]),
+            (self.rsi_min_level < rsi) & (rsi < self.rsi_max_level),
+            volume > volume_avg * self.volume_multiplier,
+            macd > macd_signal,
+            atr_5m > atr_sma_5m,
+            np.abs(ema_fast_5m - ema_slow_5m) / close_5m * 100 > self.min_ema_spread_pct,
+            ema_long_5m > prev_ema_long_5m,
+            adx_5m > self.adx_threshold,
+        ]
+        buy = ready & (np.sum(conditions, axis=0) >= self.required_conditions)
+        atr_valid = ~np.isnan(atr_5m)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr_5m / close, 0.0)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr_5m / close, 0.0)
+        return self.signal_frame(data, buy=buy, sl_pct=sl_pct, tp_pct=tp_pct, atr=atr_5m)
@@ -1,9 +1,7 @@
 from utils.klines_utils import normalize_klines
 from utils.indicators import add_ema, add_rsi
+import numpy as np
 import pandas as pd
-import ta.volatility
-import ta.momentum
-import ta.volume
 import logging
 from strategies.base import BaseStrategy
 
@@ -15,6 +13,8 @@ class LateralReversal(BaseStrategy):
     dentro de un rango lateral, utilizando Bandas de Bollinger, RSI y volumen.
     """
 
+    intervals = ("1m",)
+
     def __init__(self, config=None, aggressiveness_level=3):
         super().__init__(config, aggressiveness_level)
 
@@ -78,7 +78,7 @@ class LateralReversal(BaseStrategy):
             # --- 1. OBTENER DATOS ---
             # Necesitamos suficientes datos para BB, RSI, ATR y Volumen
             limit = max(self.bb_window, self.rsi_window, self.atr_window, self.volume_window) + 50
-            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=limit).get("prices", [])
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", limit)).get("prices", [])
             df_1m = normalize_klines(prices_1m, min_length=limit - 10)
 
             if df_1m.empty:
@@ -88,17 +88,17 @@ class LateralReversal(BaseStrategy):
 
             # --- 2. CALCULAR INDICADORES ---
             # Bandas de Bollinger
-            df_1m["BBL"] = ta.volatility.bollinger_lband(df_1m["close"], window=self.bb_window, window_dev=self.bb_window_dev)
-            df_1m["BBU"] = ta.volatility.bollinger_hband(df_1m["close"], window=self.bb_window, window_dev=self.bb_window_dev)
+            df_1m["BBL"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "BB_LOW", self.bb_window, self.bb_window_dev)
+            df_1m["BBU"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "BB_HIGH", self.bb_window, self.bb_window_dev)
 
             # RSI
-            df_1m["RSI"] = ta.momentum.rsi(df_1m["close"], window=self.rsi_window)
+            df_1m["RSI"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "RSI", self.rsi_window)
 
             # ATR
-            df_1m["ATR"] = ta.volatility.average_true_range(df_1m["high"], df_1m["low"], df_1m["close"], window=self.atr_window)
+            df_1m["ATR"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "ATR", self.atr_window)
 
             # Volumen promedio
-            df_1m["Volume_MA"] = df_1m["volume"].rolling(window=self.volume_window).mean()
+            df_1m["Volume_MA"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "VOLUME_SMA", self.volume_window)
 
             latest_candle = df_1m.iloc[-1]
             prev_candle = df_1m.iloc[-2]
@@ -206,3 +206,34 @@ class LateralReversal(BaseStrategy):
             logger.error(f"Error en LateralReversal: {str(e)}")
             detailed_status["error"] = str(e)
             return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df_1m = data["1m"]
+        limit = max(self.bb_window, self.rsi_window, self.atr_window, self.volume_window) + 50
+        ready = self.closed_bars(data, "1m") >= limit - 10
+
+        open_ = df_1m["open"].to_numpy(dtype=float)
+        close = df_1m["close"].to_numpy(dtype=float)
+        volume = df_1m["volume"].to_numpy(dtype=float)
+        bb_low = self.window_indicator(data, "1m", limit, "BB_LOW", self.bb_window, self.bb_window_dev)
+        bb_high = self.window_indicator(data, "1m", limit, "BB_HIGH", self.bb_window, self.bb_window_dev)
+        rsi = self.window_indicator(data, "1m", limit, "RSI", self.rsi_window)
+        atr = self.window_indicator(data, "1m", limit, "ATR", self.atr_window)
+        volume_ma = self.window_indicator(data, "1m", limit, "VOLUME_SMA", self.volume_window)
+
+        volume_confirm = volume > volume_ma * self.volume_multiplier
+        buy = (
+            ready
+            & (close <= bb_low * (1 + self.bb_tolerance_factor))
+            & (rsi < self.rsi_oversold) & (close > open_) & volume_confirm
+        )
+        sell = (
+            ready
+            & (close >= bb_high * (1 - self.bb_tolerance_factor))
+            & (rsi > self.rsi_overbought) & (close < open_) & volume_confirm
+        )
+        atr_valid = ~np.isnan(atr) & (atr > 0) & (close > 0)
+        sl_pct = np.where(atr_valid, self.sl_atr_multiplier * atr / close, self.sl_atr_multiplier * 0.01)
+        tp_pct = np.where(atr_valid, self.tp_atr_multiplier * atr / close, self.tp_atr_multiplier * 0.01)
+        return self.signal_frame(data, buy=buy, sell=sell, sl_pct=sl_pct, tp_pct=tp_pct)
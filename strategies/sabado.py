@@ -1,7 +1,7 @@
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi, scale_aggressiveness
+from utils.indicators import scale_aggressiveness
+import numpy as np
 import pandas as pd
-import ta
 from strategies.base import BaseStrategy # Añadido
 
 class Sabado(BaseStrategy): # Heredar de BaseStrategy
@@ -69,7 +69,7 @@ class Sabado(BaseStrategy): # Heredar de BaseStrategy
 
         try:
             # Get 5m klines for downtrend and pullback detection
-            prices_5m = trading_bot_instance._get_binance_klines_data("BTCUSDT", "5m", limit=self.ema_long_period + 50).get("prices", [])
+            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=self.indicator_window("5m", self.ema_long_period + 50)).get("prices", [])
             df_5m = normalize_klines(prices_5m, min_length=self.ema_long_period + 5)
             if df_5m.empty:
                 detailed_status["data_5m_ok"] = False
@@ -77,10 +77,9 @@ class Sabado(BaseStrategy): # Heredar de BaseStrategy
                 return {"signal": "HOLD", "message": detailed_status["error"], "detailed_status": detailed_status}
             detailed_status["data_5m_ok"] = True
 
-            df_5m = add_ema(df_5m, self.ema_long_period)
-            df_5m = add_ema(df_5m, self.ema_medium_period)
-            df_5m = add_ema(df_5m, self.ema_short_period)
-            df_5m["ATR"] = ta.volatility.AverageTrueRange(high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.atr_period).average_true_range() # Añadido
+            for period in (self.ema_long_period, self.ema_medium_period, self.ema_short_period):
+                df_5m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "EMA", period)
+            df_5m["ATR"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ATR", self.atr_period)
             df_5m[f'volume_ema_{self.volume_ema_period}'] = df_5m['volume'].ewm(span=self.volume_ema_period, adjust=False).mean()
 
 
@@ -113,7 +112,7 @@ class Sabado(BaseStrategy): # Heredar de BaseStrategy
                 return {"signal": "HOLD", "message": f"Pullback (Close {latest_5m['close']:.2f} entre EMA{self.ema_short_period} {detailed_status['ema_short_5m']:.2f} y EMA{self.ema_medium_period} {detailed_status['ema_medium_5m']:.2f}): {'✅' if is_pullback else '❌'}", "detailed_status": detailed_status}
 
             # Get 1m klines for confirmation indicators
-            prices_1m = trading_bot_instance._get_binance_klines_data("BTCUSDT", "1m", limit=self.rsi_period + 50).get("prices", [])
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", self.rsi_period + 50)).get("prices", [])
             df_1m = normalize_klines(prices_1m, min_length=self.rsi_period + 5)
             if df_1m.empty:
                 detailed_status["data_1m_ok"] = False
@@ -121,8 +120,9 @@ class Sabado(BaseStrategy): # Heredar de BaseStrategy
                 return {"signal": "HOLD", "message": detailed_status["error"], "detailed_status": detailed_status}
             detailed_status["data_1m_ok"] = True
 
-            df_1m = add_rsi(df_1m, self.rsi_period)
-            macd_1m = ta.trend.MACD(df_1m['close']); df_1m['MACD'] = macd_1m.macd(); df_1m['MACD_Signal'] = macd_1m.macd_signal()
+            df_1m["RSI"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "RSI", self.rsi_period)
+            df_1m['MACD'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD", 12, 26, 9)
+            df_1m['MACD_Signal'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_SIGNAL", 12, 26, 9)
 
             latest_1m = df_1m.iloc[-1]
             prev_1m = df_1m.iloc[-2]
@@ -206,4 +206,51 @@ class Sabado(BaseStrategy): # Heredar de BaseStrategy
 
         except Exception as e:
             detailed_status["error"] = str(e)
-            return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
\ No newline at end of file
+            return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df_5m = data["5m"]
+        ready = (
+            (self.closed_bars(data, "5m") >= self.ema_long_period + 5)
+            & (self.closed_bars(data, "1m") >= self.rsi_period + 5)
+        )
+
+        limit_5m = self.ema_long_period + 50
+        limit_1m = self.rsi_period + 50
+        ema_medium_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_medium_period))
+        ema_short_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_short_period))
+        atr_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "ATR", self.atr_period))
+        close_5m = self.align(data, "5m", df_5m["close"])
+        open_5m = self.align(data, "5m", df_5m["open"])
+        volume_5m = self.align(data, "5m", df_5m["volume"])
+        # run() calcula la EWM del volumen sobre la ventana de indicadores de 5m y usa la penúltima
+        prev_volume_ema_5m = self.align(data, "5m", self.window_ewm(
+            df_5m["volume"], self.volume_ema_period, self.indicator_window("5m", limit_5m), lag=1
+        ))
+
+        rsi = self.window_indicator(data, "1m", limit_1m, "RSI", self.rsi_period)
+        # Cruce en alguna de las 3 últimas velas de la misma ventana de limit_1m velas
+        macd = self.window_indicator(data, "1m", limit_1m, "MACD", 12, 26, 9, lags=4)
+        macd_signal = self.window_indicator(data, "1m", limit_1m, "MACD_SIGNAL", 12, 26, 9, lags=4)
+        macd_cross = np.any([
+            (macd[i - 1] < macd_signal[i - 1]) & (macd[i] > macd_signal[i]) for i in range(1, 4)
+        ], axis=0)
+
+        is_downtrend = (close_5m <= ema_medium_5m * 1.005) & (ema_short_5m < ema_medium_5m)
+        is_pullback = (close_5m >= ema_short_5m * 0.99) & (close_5m < ema_medium_5m * 1.005)
+        conditions = [
+            is_downtrend,
+            is_pullback,
+            rsi < self.rsi_overbought_threshold,
+            macd_cross,
+            (close_5m <= open_5m * 1.005) & (close_5m < ema_medium_5m * 1.005),
+            volume_5m > prev_volume_ema_5m * self.volume_multiplier,
+            atr_5m / close_5m > self.min_atr_threshold,
+            atr_5m / close_5m < self.max_atr_threshold,
+        ]
+        sell = ready & is_downtrend & is_pullback & (np.sum(conditions, axis=0) >= 6)
+        atr_valid = ~np.isnan(atr_5m) & (atr_5m > 0) & (close_5m > 0)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr_5m / close_5m, self.sl_multiplier * 0.01)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr_5m / close_5m, self.tp_multiplier * 0.01)
+        return self.signal_frame(data, sell=sell, sl_pct=sl_pct, tp_pct=tp_pct)
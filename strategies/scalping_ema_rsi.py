@@ -1,7 +1,6 @@
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi
+import numpy as np
 import pandas as pd
-import ta
 import logging
 from strategies.base import BaseStrategy # Añadido
 
@@ -17,6 +16,8 @@ class ScalpingEmaRsi(BaseStrategy): # Heredar de BaseStrategy
     - Venta: Cruce bajista de EMAs con RSI por encima de un umbral y bajando.
     """
 
+    intervals = ("5m",)
+
     def __init__(self, config=None, aggressiveness_level=3):
         super().__init__(config, aggressiveness_level) # Llamada al constructor de la clase base
         # El resto del código de __init__ se mantiene igual
@@ -58,18 +59,16 @@ class ScalpingEmaRsi(BaseStrategy): # Heredar de BaseStrategy
         try:
             # --- Obtención de datos ---
             limit = self.ema_slow_period + self.rsi_period + 5 # Suficiente histórico para los indicadores
-            prices = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=limit).get("prices", [])
+            prices = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=self.indicator_window("5m", limit)).get("prices", [])
             df = normalize_klines(prices, min_length=limit - 2)
 
             if df.empty:
                 return {"signal": "HOLD", "message": f"Datos insuficientes para la estrategia {symbol}. Se requieren {limit} velas.", "detailed_status": detailed_status}
             # --- Cálculo de Indicadores ---
-            df = add_ema(df, self.ema_fast_period)
-            df = add_ema(df, self.ema_slow_period)
-            df = add_rsi(df, self.rsi_period)
-            df["ATR"] = ta.volatility.AverageTrueRange(
-                high=df["high"], low=df["low"], close=df["close"], window=self.atr_period
-            ).average_true_range()
+            for period in (self.ema_fast_period, self.ema_slow_period):
+                df[f"EMA{period}"] = self.indicator(trading_bot_instance, df, symbol, "5m", "EMA", period)
+            df["RSI"] = self.indicator(trading_bot_instance, df, symbol, "5m", "RSI", self.rsi_period)
+            df["ATR"] = self.indicator(trading_bot_instance, df, symbol, "5m", "ATR", self.atr_period)
 
             # Obtener las dos últimas velas para detectar el cruce
             latest = df.iloc[-1]
@@ -139,4 +138,32 @@ class ScalpingEmaRsi(BaseStrategy): # Heredar de BaseStrategy
 
         except Exception as e:
             logger.error(f"Error en ScalpingEmaRsi: {str(e)}")
-            return {"signal": "ERROR", "message": str(e)}
\ No newline at end of file
+            return {"signal": "ERROR", "message": str(e)}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        limit = self.ema_slow_period + self.rsi_period + 5
+        ready = self.closed_bars(data, "5m") >= limit - 2
+
+        ema_fast = self.window_indicator(data, "5m", limit, "EMA", self.ema_fast_period, lags=2)
+        ema_slow = self.window_indicator(data, "5m", limit, "EMA", self.ema_slow_period, lags=2)
+        rsi = self.align(data, "5m", self.window_indicator(data, "5m", limit, "RSI", self.rsi_period))
+        atr = self.align(data, "5m", self.window_indicator(data, "5m", limit, "ATR", self.atr_period))
+        close = self.align(data, "5m", data["5m"]["close"])
+        ema_fast_latest, ema_slow_latest = self.align(data, "5m", ema_fast[0]), self.align(data, "5m", ema_slow[0])
+        ema_fast_previous, ema_slow_previous = self.align(data, "5m", ema_fast[1]), self.align(data, "5m", ema_slow[1])
+
+        buy = (
+            ready
+            & (ema_fast_previous < ema_slow_previous) & (ema_fast_latest > ema_slow_latest)
+            & (rsi < self.rsi_buy_max)
+        )
+        sell = (
+            ready
+            & (ema_fast_previous > ema_slow_previous) & (ema_fast_latest < ema_slow_latest)
+            & (rsi > self.rsi_sell_min)
+        )
+        atr_valid = ~np.isnan(atr)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr / close, 0.0)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr / close, 0.0)
+        return self.signal_frame(data, buy=buy, sell=sell, sl_pct=sl_pct, tp_pct=tp_pct, atr=atr)
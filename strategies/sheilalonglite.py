@@ -1,7 +1,6 @@
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi
+import numpy as np
 import pandas as pd
-import ta
 import logging
 from strategies.base import BaseStrategy # Añadido
 
@@ -68,34 +67,32 @@ class SheilalongLite(BaseStrategy): # Heredar de BaseStrategy # Version check: A
         try:
             # --- Datos 1m ---
             limit_1m = max(self.opening_range_minutes, self.ema_slow, self.rsi_period, self.volume_lookback, self.macd_slow, self.atr_period, self.adx_period) + 30
-            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=limit_1m).get("prices", [])
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", limit_1m)).get("prices", [])
             df_1m = normalize_klines(prices_1m, min_length=limit_1m - 10)
             if df_1m.empty:
                 detailed_status["error"] = "Datos 1m insuficientes."
                 return {"signal": "HOLD", "message": "Datos 1m insuficientes.", "detailed_status": detailed_status}
 
-            df_1m = add_ema(df_1m, self.ema_fast)
-            df_1m = add_ema(df_1m, self.ema_slow)
-            df_1m = add_rsi(df_1m, self.rsi_period)
-            df_1m["volume_avg"] = df_1m["volume"].rolling(window=self.volume_lookback).mean()
-            df_1m["MACD"] = ta.trend.macd(df_1m["close"], window_fast=self.macd_fast, window_slow=self.macd_slow)
-            df_1m["MACD_Signal"] = ta.trend.macd_signal(df_1m["close"], window_fast=self.macd_fast, window_slow=self.macd_slow, window_sign=self.macd_signal)
-            df_1m["ATR"] = ta.volatility.AverageTrueRange(high=df_1m["high"], low=df_1m["low"], close=df_1m["close"], window=self.atr_period).average_true_range()
-            adx_indicator = ta.trend.ADXIndicator(high=df_1m["high"], low=df_1m["low"], close=df_1m["close"], window=self.adx_period)
-            df_1m['ADX'] = adx_indicator.adx()
+            for period in (self.ema_fast, self.ema_slow):
+                df_1m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "EMA", period)
+            df_1m["RSI"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "RSI", self.rsi_period)
+            df_1m["volume_avg"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "VOLUME_SMA", self.volume_lookback)
+            df_1m["MACD"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD", self.macd_fast, self.macd_slow, self.macd_signal)
+            df_1m["MACD_Signal"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_SIGNAL", self.macd_fast, self.macd_slow, self.macd_signal)
+            df_1m["ATR"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "ATR", self.atr_period)
+            df_1m['ADX'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "ADX", self.adx_period)
 
             # --- Datos 5m ---
             limit_5m = max(self.ema_slow, self.ema_trend_period, self.atr_period, self.atr_sma_period) + 30
-            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=limit_5m).get("prices", [])
+            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=self.indicator_window("5m", limit_5m)).get("prices", [])
             df_5m = normalize_klines(prices_5m, min_length=limit_5m - 10)
             if df_5m.empty:
                 detailed_status["error"] = f"Datos 5m insuficientes para {symbol}."
                 return {"signal": "HOLD", "message": f"Datos 5m insuficientes para {symbol}.", "detailed_status": detailed_status}
 
-            df_5m = add_ema(df_5m, self.ema_fast)
-            df_5m = add_ema(df_5m, self.ema_slow)
-            df_5m = add_ema(df_5m, self.ema_trend_period)
-            df_5m["ATR"] = ta.volatility.AverageTrueRange(high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.atr_period).average_true_range()
+            for period in (self.ema_fast, self.ema_slow, self.ema_trend_period):
+                df_5m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "EMA", period)
+            df_5m["ATR"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ATR", self.atr_period)
             df_5m["ATR_SMA"] = df_5m["ATR"].rolling(window=self.atr_sma_period).mean()
 
             # --- Últimos datos ---
@@ -103,8 +100,8 @@ class SheilalongLite(BaseStrategy): # Heredar de BaseStrategy # Version check: A
             prev_1m = df_1m.iloc[-2]
             latest_5m = df_5m.iloc[-1]
 
-            # --- Opening range ---
-            opening_range_high = df_1m["high"].iloc[:self.opening_range_minutes].max()
+            # --- Opening range (primeras velas de las últimas limit_1m) ---
+            opening_range_high = df_1m["high"].iloc[-limit_1m:].iloc[:self.opening_range_minutes].max()
             detailed_status["opening_range_high"] = opening_range_high
 
             # --- Condiciones ---
@@ -165,3 +162,43 @@ class SheilalongLite(BaseStrategy): # Heredar de BaseStrategy # Version check: A
             logger.error(f"SheilalongLite error: {str(e)}")
             detailed_status["error"] = str(e)
             return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df_1m = data["1m"]
+        limit_1m = max(self.opening_range_minutes, self.ema_slow, self.rsi_period, self.volume_lookback, self.macd_slow, self.atr_period, self.adx_period) + 30
+        limit_5m = max(self.ema_slow, self.ema_trend_period, self.atr_period, self.atr_sma_period) + 30
+        ready = (self.closed_bars(data, "1m") >= limit_1m - 10) & (self.closed_bars(data, "5m") >= limit_5m - 10)
+
+        close = df_1m["close"].to_numpy(dtype=float)
+        volume = df_1m["volume"].to_numpy(dtype=float)
+        rsi = self.window_indicator(data, "1m", limit_1m, "RSI", self.rsi_period)
+        volume_avg = self.window_indicator(data, "1m", limit_1m, "VOLUME_SMA", self.volume_lookback)
+        macd = self.window_indicator(data, "1m", limit_1m, "MACD", self.macd_fast, self.macd_slow, self.macd_signal, lags=2)
+        macd_signal = self.window_indicator(data, "1m", limit_1m, "MACD_SIGNAL", self.macd_fast, self.macd_slow, self.macd_signal, lags=2)
+        atr = self.window_indicator(data, "1m", limit_1m, "ATR", self.atr_period)
+        adx = self.window_indicator(data, "1m", limit_1m, "ADX", self.adx_period)
+        # ATR_SMA: media de los últimos atr_sma_period ATR de la misma ventana de limit_5m velas
+        atr_5m_bars = self.window_indicator(data, "5m", limit_5m, "ATR", self.atr_period, lags=self.atr_sma_period)
+        atr_5m = self.align(data, "5m", atr_5m_bars[0])
+        atr_sma_5m = self.align(data, "5m", np.mean(atr_5m_bars, axis=0))
+
+        # Máximo de las primeras opening_range_minutes velas de la ventana de limit_1m velas que ve run()
+        index = np.arange(len(close))
+        window_start = np.maximum(0, index - limit_1m + 1)
+        rolling_high = df_1m["high"].rolling(self.opening_range_minutes, min_periods=1).max().to_numpy()
+        opening_range_high = rolling_high[np.minimum(window_start + self.opening_range_minutes - 1, index)]
+
+        valid_breakout = (close > opening_range_high) & (self.lag(close) > opening_range_high)
+        is_volume_strong = volume > volume_avg * self.volume_multiplier
+        optional_conditions = [
+            rsi > self.rsi_buy_threshold,
+            (macd[0] > macd_signal[0]) & (macd[1] < macd_signal[1]),
+            atr_5m > atr_sma_5m,
+            adx > self.adx_threshold,
+        ]
+        buy = ready & valid_breakout & is_volume_strong & (np.sum(optional_conditions, axis=0) >= 2)
+        atr_valid = ~np.isnan(atr) & (atr > 0) & (close > 0)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr / close, self.sl_multiplier * 0.01)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr / close, self.tp_multiplier * 0.01)
+        return self.signal_frame(data, buy=buy, sl_pct=sl_pct, tp_pct=tp_pct)
@@ -1,5 +1,5 @@
 from utils.klines_utils import normalize_klines
-from utils.indicators import add_ema, add_rsi
+import numpy as np
 import pandas as pd
 import ta
 import logging
@@ -61,14 +61,14 @@ class SheilashortLite(BaseStrategy): # Heredar de BaseStrategy
         try:
             # --- 1. OBTENER DATOS ---
             limit_5m = max(self.ema_slow_period, self.volume_ema_period, self.adx_period) + 10
-            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=limit_5m).get("prices", [])
+            prices_5m = trading_bot_instance._get_binance_klines_data(symbol, "5m", limit=self.indicator_window("5m", limit_5m)).get("prices", [])
             df_5m = normalize_klines(prices_5m, min_length=limit_5m -5)
             if df_5m.empty:
                 detailed_status["error"] = "Datos 5m insuficientes."
                 return {"signal": "HOLD", "message": f"Datos 5m insuficientes para {symbol}.", "detailed_status": detailed_status}
 
             limit_1m = max(self.rsi_period, self.atr_period) + 50
-            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=limit_1m).get("prices", [])
+            prices_1m = trading_bot_instance._get_binance_klines_data(symbol, "1m", limit=self.indicator_window("1m", limit_1m)).get("prices", [])
             df_1m = normalize_klines(prices_1m, min_length=limit_1m - 5)
             if df_1m.empty:
                 detailed_status["error"] = "Datos 1m insuficientes."
@@ -76,19 +76,18 @@ class SheilashortLite(BaseStrategy): # Heredar de BaseStrategy
 
             # --- 2. CALCULAR INDICADORES ---
             # Contexto en 5m
-            df_5m = add_ema(df_5m, self.ema_slow_period)
-            df_5m = add_ema(df_5m, self.ema_fast_period)
+            for period in (self.ema_slow_period, self.ema_fast_period):
+                df_5m[f"EMA{period}"] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "EMA", period)
             df_5m['Volume_EMA'] = ta.trend.ema_indicator(df_5m['volume'], window=self.volume_ema_period, fillna=True)
-            df_5m['ADX'] = ta.trend.ADXIndicator(high=df_5m["high"], low=df_5m["low"], close=df_5m["close"], window=self.adx_period).adx()
+            df_5m['ADX'] = self.indicator(trading_bot_instance, df_5m, symbol, "5m", "ADX", self.adx_period)
             latest_5m = df_5m.iloc[-1]
 
             # Gatillo en 1m
-            df_1m = add_ema(df_1m, self.ema_trigger_period)
-            df_1m = add_rsi(df_1m, self.rsi_period)
-            macd_1m = ta.trend.MACD(df_1m['close'])
-            df_1m['MACD'] = macd_1m.macd()
-            df_1m['MACD_Signal'] = macd_1m.macd_signal()
-            df_1m["ATR"] = ta.volatility.AverageTrueRange(high=df_1m["high"], low=df_1m["low"], close=df_1m["close"], window=self.atr_period).average_true_range()
+            df_1m[f"EMA{self.ema_trigger_period}"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "EMA", self.ema_trigger_period)
+            df_1m["RSI"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "RSI", self.rsi_period)
+            df_1m['MACD'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD", 12, 26, 9)
+            df_1m['MACD_Signal'] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "MACD_SIGNAL", 12, 26, 9)
+            df_1m["ATR"] = self.indicator(trading_bot_instance, df_1m, symbol, "1m", "ATR", self.atr_period)
             latest_1m = df_1m.iloc[-1]
             prev_1m = df_1m.iloc[-2]
 
@@ -151,4 +150,45 @@ class SheilashortLite(BaseStrategy): # Heredar de BaseStrategy
         except Exception as e:
             logger.error(f"SheilashortLite error: {str(e)}")
             detailed_status["error"] = str(e)
-            return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
\ No newline at end of file
+            return {"signal": "ERROR", "message": str(e), "detailed_status": detailed_status}
+
+    def generate_signals(self, data):
+        """Versión vectorizada de run(): mismas condiciones evaluadas sobre todo el histórico."""
+        df_1m, df_5m = data["1m"], data["5m"]
+        limit_5m = max(self.ema_slow_period, self.volume_ema_period, self.adx_period) + 10
+        limit_1m = max(self.rsi_period, self.atr_period) + 50
+        ready = (self.closed_bars(data, "5m") >= limit_5m - 5) & (self.closed_bars(data, "1m") >= limit_1m - 5)
+
+        ema_slow_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_slow_period))
+        ema_fast_5m = self.align(data, "5m", self.window_indicator(data, "5m", limit_5m, "EMA", self.ema_fast_period))
+        close_5m = self.align(data, "5m", df_5m["close"])
+        volume_5m = self.align(data, "5m", df_5m["volume"])
+        # Volume_EMA de run() (ta con fillna=True) se calcula sobre la ventana de indicadores de 5m
+        volume_ema_5m = self.align(data, "5m", self.window_ewm(
+            df_5m["volume"], self.volume_ema_period, self.indicator_window("5m", limit_5m)
+        ))
+
+        open_ = df_1m["open"].to_numpy(dtype=float)
+        close = df_1m["close"].to_numpy(dtype=float)
+        ema_trigger = self.window_indicator(data, "1m", limit_1m, "EMA", self.ema_trigger_period)
+        rsi = self.window_indicator(data, "1m", limit_1m, "RSI", self.rsi_period, lags=2)
+        macd = self.window_indicator(data, "1m", limit_1m, "MACD", 12, 26, 9)
+        macd_signal = self.window_indicator(data, "1m", limit_1m, "MACD_SIGNAL", 12, 26, 9)
+        atr = self.window_indicator(data, "1m", limit_1m, "ATR", self.atr_period)
+
+        context_ok = (
+            (ema_fast_5m < ema_slow_5m) & (close_5m < ema_slow_5m)
+            & (ema_fast_5m < close_5m) & (close_5m < ema_slow_5m)
+            & (volume_5m > volume_ema_5m * self.volume_multiplier)
+        )
+        trigger_conditions = [
+            close < open_,
+            close < ema_trigger,
+            macd < macd_signal,
+            (rsi[0] < self.rsi_sell_max) & (rsi[0] < rsi[1]),
+        ]
+        sell = ready & context_ok & (np.sum(trigger_conditions, axis=0) >= self.required_conditions)
+        atr_valid = ~np.isnan(atr)
+        sl_pct = np.where(atr_valid, self.sl_multiplier * atr / close, 0.0)
+        tp_pct = np.where(atr_valid, self.tp_multiplier * atr / close, 0.0)
+        return self.signal_frame(data, sell=sell, sl_pct=sl_pct, tp_pct=tp_pct)
@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("TradingBotLogger")
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+MAX_MESSAGE_LENGTH = 4096      # Límite de sendMessage
+CHAT_INTERVAL_SECONDS = 1.0    # Telegram: ~1 mensaje por segundo en el mismo chat
+GLOBAL_INTERVAL_SECONDS = 1 / 30  # Telegram: ~30 mensajes por segundo en total
+COALESCE_SEPARATOR = "\n\n"
+
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """Trocea un texto en partes de como mucho `limit` caracteres, cortando por saltos de línea si se puede."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        parts.append(text)
+    return parts
+
+
+class _Outgoing:
+    __slots__ = ("chat_id", "text", "parse_mode", "coalesce", "queued_at")
+
+    def __init__(self, chat_id, text, parse_mode, coalesce):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.coalesce = coalesce
+        self.queued_at = time.monotonic()
+
+    def joins(self, other, limit=MAX_MESSAGE_LENGTH):
+        return (self.coalesce and other.coalesce and self.chat_id == other.chat_id
+                and self.parse_mode == other.parse_mode
+                and len(self.text) + len(COALESCE_SEPARATOR) + len(other.text) <= limit)
+
+
+class TelegramGateway:
+    """
+    Acceso a la API de bots de Telegram sin bloquear a quien notifica.
+
+    - send() solo encola: un hilo en segundo plano vacía la cola (acotada a max_queue;
+      si está llena el mensaje se descarta con un aviso) con una sesión HTTP keep-alive.
+    - El envío respeta los límites de Telegram (un mensaje por segundo por chat y 30 por
+      segundo en total) y, ante un 429, espera el retry_after que indica la API.
+    - Los mensajes encolados con coalesce=True (avisos de apertura/cierre) esperan
+      coalesce_seconds y se agrupan con los siguientes del mismo chat en un solo mensaje
+      de hasta 4096 caracteres. Los textos más largos se trocean.
+    - get_updates() hace long polling real (timeout de poll_timeout_seconds en el servidor).
+    """
+
+    def __init__(self, bot_token, chat_id=None, max_queue=200, coalesce_seconds=2.0, poll_timeout_seconds=50,
+                 request_timeout_seconds=10):
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.max_queue = max_queue
+        self.coalesce_seconds = coalesce_seconds
+        self.poll_timeout_seconds = poll_timeout_seconds
+        self.request_timeout_seconds = request_timeout_seconds
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self._queue = deque()
+        self._next_chat_send = {}   # chat_id -> time.monotonic() a partir del que se puede enviar
+        self._next_send = 0.0
+        # Sesiones separadas: el long polling y el envío van en hilos distintos
+        self._send_session = self._session()
+        self._poll_session = self._session()
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Gateway con TELEGRAM_BOT_TOKEN/TELEGRAM_CHAT_ID del .env y los telegram_* de global_settings."""
+        return cls(
+            os.getenv("TELEGRAM_BOT_TOKEN"), os.getenv("TELEGRAM_CHAT_ID"),
+            max_queue=settings.get("telegram_queue_size", 200),
+            coalesce_seconds=settings.get("telegram_coalesce_seconds", 2.0),
+            poll_timeout_seconds=settings.get("telegram_poll_timeout_seconds", 50),
+        )
+
+    @staticmethod
+    def _session():
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        return session
+
+    def _url(self, method):
+        return f"{TELEGRAM_API_URL}/bot{self.bot_token}/{method}"
+
+    # --- Envío ---
+
+    def send(self, text, parse_mode=None, coalesce=False, chat_id=None):
+        """Encola un mensaje; devuelve False si no se pudo encolar."""
+        chat_id = chat_id or self.chat_id
+        if not self.bot_token or not chat_id:
+            logger.error("TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID not set in .env file.")
+            return False
+        if not text:
+            return False
+        self._ensure_sender()
+        with self.condition:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                logger.warning(f"--- TELEGRAM: cola de salida llena ({self.max_queue}); mensaje descartado ({self.dropped} en total). ---")
+                return False
+            for part in split_message(text):
+                self._queue.append(_Outgoing(chat_id, part, parse_mode, coalesce))
+            self.condition.notify()
+        return True
+
+    @property
+    def pending(self):
+        with self.condition:
+            return len(self._queue)
+
+    def _ensure_sender(self):
+        with self.condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._send_loop, name="telegram-sender", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Para el hilo de envío tras intentar vaciar la cola durante como mucho `timeout` segundos."""
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            time.sleep(0.1)
+        with self.condition:
+            self._running = False
+            self.condition.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    def _next_message(self):
+        """Saca el siguiente mensaje (agrupado si procede) cuando ya se puede enviar; None al parar."""
+        with self.condition:
+            while self._running:
+                if not self._queue:
+                    self.condition.wait()
+                    continue
+                head = self._queue[0]
+                now = time.monotonic()
+                ready_at = max(self._next_send, self._next_chat_send.get(head.chat_id, 0.0))
+                if head.coalesce:
+                    ready_at = max(ready_at, head.queued_at + self.coalesce_seconds)
+                if now < ready_at:
+                    self.condition.wait(ready_at - now)
+                    continue
+                message = self._queue.popleft()
+                # Solo se agrupan mensajes consecutivos: se mantiene el orden de la cola
+                while self._queue and message.joins(self._queue[0]):
+                    message.text += COALESCE_SEPARATOR + self._queue.popleft().text
+                return message
+            return None
+
+    def _send_loop(self):
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+            self._deliver(message)
+
+    def _deliver(self, message, attempts=3):
+        payload = {"chat_id": message.chat_id, "text": message.text}
+        if message.parse_mode:
+            payload["parse_mode"] = message.parse_mode
+        for _ in range(attempts):
+            try:
+                response = self._send_session.post(self._url("sendMessage"), json=payload, timeout=self.request_timeout_seconds)
+                now = time.monotonic()
+                if response.status_code == 429:
+                    retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                    logger.warning(f"--- TELEGRAM: límite de envío alcanzado; reintento en {retry_after}s. ---")
+                    self._block(message.chat_id, now + retry_after, global_block=True)
+                    time.sleep(retry_after)
+                    continue
+                self._block(message.chat_id, now + CHAT_INTERVAL_SECONDS)
+                response.raise_for_status()
+                logger.debug("Telegram message sent successfully.")
+                return True
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error(f"--- ERROR TELEGRAM: No se pudo enviar la notificación: {e} ---")
+                return False
+        logger.error("--- ERROR TELEGRAM: notificación descartada tras varios 429 seguidos. ---")
+        return False
+
+    def _block(self, chat_id, until, global_block=False):
+        with self.condition:
+            self._next_chat_send[chat_id] = until
+            self._next_send = until if global_block else time.monotonic() + GLOBAL_INTERVAL_SECONDS
+
+    # --- Recepción ---
+
+    def delete_webhook(self):
+        """El long polling con getUpdates no funciona si hay un webhook configurado."""
+        try:
+            return self._poll_session.post(self._url("deleteWebhook"), timeout=self.request_timeout_seconds).json().get("ok")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"No se pudo eliminar el webhook de Telegram: {e}")
+            return None
+
+    def get_updates(self, offset):
+        """Actualizaciones con update_id >= offset; la petición espera en el servidor hasta poll_timeout_seconds."""
+        params = {"offset": offset, "timeout": self.poll_timeout_seconds, "allowed_updates": '["message"]'}
+        response = self._poll_session.get(self._url("getUpdates"), params=params,
+                                          timeout=self.poll_timeout_seconds + self.request_timeout_seconds)
+        response.raise_for_status()
+        return response.json().get("result", [])
@@ -0,0 +1,171 @@
+import json
+import logging
+import threading
+from collections import Counter, deque
+
+logger = logging.getLogger("TradingBotLogger")
+
+RECENT_PER_STRATEGY = 50   # Operaciones de la ventana móvil de cada estrategia
+RECENT_GLOBAL = 200        # Últimas operaciones cerradas de las que se toma la muestra
+
+
+def _pnl(trade):
+    value = trade.get("profit_loss")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _entry_conditions(trade):
+    raw = trade.get("entry_conditions")
+    if isinstance(raw, dict):
+        return raw
+    try:
+        conditions = json.loads(raw) if raw else {}
+    except (TypeError, ValueError):
+        return {}
+    return conditions if isinstance(conditions, dict) else {}
+
+
+class _StrategyStats:
+    """Agregados de una estrategia: totales, ventana móvil, motivos de salida y condiciones de entrada."""
+
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.pnl = 0.0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.best = None
+        self.worst = None
+        self.by_direction = {}            # dirección -> [operaciones, ganadoras, P/L]
+        self.exit_reasons = Counter()
+        self.recent = deque(maxlen=RECENT_PER_STRATEGY)
+        # condición -> {"win"/"loss": [veces True, veces evaluada]} o [suma, n] si es numérica
+        self.flags = {}
+        self.values = {}
+
+    def add(self, trade, pnl):
+        won = pnl > 0
+        self.trades += 1
+        self.wins += won
+        self.pnl += pnl
+        if won:
+            self.gross_profit += pnl
+        else:
+            self.gross_loss += pnl
+        self.best = pnl if self.best is None else max(self.best, pnl)
+        self.worst = pnl if self.worst is None else min(self.worst, pnl)
+        direction = self.by_direction.setdefault(trade.get("direction") or "?", [0, 0, 0.0])
+        direction[0] += 1
+        direction[1] += won
+        direction[2] += pnl
+        self.exit_reasons[trade.get("exit_reason") or "desconocido"] += 1
+        self.recent.append(pnl)
+
+        outcome = "win" if won else "loss"
+        for name, value in _entry_conditions(trade).items():
+            if isinstance(value, bool):
+                stats = self.flags.setdefault(name, {"win": [0, 0], "loss": [0, 0]})[outcome]
+                stats[0] += value
+                stats[1] += 1
+            elif isinstance(value, (int, float)):
+                stats = self.values.setdefault(name, {"win": [0.0, 0], "loss": [0.0, 0]})[outcome]
+                stats[0] += value
+                stats[1] += 1
+
+    def summary(self):
+        recent_wins = sum(1 for pnl in self.recent if pnl > 0)
+
+        def rate(part, total):
+            return round(part / total * 100, 1) if total else None
+
+        def mean(stats):
+            return round(stats[0] / stats[1], 6) if stats[1] else None
+
+        return {
+            "operaciones": self.trades,
+            "pnl_total": round(self.pnl, 2),
+            "tasa_acierto": rate(self.wins, self.trades),
+            "pnl_medio": round(self.pnl / self.trades, 2) if self.trades else None,
+            "profit_factor": round(self.gross_profit / -self.gross_loss, 2) if self.gross_loss else None,
+            "mejor": self.best,
+            "peor": self.worst,
+            "ventana_reciente": {"operaciones": len(self.recent), "pnl": round(sum(self.recent), 2), "tasa_acierto": rate(recent_wins, len(self.recent))},
+            "por_direccion": {d: {"operaciones": n, "tasa_acierto": rate(w, n), "pnl": round(p, 2)} for d, (n, w, p) in self.by_direction.items()},
+            "motivos_salida": dict(self.exit_reasons.most_common()),
+            # % de veces que la condición se cumplía al entrar, en ganadoras y en perdedoras
+            "condiciones_entrada": {name: {o: rate(*stats[o]) for o in ("win", "loss")} for name, stats in self.flags.items()},
+            "valores_entrada_medios": {name: {o: mean(stats[o]) for o in ("win", "loss")} for name, stats in self.values.items()},
+        }
+
+
+class TradeAnalytics:
+    """
+    Resumen incremental del historial de operaciones para /analisis y el resumen de rendimiento.
+
+    Mantiene por estrategia los agregados de las operaciones cerradas (P/L, tasa de acierto,
+    motivos de salida, estadísticas de las condiciones de entrada) y una ventana de las
+    últimas cerradas. record_close() actualiza en O(1) con cada cierre; rebuild() recorre
+    el historial una vez (arranque o recarga). Así el prompt de la IA no crece con el CSV.
+    """
+
+    def __init__(self, trades=()):
+        self.lock = threading.Lock()
+        self.rebuild(trades)
+
+    def rebuild(self, trades):
+        with self.lock:
+            self._strategies = {}
+            self._recent = deque(maxlen=RECENT_GLOBAL)
+            self._seen = set()
+            for trade in trades:
+                self._add(trade)
+
+    def record_close(self, trade):
+        """Añade una operación recién cerrada (un dict de TradeStore)."""
+        if trade is None:
+            return
+        with self.lock:
+            self._add(trade)
+
+    def _add(self, trade):
+        if trade.get("status") != "CLOSED":
+            return
+        pnl = _pnl(trade)
+        deal_id = trade.get("dealId")
+        if pnl is None or (deal_id and deal_id in self._seen):
+            return
+        if deal_id:
+            self._seen.add(deal_id)
+        self._strategies.setdefault(trade.get("strategy") or "desconocida", _StrategyStats()).add(trade, pnl)
+        self._recent.append({
+            "estrategia": trade.get("strategy"), "epic": trade.get("epic"), "apertura": trade.get("open_time"),
+            "cierre": trade.get("close_time"), "direccion": trade.get("direction"),
+            "entrada": trade.get("entry_price"), "salida": trade.get("close_price"),
+            "pnl": pnl, "motivo": trade.get("exit_reason"), "tendencia": trade.get("current_trend"),
+        })
+
+    # --- Lecturas ---
+
+    def totals(self):
+        """(P/L total, operaciones cerradas, ganadoras)."""
+        with self.lock:
+            stats = list(self._strategies.values())
+        return sum(s.pnl for s in stats), sum(s.trades for s in stats), sum(s.wins for s in stats)
+
+    def strategy_summaries(self):
+        with self.lock:
+            return {name: stats.summary() for name, stats in sorted(self._strategies.items())}
+
+    def sample_recent(self, size=20):
+        """Muestra de las últimas operaciones cerradas: las `size // 2` más recientes y el resto repartido por la ventana."""
+        with self.lock:
+            recent = list(self._recent)
+        if len(recent) <= size:
+            return recent
+        newest = size // 2
+        older = recent[:-newest]
+        step = len(older) / (size - newest)
+        return [older[int(i * step)] for i in range(size - newest)] + recent[-newest:]
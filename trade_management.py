@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger("TradingBotLogger")
+
+DECISIONS = ("HOLD", "ADJUST_SLTP", "CLOSE")
+
+
+def _float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None  # NaN/pd.NA -> None
+
+
+def parse_batch_decisions(items, deal_ids):
+    """Lista [{"dealId", "decision", ...}] de la IA -> {dealId: decisión} solo para dealIds pedidos y decisiones válidas."""
+    if isinstance(items, dict):
+        items = items.get("decisions", [])
+    decisions = {}
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        deal_id = item.get("dealId")
+        if deal_id in deal_ids and item.get("decision") in DECISIONS:
+            decisions[deal_id] = item
+    return decisions
+
+
+class BatchTradeManager:
+    """
+    Gestión por IA de todas las posiciones abiertas con una sola petición por ciclo.
+
+    Solo se envían las posiciones cuyos datos han cambiado de forma relevante desde la
+    última decisión: SL/TP distintos o un precio que se ha movido al menos
+    price_step_atr veces el ATR de entrada, o una decisión con más de max_age_seconds.
+    decide(positions) devuelve {dealId: decisión}; las decisiones se aplican con
+    apply(position, decisión) en paralelo (amend/close de posiciones distintas).
+    """
+
+    def __init__(self, decide, apply, price_step_atr=0.25, max_age_seconds=1800, workers=4):
+        self.decide = decide
+        self.apply = apply
+        self.price_step_atr = price_step_atr
+        self.max_age_seconds = max_age_seconds
+        self.lock = threading.Lock()
+        self._last = {}  # dealId -> (huella, time.time()) de la última decisión
+        self.workers = workers
+        self._executor = None  # Se crea en el primer ciclo con decisiones y de nuevo tras shutdown()
+
+    def fingerprint(self, position):
+        entry = _float(position.get("entry_price"))
+        current = _float(position.get("current_price"))
+        atr = _float(position.get("atr_5m"))
+        step = atr * self.price_step_atr if atr else (entry or 0) * 0.001
+        price_bucket = int((current - entry) // step) if current and entry and step else None
+        return (_float(position.get("stop_level")), _float(position.get("profit_level")), price_bucket)
+
+    def _changed(self, position, now):
+        last = self._last.get(position["dealId"])
+        return last is None or last[0] != self.fingerprint(position) or now - last[1] > self.max_age_seconds
+
+    def run(self, positions):
+        """Decide y aplica para las posiciones que han cambiado. Devuelve cuántas decisiones se aplicaron."""
+        now = time.time()
+        with self.lock:
+            open_ids = {position["dealId"] for position in positions}
+            self._last = {deal_id: last for deal_id, last in self._last.items() if deal_id in open_ids}
+            changed = [position for position in positions if self._changed(position, now)]
+        if not changed:
+            logger.debug("Gestión IA: ninguna posición ha cambiado desde la última decisión.")
+            return 0
+
+        # Si la petición falla no se guardan huellas: se reintenta en el siguiente ciclo
+        decisions = self.decide(changed)
+        with self.lock:
+            for position in changed:
+                if position["dealId"] in decisions:
+                    self._last[position["dealId"]] = (self.fingerprint(position), now)
+
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="trade-manager")
+            executor = self._executor
+        futures = [executor.submit(self.apply, position, decisions[position["dealId"]])
+                   for position in changed if position["dealId"] in decisions]
+        wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                logger.error(f"Error aplicando una decisión de gestión de la IA: {future.exception()}")
+        missing = len(changed) - len(futures)
+        if missing:
+            logger.warning(f"Gestión IA: {missing} posiciones sin decisión válida en la respuesta.")
+        return len(futures)
+
+    def shutdown(self):
+        """Libera los hilos del pool; el siguiente ciclo de gestión lo vuelve a crear."""
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,62 @@
+import logging
+import threading
+
+from utils.indicators import compute_indicator
+
+logger = logging.getLogger(__name__)
+
+
+class IndicatorCache:
+    """
+    Caché de indicadores compartida por todas las estrategias durante un ciclo de polling.
+
+    Clave: (symbol, interval, indicador, parámetros, open_time de la última vela, nº de filas).
+    Cada serie se calcula sobre la misma ventana de velas que pidió la estrategia (los
+    indicadores exponenciales dependen de la primera fila), así que los valores son los
+    mismos que sin caché. Las estrategias piden todas la misma ventana por intervalo
+    (BaseStrategy.indicator_windows), de modo que comparten cada serie.
+    """
+
+    def __init__(self, kline_stores):
+        self.kline_stores = kline_stores
+        self._series = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def new_cycle(self):
+        """Vacía la caché al inicio de cada ciclo para que no crezca sin límite."""
+        with self.lock:
+            if self.hits or self.misses:
+                logger.debug(f"IndicatorCache: {self.hits} aciertos, {self.misses} cálculos en el ciclo anterior.")
+            self._series.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def series(self, symbol, interval, indicator, params, df):
+        """
+        Devuelve el indicador como ndarray alineado con las filas de df.
+        Solo se cachea si df termina en la última vela cerrada del store; si no (vela en
+        curso, o llegó una vela nueva entre medias) se calcula directamente sobre df.
+        """
+        symbol = symbol.upper()
+        params = tuple(params)
+        store = self.kline_stores.get((symbol, interval))
+        if store is None or df.empty:
+            return compute_indicator(df, indicator, params)
+
+        last_open_time = store.last_open_time()
+        if int(df["open_time"].iloc[-1]) != last_open_time or len(df) > len(store):
+            return compute_indicator(df, indicator, params)
+
+        key = (symbol, interval, indicator, params, last_open_time, len(df))
+        with self.lock:
+            values = self._series.get(key)
+            if values is not None:
+                self.hits += 1
+                return values
+        values = compute_indicator(df, indicator, params)
+        with self.lock:
+            self._series[key] = values
+            self.misses += 1
+        return values
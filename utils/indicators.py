@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import ta
 
@@ -19,6 +20,190 @@ def add_rsi(df, period=14):
     df_copy["RSI"] = rsi_indicator.rsi()
     return df_copy
 
+# Indicadores que se pueden compartir entre estrategias a través de IndicatorCache.
+# Cada función recibe un DataFrame de velas y los parámetros, y devuelve una Serie.
+INDICATOR_FUNCTIONS = {
+    "EMA": lambda df, window: ta.trend.EMAIndicator(close=df["close"], window=window).ema_indicator(),
+    "RSI": lambda df, window: ta.momentum.RSIIndicator(close=df["close"], window=window).rsi(),
+    "ATR": lambda df, window: ta.volatility.AverageTrueRange(high=df["high"], low=df["low"], close=df["close"], window=window).average_true_range(),
+    "ADX": lambda df, window: ta.trend.ADXIndicator(high=df["high"], low=df["low"], close=df["close"], window=window).adx(),
+    "MACD": lambda df, fast=12, slow=26, sign=9: ta.trend.MACD(df["close"], window_slow=slow, window_fast=fast, window_sign=sign).macd(),
+    "MACD_SIGNAL": lambda df, fast=12, slow=26, sign=9: ta.trend.MACD(df["close"], window_slow=slow, window_fast=fast, window_sign=sign).macd_signal(),
+    "MACD_DIFF": lambda df, fast=12, slow=26, sign=9: ta.trend.MACD(df["close"], window_slow=slow, window_fast=fast, window_sign=sign).macd_diff(),
+    "BB_LOW": lambda df, window, window_dev=2.0: ta.volatility.bollinger_lband(df["close"], window=window, window_dev=window_dev),
+    "BB_HIGH": lambda df, window, window_dev=2.0: ta.volatility.bollinger_hband(df["close"], window=window, window_dev=window_dev),
+    "VOLUME_SMA": lambda df, window: df["volume"].rolling(window=window).mean(),
+}
+
+def compute_indicator(df, name, params=()):
+    """Calcula un indicador de INDICATOR_FUNCTIONS sobre df y devuelve un ndarray alineado con sus filas."""
+    if df.empty:
+        return np.array([], dtype=float)
+    series = INDICATOR_FUNCTIONS[name](df, *params)
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+
+# Indicadores de ventana móvil: su valor en una fila solo depende de las `window` filas anteriores
+ROLLING_INDICATORS = ("BB_LOW", "BB_HIGH", "VOLUME_SMA")
+
+def _ewm_update(previous, value, alpha):
+    """Paso de pandas ewm(adjust=False).mean(), con las mismas operaciones para obtener el mismo redondeo."""
+    old_weight = 1.0 - alpha
+    return (old_weight * previous + alpha * value) / (old_weight + alpha)
+
+def _ema_steps(df, window):
+    close = df["close"].to_numpy(dtype=float)
+    alpha = 2.0 / (window + 1)
+    state = {}
+
+    def step(k, rows):
+        x = close[rows]
+        state["ema"] = x if k == 0 else _ewm_update(state["ema"], x, alpha)
+        return state["ema"] if k >= window - 1 else np.full(len(rows), np.nan)
+    return step, 1
+
+def _rsi_steps(df, window):
+    close = df["close"].to_numpy(dtype=float)
+    alpha = 1.0 / window
+    state = {}
+
+    def step(k, rows):
+        if k == 0:
+            state["up"] = np.zeros(len(rows))
+            state["down"] = np.zeros(len(rows))
+        else:
+            diff = close[rows] - close[rows - 1]
+            state["up"] = _ewm_update(state["up"], np.where(diff > 0, diff, 0.0), alpha)
+            state["down"] = _ewm_update(state["down"], np.where(diff < 0, -diff, 0.0), alpha)
+        if k < window - 1:
+            return np.full(len(rows), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(state["down"] == 0, 100.0, 100 - 100 / (1 + state["up"] / state["down"]))
+    return step, 1
+
+def _atr_steps(df, window):
+    high, low, close = (df[c].to_numpy(dtype=float) for c in ("high", "low", "close"))
+    state = {"ranges": []}
+
+    def step(k, rows):
+        true_range = high[rows] - low[rows]
+        if k > 0:
+            prev_close = close[rows - 1]
+            true_range = np.maximum.reduce([true_range, np.abs(high[rows] - prev_close), np.abs(low[rows] - prev_close)])
+        if k < window - 1:
+            state["ranges"].append(true_range)
+            return np.zeros(len(rows))
+        if k == window - 1:
+            state["ranges"].append(true_range)
+            state["atr"] = np.mean(state.pop("ranges"), axis=0)
+        else:
+            state["atr"] = (state["atr"] * (window - 1) + true_range) / float(window)
+        return state["atr"]
+    return step, window
+
+def _adx_steps(df, window):
+    high, low, close = (df[c].to_numpy(dtype=float) for c in ("high", "low", "close"))
+    state = {"sums": [], "dx": []}
+
+    def step(k, rows):
+        # Reproduce ta.trend.ADXIndicator: las sumas iniciales empiezan en la segunda fila
+        # y el ADX de la fila k usa el DX calculado con los datos de esa misma fila
+        if k == 0:
+            return np.zeros(len(rows))
+        prev = rows - 1
+        movement = np.maximum(high[rows], close[prev]) - np.minimum(low[rows], close[prev])
+        up = high[rows] - high[prev]
+        down = low[prev] - low[rows]
+        pos = np.where((up > down) & (up > 0), up, 0.0)
+        neg = np.where((down > up) & (down > 0), down, 0.0)
+        if k < window:
+            state["sums"].append((movement, pos, neg))
+            return np.zeros(len(rows))
+        if k == window:
+            state["sums"].append((movement, pos, neg))
+            state["trs"], state["dip"], state["din"] = (np.sum(values, axis=0) for values in zip(*state.pop("sums")))
+        else:
+            for key, value in (("trs", movement), ("dip", pos), ("din", neg)):
+                state[key] = state[key] - (state[key] / float(window)) + value
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dip = np.where(state["trs"] != 0, 100 * (state["dip"] / state["trs"]), 0.0)
+            din = np.where(state["trs"] != 0, 100 * (state["din"] / state["trs"]), 0.0)
+            dx = np.where(dip + din != 0, 100 * np.abs((dip - din) / (dip + din)), 0.0)
+        if k < 2 * window - 1:
+            state["dx"].append(dx)
+            return np.zeros(len(rows))
+        if k == 2 * window - 1:
+            state["dx"].append(dx)
+            state["adx"] = np.mean(state.pop("dx"), axis=0)
+        else:
+            state["adx"] = ((state["adx"] * (window - 1)) + dx) / float(window)
+        return state["adx"]
+    return step, 2 * window
+
+def _macd_steps(part):
+    def factory(df, fast=12, slow=26, sign=9):
+        close = df["close"].to_numpy(dtype=float)
+        first = max(fast, slow) - 1
+        state = {}
+
+        def step(k, rows):
+            x = close[rows]
+            for key, span in (("fast", fast), ("slow", slow)):
+                state[key] = x if k == 0 else _ewm_update(state[key], x, 2.0 / (span + 1))
+            nan = np.full(len(rows), np.nan)
+            if k < first:
+                return nan
+            macd = state["fast"] - state["slow"]
+            state["signal"] = macd if k == first else _ewm_update(state["signal"], macd, 2.0 / (sign + 1))
+            signal = state["signal"] if k - first >= sign - 1 else nan
+            return {"MACD": macd, "MACD_SIGNAL": signal, "MACD_DIFF": macd - signal}[part]
+        return step, 1
+    return factory
+
+# Recursiones de los indicadores exponenciales para window_indicator: cada fábrica recibe
+# (df, *params) y devuelve (step, nº mínimo de filas con el que ta no falla)
+WINDOW_STEPS = {
+    "EMA": _ema_steps,
+    "RSI": _rsi_steps,
+    "ATR": _atr_steps,
+    "ADX": _adx_steps,
+    "MACD": _macd_steps("MACD"),
+    "MACD_SIGNAL": _macd_steps("MACD_SIGNAL"),
+    "MACD_DIFF": _macd_steps("MACD_DIFF"),
+}
+
+def window_indicator(df, name, params=(), window=None, lags=1):
+    """
+    Para cada fila j de df, el indicador `name` calculado solo sobre las `window` filas que
+    terminan en j (como compute_indicator sobre el DataFrame de velas que ve run()), en sus
+    últimas `lags` filas. Devuelve un ndarray (lags, len(df)): out[lag, j] es la fila -1-lag
+    de esa ventana (NaN si no existe o si ta falla con tan pocas filas).
+    Las recursiones avanzan a la vez para todas las ventanas, cada una con su propia semilla.
+    """
+    n = len(df)
+    out = np.full((lags, n), np.nan)
+    if n == 0:
+        return out
+    window = n if window is None else min(window, n)
+    end = np.arange(n)
+    start = np.maximum(0, end - window + 1)
+    length = end - start + 1
+
+    if name in ROLLING_INDICATORS:
+        full = compute_indicator(df, name, params)
+        for lag in range(lags):
+            valid = length - lag >= params[0]
+            out[lag, valid] = full[end[valid] - lag]
+        return out
+
+    step, min_length = WINDOW_STEPS[name](df, *params)
+    for k in range(window):
+        value = step(k, np.minimum(start + k, end))
+        for lag in range(lags):
+            hit = length - 1 - lag == k
+            out[lag, hit] = value[hit]
+    out[:, length < min_length] = np.nan
+    return out
+
 def scale_aggressiveness(base_value, aggressiveness_level, min_factor, max_factor):
     """
     Escala un valor base linealmente en función del nivel de agresividad.
@@ -0,0 +1,76 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+KLINE_INTERVALS = ("1m", "5m", "30m")
+
+# Sin global_settings.instruments en config.json el bot opera solo BTC, como hasta ahora
+DEFAULT_INSTRUMENTS = [{"binance_symbol": "BTCUSDT", "capital_epic": None, "capital_name": "Bitcoin/USD"}]
+
+
+class Instrument:
+    """
+    Pareja (símbolo de Binance, epic de Capital.com): las velas e indicadores salen
+    del símbolo y las órdenes y precios de entrada del epic. strategies limita qué
+    estrategias se ejecutan sobre el instrumento (None: todas). order_size es el tamaño
+    de sus órdenes (None: global_order_size).
+    """
+
+    def __init__(self, binance_symbol, capital_epic=None, capital_name=None, strategies=None, capital_search=None,
+                 order_size=None):
+        self.symbol = binance_symbol.upper()
+        self.epic = capital_epic
+        self.name = capital_name or self.symbol
+        self.search_term = capital_search
+        self.strategies = set(strategies) if strategies else None
+        self.order_size = float(order_size) if order_size else None
+
+    def runs(self, strategy_name):
+        return self.strategies is None or strategy_name in self.strategies
+
+    def __repr__(self):
+        return f"Instrument({self.symbol}, {self.epic})"
+
+
+def load_instruments(entries=None):
+    """Lee la lista global_settings.instruments; el primero es el instrumento principal."""
+    instruments = []
+    for entry in entries or DEFAULT_INSTRUMENTS:
+        symbol = (entry.get("binance_symbol") or "").upper()
+        if not symbol:
+            logger.warning(f"Instrumento sin binance_symbol en config.json: {entry}. Se ignora.")
+            continue
+        if any(instrument.symbol == symbol for instrument in instruments):
+            logger.warning(f"Instrumento {symbol} repetido en config.json. Se ignora.")
+            continue
+        instruments.append(Instrument(symbol, entry.get("capital_epic"), entry.get("capital_name"),
+                                      entry.get("strategies"), entry.get("capital_search"), entry.get("order_size")))
+    if not instruments:
+        raise ValueError("config.json no define ningún instrumento válido en 'instruments'.")
+    return instruments
+
+
+def resolve_epics(instruments, market_metadata):
+    """
+    Completa los epics que faltan buscando capital_name (o capital_search) con MarketMetadataCache.
+    Si no se encuentra el del instrumento principal es un error; los demás se descartan.
+    """
+    for instrument in instruments:
+        if not instrument.epic:
+            instrument.epic = market_metadata.find_epic(instrument.name, instrument.search_term)
+    if not instruments[0].epic:
+        raise ValueError(f"No se pudo encontrar el EPIC para {instruments[0].name} en Capital.com. Asegúrate de que el símbolo sea correcto o que el mercado esté disponible.")
+    for instrument in instruments:
+        if not instrument.epic:
+            logger.warning(f"No se encontró el EPIC de {instrument.name} en Capital.com; {instrument.symbol} no se operará.")
+    return [instrument for instrument in instruments if instrument.epic]
+
+
+def strategy_key(name, instrument, primary):
+    """Nombre de la instancia: el de la estrategia en el principal, 'Nombre:SÍMBOLO' en los demás."""
+    return name if primary else f"{name}:{instrument.symbol}"
+
+
+def base_strategy_name(key):
+    """Nombre de la estrategia (sección de config.json) a partir del de la instancia."""
+    return key.split(":", 1)[0]
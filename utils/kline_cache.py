@@ -0,0 +1,136 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.kline_store import KLINE_COLUMNS, KLINE_DTYPE
+from utils.klines_utils import INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+MAX_PREFILL_WORKERS = 4  # Peticiones REST simultáneas a Binance durante la precarga
+
+
+class KlineDiskCache:
+    """
+    Caché en disco de las velas de cada (symbol, interval): un .npy estructurado
+    (KLINE_DTYPE) por par que se abre con mmap, así que cargarlo no copia nada hasta
+    que se lee. Se escribe con fichero temporal + os.replace.
+    """
+
+    def __init__(self, directory="kline_cache"):
+        self.directory = directory
+
+    def path(self, symbol, interval):
+        return os.path.join(self.directory, f"{symbol.upper()}_{interval}.npy")
+
+    def load(self, symbol, interval):
+        """Array estructurado (mmap, solo lectura) o None si no hay caché válida."""
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Caché de velas ilegible en {path}: {e}")
+            return None
+        if data.dtype != KLINE_DTYPE:
+            return None
+        return data
+
+    def save(self, symbol, interval, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(symbol, interval)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(data, dtype=KLINE_DTYPE))
+        os.replace(tmp_path, path)
+
+    def save_store(self, store):
+        """Guarda las velas cerradas de un KlineStore (la vela en curso no)."""
+        with store.lock:
+            columns = store.tail()
+            data = np.empty(len(columns["open_time"]), dtype=KLINE_DTYPE)
+            for col in KLINE_COLUMNS:
+                data[col] = columns[col]
+        if len(data):
+            self.save(store.symbol, store.interval, data)
+        return len(data)
+
+
+def _to_records(prices):
+    """list[dict] de get_historical_klines -> array estructurado ordenado por open_time."""
+    data = np.empty(len(prices), dtype=KLINE_DTYPE)
+    for col in KLINE_COLUMNS:
+        data[col] = [k[col] for k in prices]
+    return data
+
+
+def _merge(cached, fetched, keep):
+    """Une caché y velas nuevas: las descargadas sustituyen a las cacheadas con el mismo open_time."""
+    if cached is None or not len(cached):
+        merged = fetched
+    elif not len(fetched):
+        merged = np.asarray(cached)
+    else:
+        merged = np.concatenate([cached[cached["open_time"] < fetched["open_time"][0]], fetched])
+    # Copia: el resultado no debe apuntar al mmap del fichero que se va a sustituir
+    return np.array(merged[-keep:])
+
+
+def _warm_up_pair(binance_client_api, store, cache, limit):
+    symbol, interval = store.symbol, store.interval
+    step = INTERVAL_MS.get(interval)
+    cached = cache.load(symbol, interval) if cache is not None else None
+    now_ms = int(time.time() * 1000)
+    last = int(cached["open_time"][-1]) if cached is not None and len(cached) else None
+    if last is not None and step and now_ms - last < limit * step:
+        # Solo el delta: desde la última vela cacheada (pudo guardarse sin cerrar) hasta ahora
+        try:
+            prices = binance_client_api.get_historical_klines(symbol, interval, limit=limit, start_time=last).get("prices", [])
+        except Exception as e:
+            # Mejor las velas cacheadas que un store vacío; el hueco lo rellenará KlineGapFiller
+            logger.warning(f"Fallo al descargar el delta de {symbol}@{interval}; se usan las {len(cached)} velas de la caché: {e}")
+            prices = []
+    else:
+        cached = None  # Caché inexistente o demasiado antigua: descarga completa
+        prices = binance_client_api.get_historical_klines(symbol, interval, limit=limit).get("prices", [])
+    merged = _merge(cached, _to_records(prices), store.capacity)
+    cached = None  # Libera el mmap antes de reemplazar el fichero (en Windows no se puede si sigue abierto)
+    for row in merged:
+        store.append(*(row[col] for col in KLINE_COLUMNS))
+    if cache is not None and len(prices):
+        cache.save(symbol, interval, merged)
+    return len(prices), len(merged)
+
+
+def warm_up_kline_stores(binance_client_api, kline_stores, cache=None, limit=1000, workers=None):
+    """
+    Precarga todos los KlineStore en paralelo (como mucho MAX_PREFILL_WORKERS peticiones
+    a la vez). Con caché en disco solo se descargan las velas posteriores a la última
+    guardada. Devuelve {clave: error} de los pares que fallaron.
+    """
+    start = time.time()
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers or min(len(kline_stores), MAX_PREFILL_WORKERS) or 1, thread_name_prefix="kline-prefill") as executor:
+        futures = {key: executor.submit(_warm_up_pair, binance_client_api, store, cache, limit) for key, store in kline_stores.items()}
+        for key, future in futures.items():
+            try:
+                downloaded, total = future.result()
+                logger.info(f"Precarga {key[0]}@{key[1]}: {downloaded} velas descargadas, {total} en memoria.")
+            except Exception as e:
+                errors[key] = e
+                logger.error(f"Error al precargar datos históricos para {key[0]} {key[1]}: {e}")
+    logger.info(f"Precarga de velas completada en {time.time() - start:.1f}s.")
+    return errors
+
+
+def persist_kline_stores(kline_stores, cache):
+    """Guarda todos los KlineStore en la caché para que el siguiente arranque solo descargue el delta."""
+    for (symbol, interval), store in kline_stores.items():
+        try:
+            cache.save_store(store)
+        except Exception as e:
+            logger.error(f"No se pudo guardar la caché de velas de {symbol}@{interval}: {e}")
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.klines_utils import INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+
+def rest_to_ws_kline(symbol, interval, kline):
+    """Vela de BinanceAPIClient.get_historical_klines -> formato 'k' del WebSocket."""
+    return {
+        "t": int(kline["open_time"]), "o": kline["open"], "h": kline["high"], "l": kline["low"],
+        "c": kline["close"], "v": kline["volume"], "x": True, "s": symbol, "i": interval,
+    }
+
+
+class KlineGapFiller:
+    """
+    Garantiza que las velas cerradas llegan a las colas sin huecos ni duplicados.
+
+    Para cada (símbolo, intervalo) recuerda el open_time de la última vela entregada.
+    Si la siguiente vela del WebSocket no es la consecutiva (p. ej. tras una reconexión),
+    se piden por REST las que faltan en un hilo aparte; mientras tanto las velas en vivo
+    se retienen y, al terminar el relleno, se entregan en orden: primero el hueco y
+    después las retenidas. on_close se llama solo para velas entregadas.
+    """
+
+    def __init__(self, binance_client_api, data_queues, on_close=None, max_attempts=3, retry_seconds=2.0):
+        self.binance_client_api = binance_client_api
+        self.data_queues = data_queues
+        self.on_close = on_close
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.lock = threading.Lock()
+        self._last_open_time = {}  # (símbolo, intervalo) -> open_time de la última vela entregada
+        self._held = {}            # (símbolo, intervalo) -> velas en vivo retenidas durante un relleno
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="kline-backfill")
+
+    def seed(self, symbol, interval, last_open_time):
+        """Fija la última vela conocida (p. ej. la última del histórico precargado)."""
+        if last_open_time is not None:
+            with self.lock:
+                self._last_open_time[(symbol.upper(), interval)] = int(last_open_time)
+
+    def put(self, symbol, interval, kline):
+        """Recibe una vela cerrada del WebSocket."""
+        key = (symbol.upper(), interval)
+        with self.lock:
+            held = self._held.get(key)
+            if held is not None:
+                held.append(kline)  # Hay un relleno en curso: se entrega al terminar
+                return
+            gap = self._deliver(key, [kline])
+        if gap is not None:
+            self._schedule_backfill(key, gap)
+
+    def _schedule_backfill(self, key, gap):
+        step = INTERVAL_MS[key[1]]
+        logger.warning(f"Hueco de {(gap[1] + 1 - gap[0]) // step} velas en {key[0]}@{key[1]}; rellenando por REST.")
+        self._executor.submit(self._backfill, key, *gap)
+
+    def _deliver(self, key, klines, accept_gaps_until=None):
+        """
+        Entrega las velas en orden descartando duplicadas. Se llama con el lock tomado.
+        Si encuentra un hueco posterior a accept_gaps_until, retiene esa vela y las
+        siguientes y devuelve el rango (inicio, fin) que hay que rellenar.
+        """
+        data_queue = self.data_queues.get(key)
+        step = INTERVAL_MS.get(key[1])
+        ordered = sorted(klines, key=lambda k: int(k["t"]))
+        delivered = None
+        gap = None
+        for i, kline in enumerate(ordered):
+            open_time = int(kline["t"])
+            last = self._last_open_time.get(key)
+            if last is not None and open_time <= last:
+                continue
+            if last is not None and step and open_time != last + step:
+                if accept_gaps_until is None or open_time > accept_gaps_until + step:
+                    self._held[key] = ordered[i:]
+                    gap = (last + step, open_time - 1)
+                    break
+                logger.warning(f"Binance no devolvió velas de {key[0]}@{key[1]} entre {last + step} y {open_time - step}.")
+            if data_queue is not None:
+                data_queue.put(kline)
+            self._last_open_time[key] = open_time
+            delivered = kline
+        if delivered is not None and self.on_close:
+            try:
+                self.on_close(key[0], key[1], delivered)
+            except Exception as e:
+                logger.error(f"Error en el callback on_close de {key[0]}@{key[1]}: {e}")
+        return gap
+
+    def _fetch(self, key, start_time, end_time):
+        symbol, interval = key
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                prices = self.binance_client_api.get_historical_klines(
+                    symbol, interval, limit=1000, start_time=start_time, end_time=end_time
+                ).get("prices", [])
+                return [rest_to_ws_kline(symbol, interval, k) for k in prices if start_time <= int(k["open_time"]) <= end_time]
+            except Exception as e:
+                logger.error(f"Error rellenando {symbol}@{interval} (intento {attempt}/{self.max_attempts}): {e}")
+                time.sleep(self.retry_seconds * attempt)
+        return []
+
+    def _backfill(self, key, start_time, end_time):
+        missing = self._fetch(key, start_time, end_time)
+        logger.info(f"Relleno de {key[0]}@{key[1]}: {len(missing)} velas recuperadas por REST.")
+        with self.lock:
+            held = self._held.pop(key, [])
+            # Lo que REST no devuelva dentro del rango pedido se da por perdido; un hueco
+            # posterior (otra reconexión durante el relleno) programa un nuevo relleno
+            gap = self._deliver(key, missing + held, accept_gaps_until=end_time)
+        if gap is not None:
+            self._schedule_backfill(key, gap)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
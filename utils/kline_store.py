@@ -0,0 +1,142 @@
+import threading
+import numpy as np
+import pandas as pd
+
+KLINE_COLUMNS = ["open_time", "open", "high", "low", "close", "volume"]
+# dtype estructurado para guardar velas en disco (.npy) y leerlas con mmap
+KLINE_DTYPE = np.dtype([(col, np.int64 if col == "open_time" else np.float64) for col in KLINE_COLUMNS])
+
+
+class KlineStore:
+    """
+    Almacén de velas de tamaño fijo para un par (symbol, interval).
+
+    Cada columna vive en un array NumPy preasignado de tamaño 2 * capacity.
+    Cada vela se escribe en dos posiciones (i y i + capacity), de modo que las
+    últimas N velas siempre forman un bloque contiguo en memoria: añadir es O(1)
+    y leer las últimas N velas devuelve vistas sin copia.
+
+    Opcionalmente guarda la vela en curso (sin cerrar) como fila "cabeza" justo
+    detrás de la última cerrada: set_partial() la sobrescribe en O(1) en cada tick y
+    tail(partial=True) la incluye en la misma vista contigua. len(), last_open_time()
+    y las lecturas por defecto solo ven velas cerradas.
+    """
+
+    def __init__(self, symbol, interval, capacity=2000):
+        self.symbol = symbol.upper()
+        self.interval = interval
+        self.capacity = capacity
+        # +1: hueco para la vela en curso cuando la última cerrada ocupa la posición final
+        self._open_time = np.zeros(2 * capacity + 1, dtype=np.int64)
+        self._values = {col: np.zeros(2 * capacity + 1, dtype=np.float64) for col in KLINE_COLUMNS[1:]}
+        self._count = 0  # Total de velas añadidas desde la creación
+        self._partial = None  # (open_time, open, high, low, close, volume) de la vela en curso
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def _write_at(self, p, open_time, open_, high, low, close, volume):
+        self._open_time[p] = open_time
+        self._values["open"][p] = open_
+        self._values["high"][p] = high
+        self._values["low"][p] = low
+        self._values["close"][p] = close
+        self._values["volume"][p] = volume
+
+    def _write(self, pos, open_time, open_, high, low, close, volume):
+        for p in (pos, pos + self.capacity):
+            self._write_at(p, open_time, open_, high, low, close, volume)
+
+    def _head_index(self):
+        # Posición siguiente a la última vela cerrada en la copia alta: nunca forma parte
+        # de la ventana de velas cerradas y la sobrescribe la próxima vela que cierre
+        return self._bounds(0)[1]
+
+    def append(self, open_time, open_, high, low, close, volume):
+        """Añade una vela cerrada en O(1). Si llega repetida (mismo open_time) se sobrescribe la última."""
+        with self.lock:
+            if self._count and open_time == self.last_open_time():
+                pos = (self._count - 1) % self.capacity
+            elif self._count and open_time < self.last_open_time():
+                return False  # Vela antigua, ya almacenada
+            else:
+                pos = self._count % self.capacity
+                self._count += 1
+            self._write(pos, int(open_time), float(open_), float(high), float(low), float(close), float(volume))
+            if self._partial is not None:
+                if self._partial[0] <= open_time:
+                    self._partial = None  # La vela en curso acaba de cerrar
+                else:
+                    self._write_at(self._head_index(), *self._partial)
+            return True
+
+    def set_partial(self, open_time, open_, high, low, close, volume):
+        """Actualiza la vela en curso (O(1)). Se ignora si no es posterior a la última cerrada."""
+        with self.lock:
+            open_time = int(open_time)
+            if self._count and open_time <= self.last_open_time():
+                return False
+            self._partial = (open_time, float(open_), float(high), float(low), float(close), float(volume))
+            self._write_at(self._head_index(), *self._partial)
+            return True
+
+    def partial_open_time(self):
+        partial = self._partial
+        return partial[0] if partial is not None else None
+
+    def append_kline(self, kline):
+        """Añade una vela en formato dict ('open_time', 'open', ...)."""
+        return self.append(kline["open_time"], kline["open"], kline["high"], kline["low"], kline["close"], kline.get("volume", 0.0))
+
+    def extend(self, klines):
+        for kline in klines:
+            self.append_kline(kline)
+
+    def last_open_time(self):
+        if not self._count:
+            return None
+        return int(self._open_time[(self._count - 1) % self.capacity])
+
+    def _bounds(self, n):
+        size = len(self)
+        n = size if n is None else max(0, min(n, size))
+        end = (self._count - 1) % self.capacity + self.capacity + 1 if self._count else 0
+        return end - n, end
+
+    def tail(self, n=None, partial=False):
+        """
+        Devuelve las últimas n velas como dict de vistas NumPy (sin copia).
+        Las vistas siguen siendo válidas durante las próximas (capacity - n) inserciones.
+        Con partial=True, si hay vela en curso, es la última fila (n incluye esa fila).
+        """
+        if partial and self._partial is not None:
+            start, end = self._bounds(None if n is None else n - 1)
+            end += 1
+        else:
+            start, end = self._bounds(n)
+        columns = {"open_time": self._open_time[start:end]}
+        for col, values in self._values.items():
+            columns[col] = values[start:end]
+        return columns
+
+    def to_numpy(self, n=None):
+        """Devuelve las últimas n velas como ndarray (n, 6) en el orden de KLINE_COLUMNS."""
+        columns = self.tail(n)
+        return np.column_stack([columns[col] for col in KLINE_COLUMNS])
+
+    def to_dataframe(self, n=None, copy=True, partial=False):
+        """
+        Devuelve las últimas n velas como DataFrame con las columnas estándar.
+        Con copy=False el DataFrame comparte memoria con el buffer.
+        Con partial=True incluye la vela en curso como última fila (si la hay).
+        """
+        with self.lock:
+            columns = self.tail(n, partial=partial)
+            if copy:
+                columns = {col: values.copy() for col, values in columns.items()}
+        return pd.DataFrame(columns, columns=KLINE_COLUMNS, copy=False)
+
+    def to_prices(self, n=None):
+        """Formato compatible con el antiguo list[dict] de klines."""
+        return self.to_dataframe(n).to_dict("records")
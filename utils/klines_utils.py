@@ -1,11 +1,27 @@
 import pandas as pd
 
+# Duración de cada intervalo de vela en milisegundos
+INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "30m": 1_800_000, "1d": 86_400_000}
+
 def normalize_klines(prices, min_length=0):
     """
-    Convierte cualquier formato de klines (list[dict], list[list], etc.)
+    Convierte cualquier formato de klines (DataFrame, list[dict], list[list], etc.)
     en un DataFrame uniforme con columnas estándar.
     """
 
+    # DataFrame (p. ej. el devuelto por KlineStore): no hace falta reconstruirlo
+    if isinstance(prices, pd.DataFrame):
+        if prices.empty:
+            return pd.DataFrame(columns=["open_time", "open", "high", "low", "close", "volume"])
+        df = prices
+        if "open_time" not in df.columns:
+            df = df.assign(open_time=pd.NA)
+        if "volume" not in df.columns:
+            df = df.assign(volume=0.0)
+        if len(df) < min_length:
+            return pd.DataFrame(columns=["open_time", "open", "high", "low", "close", "volume"])
+        return df[["open_time", "open", "high", "low", "close", "volume"]]
+
     if not prices:
         return pd.DataFrame(columns=["open_time", "open", "high", "low", "close", "volume"])
 
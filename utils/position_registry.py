@@ -0,0 +1,80 @@
+import threading
+
+
+class OpenPositionRegistry:
+    """
+    Registro en memoria de las posiciones abiertas del bot, fuente única de verdad
+    para has_open_trade y para el monitor.
+
+    - Índice por dealId (operación completa) y por estrategia (dealIds en orden de apertura).
+    - Se reconstruye al arrancar desde TradeStore.open_trades(), así que sobrevive a reinicios.
+    - Consultas O(1): un ciclo del monitor solo recorre las posiciones abiertas.
+    """
+
+    def __init__(self, trades=()):
+        self.lock = threading.RLock()
+        self._by_deal = {}       # dealId -> dict de la operación
+        self._by_strategy = {}   # estrategia -> {dealId: None} (dict como conjunto ordenado)
+        self.rebuild(trades)
+
+    def rebuild(self, trades):
+        """Sustituye el contenido por las operaciones abiertas dadas (p. ej. trade_store.open_trades())."""
+        with self.lock:
+            self._by_deal.clear()
+            self._by_strategy.clear()
+            for trade in trades:
+                self.add(trade)
+
+    def add(self, trade):
+        """Registra (o actualiza) una posición abierta. Requiere dealId y strategy."""
+        deal_id = trade.get("dealId")
+        if not deal_id:
+            return
+        with self.lock:
+            previous = self._by_deal.get(deal_id)
+            if previous is not None and previous.get("strategy") != trade.get("strategy"):
+                self._discard_from_strategy(previous.get("strategy"), deal_id)
+            self._by_deal[deal_id] = dict(trade)
+            self._by_strategy.setdefault(trade.get("strategy"), {})[deal_id] = None
+
+    def remove(self, deal_id):
+        """Quita una posición (cierre). Devuelve la operación registrada o None."""
+        with self.lock:
+            trade = self._by_deal.pop(deal_id, None)
+            if trade is not None:
+                self._discard_from_strategy(trade.get("strategy"), deal_id)
+            return trade
+
+    def _discard_from_strategy(self, strategy_name, deal_id):
+        deals = self._by_strategy.get(strategy_name)
+        if deals is not None:
+            deals.pop(deal_id, None)
+            if not deals:
+                del self._by_strategy[strategy_name]
+
+    def get(self, deal_id):
+        with self.lock:
+            trade = self._by_deal.get(deal_id)
+            return dict(trade) if trade is not None else None
+
+    def has_strategy(self, strategy_name):
+        with self.lock:
+            return strategy_name in self._by_strategy
+
+    def deal_ids(self, strategy_name=None):
+        """dealIds abiertos de una estrategia o de todas."""
+        with self.lock:
+            if strategy_name is None:
+                return list(self._by_deal)
+            return list(self._by_strategy.get(strategy_name, ()))
+
+    def trades(self, strategy_name=None):
+        """Copias de las operaciones abiertas (de una estrategia o de todas), en orden de apertura."""
+        with self.lock:
+            return [dict(self._by_deal[deal_id]) for deal_id in self.deal_ids(strategy_name)]
+
+    def __contains__(self, deal_id):
+        return deal_id in self._by_deal
+
+    def __len__(self):
+        return len(self._by_deal)
@@ -0,0 +1,28 @@
+import glob
+import importlib.util
+import inspect
+import logging
+import os
+
+logger = logging.getLogger("TradingBotLogger")
+
+
+def load_strategy_classes(strategy_dir="strategies"):
+    logger.debug(f"Loading strategy classes from {strategy_dir}.")
+    strategy_classes = {}
+    strategy_files = glob.glob(os.path.join(strategy_dir, "*.py"))
+    logger.debug(f"Archivos de estrategia encontrados: {strategy_files}") # DEBUG PRINT
+    for strategy_file in strategy_files:
+        module_name = os.path.splitext(os.path.basename(strategy_file))[0]
+        spec = importlib.util.spec_from_file_location(module_name, strategy_file)
+        if spec and spec.loader:
+            strategies_module = importlib.util.module_from_spec(spec)
+            try:
+                spec.loader.exec_module(strategies_module)
+                for name, obj in inspect.getmembers(strategies_module, inspect.isclass):
+                    if hasattr(obj, 'run') and obj.__module__ == strategies_module.__name__ and name != "BaseStrategy": # Añadido: y no es BaseStrategy
+                        strategy_classes[name] = obj # Return the class, not an instance
+                        logger.debug(f"Clase de estrategia cargada: {name}") # DEBUG PRINT
+            except Exception as e:
+                logger.error(f"Error al cargar '{strategy_file}': {e}")
+    return strategy_classes
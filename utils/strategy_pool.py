@@ -0,0 +1,123 @@
+import importlib.util
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class KlineSnapshot:
+    """
+    Sustituto ligero de TradingBot para evaluar estrategias en otro proceso: solo
+    expone _get_binance_klines_data sobre una copia de las velas del ciclo.
+    """
+
+    indicator_cache = None
+    streaming_indicators = None
+
+    def __init__(self, frames):
+        self.frames = frames  # {(symbol, interval): DataFrame}
+
+    def _get_binance_klines_data(self, symbol, interval, limit):
+        df = self.frames[(symbol.upper(), interval)]
+        return {'prices': df.tail(limit).reset_index(drop=True)}
+
+
+_strategy_classes = {}
+
+
+def _load_strategy_class(strategy_file, class_name):
+    """Carga (una vez por proceso) la clase de estrategia desde su fichero."""
+    key = (strategy_file, class_name)
+    if key not in _strategy_classes:
+        module_name = os.path.splitext(os.path.basename(strategy_file))[0]
+        spec = importlib.util.spec_from_file_location(module_name, strategy_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _strategy_classes[key] = getattr(module, class_name)
+    return _strategy_classes[key]
+
+
+def _strategy_file(instance):
+    # Las estrategias se cargan con spec_from_file_location y no están en sys.modules,
+    # así que se localiza su fichero a partir del código de run().
+    return type(instance).run.__code__.co_filename
+
+
+def _run_in_thread(instance, trading_bot_instance, partial, symbol):
+    # El contexto es por hilo: otras estrategias evaluadas a la vez no ven la vela en curso
+    context = getattr(trading_bot_instance, "eval_context", None)
+    if context is None:
+        return instance.run(trading_bot_instance.capital_client_api, trading_bot_instance, symbol)
+    context.partial = partial
+    try:
+        return instance.run(trading_bot_instance.capital_client_api, trading_bot_instance, symbol)
+    finally:
+        context.partial = False
+
+
+def _run_in_process(strategy_file, class_name, state, snapshot, symbol):
+    strategy_class = _load_strategy_class(strategy_file, class_name)
+    instance = strategy_class.__new__(strategy_class)
+    instance.__dict__.update(state)
+    return instance.run(None, snapshot, symbol)
+
+
+class StrategyPool:
+    """
+    Evalúa las estrategias activas en paralelo sobre un pool de hilos o de procesos.
+
+    Solo se paraleliza run(); los resultados se recogen en el orden de envío y las
+    órdenes las sigue abriendo el hilo de polling, de modo que los guardas
+    opening_trade / has_open_trade no tienen condiciones de carrera.
+    """
+
+    def __init__(self, workers=4, executor="thread", timeout_seconds=15):
+        self.workers = max(1, int(workers))
+        self.mode = "process" if executor == "process" else "thread"
+        self.timeout_seconds = timeout_seconds
+        if self.mode == "process":
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="strategy")
+        self._in_flight = {}  # Estrategias cuyo run() anterior aún no ha terminado (p. ej. tras un timeout)
+
+    def busy(self, name):
+        future = self._in_flight.get(name)
+        return future is not None and not future.done()
+
+    def submit(self, name, instance, trading_bot_instance, snapshot=None, partial=False, symbol="BTCUSDT"):
+        """
+        partial=True evalúa sobre la vela en curso (en modo proceso, el snapshot ya la incluye).
+        symbol es el símbolo de Binance del instrumento de la instancia.
+        """
+        if self.mode == "process":
+            future = self.executor.submit(
+                _run_in_process, _strategy_file(instance), type(instance).__name__, dict(instance.__dict__), snapshot, symbol
+            )
+        else:
+            future = self.executor.submit(_run_in_thread, instance, trading_bot_instance, partial, symbol)
+        self._in_flight[name] = future
+        return future
+
+    def collect(self, submitted):
+        """
+        Recoge los resultados en el orden de `submitted` [(name, future), ...].
+        Devuelve [(name, raw_result, error)]; una estrategia que supera el timeout
+        devuelve error y queda marcada como ocupada hasta que termine.
+        """
+        deadline = time.monotonic() + self.timeout_seconds
+        results = []
+        for name, future in submitted:
+            try:
+                results.append((name, future.result(timeout=max(0.0, deadline - time.monotonic())), None))
+            except FutureTimeoutError:
+                logger.warning(f"La estrategia '{name}' superó el timeout de {self.timeout_seconds}s.")
+                results.append((name, None, TimeoutError(f"Timeout de {self.timeout_seconds}s superado")))
+            except Exception as e:
+                results.append((name, None, e))
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
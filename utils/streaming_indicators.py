@@ -0,0 +1,356 @@
+import logging
+import math
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+NAN = float("nan")
+
+
+class StreamingIndicator:
+    """
+    Indicador incremental: mantiene su estado y se actualiza en O(1) por cada vela cerrada.
+    Los valores coinciden con los de la librería `ta` calculados sobre el mismo histórico.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.value = NAN
+        self.previous = NAN
+
+    def update(self, open_time, open_, high, low, close, volume):
+        self.previous = self.value
+        self.value = self._update(high, low, close, volume)
+        self.count += 1
+        return self.value
+
+    def _update(self, high, low, close, volume):
+        raise NotImplementedError
+
+
+class _EMAState:
+    """EMA con adjust=False y min_periods=window, como ta.utils._ema."""
+
+    def __init__(self, window, alpha=None):
+        self.window = window
+        self.alpha = alpha if alpha is not None else 2.0 / (window + 1)
+        self.count = 0
+        self.mean = NAN
+
+    def update(self, x):
+        if self.count == 0:
+            self.mean = x
+        else:
+            self.mean = (1.0 - self.alpha) * self.mean + self.alpha * x
+        self.count += 1
+        return self.mean if self.count >= self.window else NAN
+
+
+class StreamingEMA(StreamingIndicator):
+    def __init__(self, window):
+        super().__init__()
+        self._ema = _EMAState(window)
+
+    def _update(self, high, low, close, volume):
+        return self._ema.update(close)
+
+
+class StreamingRSI(StreamingIndicator):
+    """RSI de Wilder (ewm con alpha=1/window), igual que ta.momentum.RSIIndicator."""
+
+    def __init__(self, window=14):
+        super().__init__()
+        self._up = _EMAState(window, alpha=1.0 / window)
+        self._down = _EMAState(window, alpha=1.0 / window)
+        self._prev_close = None
+
+    def _update(self, high, low, close, volume):
+        diff = 0.0 if self._prev_close is None else close - self._prev_close
+        self._prev_close = close
+        up = self._up.update(diff if diff > 0 else 0.0)
+        down = self._down.update(-diff if diff < 0 else 0.0)
+        if math.isnan(down):
+            return NAN
+        if down == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+
+def _true_range(high, low, prev_close):
+    if prev_close is None:
+        return high - low
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class StreamingATR(StreamingIndicator):
+    """ATR de Wilder. Como en ta, vale 0 hasta completar la primera ventana."""
+
+    def __init__(self, window=14):
+        super().__init__()
+        self.window = window
+        self._prev_close = None
+        self._tr_sum = 0.0
+        self._atr = 0.0
+
+    def _update(self, high, low, close, volume):
+        tr = _true_range(high, low, self._prev_close)
+        self._prev_close = close
+        n = self.count + 1
+        if n < self.window:
+            self._tr_sum += tr
+            return 0.0
+        if n == self.window:
+            self._atr = (self._tr_sum + tr) / self.window
+        else:
+            self._atr = (self._atr * (self.window - 1) + tr) / self.window
+        return self._atr
+
+
+class StreamingMACD(StreamingIndicator):
+    """MACD de ta.trend.MACD. output: 'macd', 'signal' o 'diff'."""
+
+    def __init__(self, fast=12, slow=26, sign=9, output="macd"):
+        super().__init__()
+        self._fast = _EMAState(fast)
+        self._slow = _EMAState(slow)
+        self._signal = _EMAState(sign)
+        self.output = output
+
+    def _update(self, high, low, close, volume):
+        macd = self._fast.update(close) - self._slow.update(close)
+        if math.isnan(macd):
+            return NAN
+        signal = self._signal.update(macd)
+        if self.output == "macd":
+            return macd
+        if self.output == "signal":
+            return signal
+        return macd - signal
+
+
+class StreamingADX(StreamingIndicator):
+    """
+    ADX replicando ta.trend.ADXIndicator: sumas de Wilder de TR, +DM y -DM desde
+    la segunda vela, y media de los primeros `window` DX como semilla. Vale 0 hasta
+    completar 2 * window velas.
+    """
+
+    def __init__(self, window=14):
+        super().__init__()
+        self.window = window
+        self._prev = None  # (high, low, close) de la vela anterior
+        self._trs = self._dip = self._din = 0.0
+        self._dx_sum = 0.0
+        self._adx = 0.0
+
+    def _update(self, high, low, close, volume):
+        w = self.window
+        n = self.count  # índice de la vela actual
+        prev = self._prev
+        self._prev = (high, low, close)
+        if prev is None:
+            return 0.0
+
+        prev_high, prev_low, prev_close = prev
+        tr = max(high, prev_close) - min(low, prev_close)
+        diff_up = high - prev_high
+        diff_down = prev_low - low
+        pos = diff_up if diff_up > diff_down and diff_up > 0 else 0.0
+        neg = diff_down if diff_down > diff_up and diff_down > 0 else 0.0
+
+        if n <= w:
+            self._trs += tr
+            self._dip += pos
+            self._din += neg
+            if n < w:
+                return 0.0
+        else:
+            self._trs += tr - self._trs / w
+            self._dip += pos - self._dip / w
+            self._din += neg - self._din / w
+
+        dip = 100.0 * self._dip / self._trs if self._trs != 0 else 0.0
+        din = 100.0 * self._din / self._trs if self._trs != 0 else 0.0
+        dx = 100.0 * abs((dip - din) / (dip + din)) if dip + din != 0 else 0.0
+
+        if n < 2 * w - 1:
+            self._dx_sum += dx
+            return 0.0
+        if n == 2 * w - 1:
+            self._adx = (self._dx_sum + dx) / w
+        else:
+            self._adx = (self._adx * (w - 1) + dx) / w
+        return self._adx
+
+
+class _RollingWindow:
+    """
+    Suma y suma de cuadrados de una ventana deslizante, desplazadas respecto a un
+    ancla para evitar la cancelación numérica. Cada `window` actualizaciones se
+    recalculan desde el deque, así el coste amortizado sigue siendo O(1) y el error
+    no se acumula.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self._anchor = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._since_rebuild = 0
+
+    def push(self, x):
+        if self._anchor is None:
+            self._anchor = x
+        if len(self.values) == self.window:
+            old = self.values[0] - self._anchor
+            self._sum -= old
+            self._sumsq -= old * old
+        self.values.append(x)
+        d = x - self._anchor
+        self._sum += d
+        self._sumsq += d * d
+        self._since_rebuild += 1
+        if self._since_rebuild >= self.window:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._anchor = self.values[-1]
+        self._sum = sum(v - self._anchor for v in self.values)
+        self._sumsq = sum((v - self._anchor) ** 2 for v in self.values)
+        self._since_rebuild = 0
+
+    def full(self):
+        return len(self.values) == self.window
+
+    def mean(self):
+        return self._anchor + self._sum / self.window
+
+    def std(self):
+        """Desviación típica poblacional (ddof=0), como ta.volatility.BollingerBands."""
+        mean_d = self._sum / self.window
+        return math.sqrt(max(self._sumsq / self.window - mean_d * mean_d, 0.0))
+
+
+class StreamingBollinger(StreamingIndicator):
+    """Bandas de Bollinger. output: 'low', 'high' o 'mid'."""
+
+    def __init__(self, window=20, window_dev=2.0, output="low"):
+        super().__init__()
+        self._window = _RollingWindow(window)
+        self.window_dev = window_dev
+        self.output = output
+
+    def _update(self, high, low, close, volume):
+        self._window.push(close)
+        if not self._window.full():
+            return NAN
+        mid = self._window.mean()
+        if self.output == "mid":
+            return mid
+        band = self.window_dev * self._window.std()
+        return mid - band if self.output == "low" else mid + band
+
+
+class StreamingVolumeSMA(StreamingIndicator):
+    def __init__(self, window):
+        super().__init__()
+        self._window = _RollingWindow(window)
+
+    def _update(self, high, low, close, volume):
+        self._window.push(volume)
+        return self._window.mean() if self._window.full() else NAN
+
+
+# Mismos nombres y parámetros que utils.indicators.INDICATOR_FUNCTIONS
+STREAMING_INDICATORS = {
+    "EMA": StreamingEMA,
+    "RSI": StreamingRSI,
+    "ATR": StreamingATR,
+    "ADX": StreamingADX,
+    "MACD": lambda fast=12, slow=26, sign=9: StreamingMACD(fast, slow, sign, output="macd"),
+    "MACD_SIGNAL": lambda fast=12, slow=26, sign=9: StreamingMACD(fast, slow, sign, output="signal"),
+    "MACD_DIFF": lambda fast=12, slow=26, sign=9: StreamingMACD(fast, slow, sign, output="diff"),
+    "BB_LOW": lambda window, window_dev=2.0: StreamingBollinger(window, window_dev, output="low"),
+    "BB_HIGH": lambda window, window_dev=2.0: StreamingBollinger(window, window_dev, output="high"),
+    "VOLUME_SMA": StreamingVolumeSMA,
+}
+
+
+class StreamingIndicatorEngine:
+    """
+    Indicadores incrementales por (symbol, interval) alimentados desde los KlineStore.
+
+    Un indicador se crea la primera vez que se pide y se siembra una sola vez con el
+    histórico del store (O(n)); a partir de ahí cada vela cerrada lo actualiza en O(1).
+    Si llega una vela con el mismo open_time que la última (corrección de la vela),
+    los indicadores de ese par se vuelven a sembrar desde el store.
+    """
+
+    def __init__(self, kline_stores):
+        self.kline_stores = kline_stores
+        self._indicators = {}  # (symbol, interval) -> {(name, params): StreamingIndicator}
+        self._last_open_time = {}
+        self.lock = threading.Lock()
+
+    def _seed(self, key, indicator):
+        store = self.kline_stores[key]
+        with store.lock:
+            columns = {col: values.copy() for col, values in store.tail().items()}
+        for row in zip(columns["open_time"], columns["open"], columns["high"], columns["low"], columns["close"], columns["volume"]):
+            indicator.update(int(row[0]), *map(float, row[1:]))
+        return int(columns["open_time"][-1]) if len(columns["open_time"]) else None
+
+    def _get(self, symbol, interval, name, params):
+        key = (symbol.upper(), interval)
+        params = tuple(params)
+        indicators = self._indicators.setdefault(key, {})
+        indicator = indicators.get((name, params))
+        if indicator is None:
+            indicator = STREAMING_INDICATORS[name](*params)
+            last_open_time = self._seed(key, indicator)
+            if indicators and self._last_open_time.get(key) != last_open_time:
+                # El store avanzó sin pasar por on_kline: resembrar todo el par
+                self._reseed(key)
+            indicators[(name, params)] = indicator
+            self._last_open_time[key] = last_open_time
+        return indicator
+
+    def _reseed(self, key):
+        indicators = self._indicators.get(key, {})
+        last_open_time = None
+        for (name, params) in list(indicators):
+            indicator = STREAMING_INDICATORS[name](*params)
+            last_open_time = self._seed(key, indicator)
+            indicators[(name, params)] = indicator
+        self._last_open_time[key] = last_open_time
+
+    def on_kline(self, symbol, interval, open_time, open_, high, low, close, volume):
+        """Actualiza los indicadores del par con una vela ya añadida al store."""
+        key = (symbol.upper(), interval)
+        with self.lock:
+            indicators = self._indicators.get(key)
+            if not indicators:
+                return
+            last_open_time = self._last_open_time.get(key)
+            open_time = int(open_time)
+            if last_open_time is not None and open_time < last_open_time:
+                return
+            if open_time == last_open_time:
+                self._reseed(key)
+                return
+            for indicator in indicators.values():
+                indicator.update(open_time, float(open_), float(high), float(low), float(close), float(volume))
+            self._last_open_time[key] = open_time
+
+    def latest(self, symbol, interval, name, *params):
+        """Último valor del indicador (NaN si todavía no hay velas suficientes)."""
+        with self.lock:
+            return self._get(symbol, interval, name, params).value
+
+    def latest_pair(self, symbol, interval, name, *params):
+        """(valor anterior, último valor), útil para detectar cruces."""
+        with self.lock:
+            indicator = self._get(symbol, interval, name, params)
+            return indicator.previous, indicator.value
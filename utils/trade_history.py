@@ -0,0 +1,26 @@
+import numpy as np
+
+# Columnas de trade_history.csv (las comparten el bot, el backtester y el dashboard)
+TRADE_HISTORY_FIELDNAMES = [
+    "open_time", "strategy", "epic", "direction", "size",
+    "entry_price", "stop_level", "profit_level",
+    "dealReference", "dealId", "status", "profit_loss",
+    "close_time", "close_price", "entry_conditions",
+    "exit_conditions", "exit_reason", "tp_sl_against_trend_active", "sl_moved_to_be", "break_even_profit_pct",
+    "current_trend", "atr_5m"
+]
+
+
+def sanitize_for_json(data):
+    """Convierte recursivamente los tipos de NumPy a tipos nativos de Python para la serialización JSON."""
+    if isinstance(data, dict):
+        return {k: sanitize_for_json(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [sanitize_for_json(i) for i in data]
+    elif isinstance(data, np.bool_):
+        return bool(data)
+    elif isinstance(data, np.integer):
+        return int(data)
+    elif isinstance(data, np.floating):
+        return float(data)
+    return data
@@ -0,0 +1,233 @@
+import csv
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+
+import pandas as pd
+
+from utils.trade_history import TRADE_HISTORY_FIELDNAMES, sanitize_for_json
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = ("size", "entry_price", "stop_level", "profit_level", "profit_loss", "close_price", "break_even_profit_pct", "atr_5m")
+BOOLEAN_FIELDS = ("tp_sl_against_trend_active", "sl_moved_to_be")
+
+
+def _normalize_value(field, value):
+    """Tipa un valor leído del CSV o recibido del bot (vacío/NaN/pd.NA -> None)."""
+    if value is None or value is pd.NA:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, str) and value == "":
+        return None
+    if field in NUMERIC_FIELDS:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if field in BOOLEAN_FIELDS:
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "1")
+        return bool(value)
+    return sanitize_for_json(value)
+
+
+def _normalize_trade(trade):
+    return {field: _normalize_value(field, trade.get(field)) for field in TRADE_HISTORY_FIELDNAMES}
+
+
+class TradeStore:
+    """
+    Historial de operaciones con índice en memoria por dealId y por estado.
+
+    - Las aperturas se añaden al final de trade_history.csv (mismo formato de siempre).
+    - Los cambios posteriores (cierres) se escriben como líneas JSON en un journal
+      junto al CSV; cada cierre cuesta una línea, no reescribir todo el fichero.
+    - Al cargar se aplica el journal sobre el CSV. Cuando el journal crece se compacta:
+      el CSV se reescribe de forma atómica con el estado actual y el journal se vacía.
+    - export_columnar() vuelca el historial a Parquet (o pickle si no hay pyarrow)
+      para analítica.
+    """
+
+    def __init__(self, path="trade_history.csv", journal_path=None, compact_every=200, columnar_path=None, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self.journal_path = journal_path or f"{os.path.splitext(path)[0]}.journal.jsonl"
+        self.compact_every = compact_every
+        self.columnar_path = columnar_path
+        self.lock = threading.RLock()
+        self.records = []
+        self._by_deal = {}   # dealId -> índice en records
+        self._open = {}      # dealId -> None, en orden de apertura (dict como conjunto ordenado)
+        self._journal_entries = 0
+        self.reload()
+
+    # --- Carga y persistencia ---
+
+    def reload(self):
+        """(Re)lee el CSV y aplica el journal. Necesario si otro proceso reescribió el CSV."""
+        with self.lock:
+            self.records, self._by_deal, self._open = [], {}, {}
+            self._journal_entries = 0
+            header_ok = True
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, "r", newline='', encoding="utf-8") as f:
+                    reader = csv.DictReader(f)
+                    header_ok = reader.fieldnames == TRADE_HISTORY_FIELDNAMES
+                    for row in reader:
+                        self._index(_normalize_trade(row))
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            logger.warning(f"TradeStore: línea del journal ignorada: {line.strip()[:200]}")
+                            continue
+                        self._apply(entry.pop("dealId", None), entry)
+                        self._journal_entries += 1
+            if not self.read_only and (not header_ok or not os.path.exists(self.path)):
+                # Cabecera antigua o fichero nuevo: se reescribe con las columnas actuales
+                self.compact()
+
+    def _index(self, trade):
+        self.records.append(trade)
+        deal_id = trade.get("dealId")
+        if deal_id:
+            self._by_deal[deal_id] = len(self.records) - 1
+            if trade.get("status") == "OPEN":
+                self._open[deal_id] = None
+            else:
+                self._open.pop(deal_id, None)
+
+    def _apply(self, deal_id, fields):
+        index = self._by_deal.get(deal_id)
+        if index is None:
+            return False
+        trade = self.records[index]
+        for field, value in fields.items():
+            if field in trade:
+                trade[field] = _normalize_value(field, value)
+        if trade.get("status") == "OPEN":
+            self._open[deal_id] = None
+        else:
+            self._open.pop(deal_id, None)
+        return True
+
+    def compact(self):
+        """Reescribe el CSV con el estado actual (fichero temporal + os.replace) y vacía el journal."""
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", newline='', encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=TRADE_HISTORY_FIELDNAMES)
+                writer.writeheader()
+                writer.writerows(self.records)
+            os.replace(tmp_path, self.path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_entries = 0
+            if self.columnar_path:
+                try:
+                    self.export_columnar(self.columnar_path)
+                except Exception as e:
+                    logger.warning(f"TradeStore: no se pudo exportar el historial columnar: {e}")
+
+    def clear(self):
+        with self.lock:
+            self.records, self._by_deal, self._open = [], {}, {}
+            self.compact()
+
+    # --- Escritura ---
+
+    def append(self, trade):
+        """Registra una operación nueva: una línea al final del CSV."""
+        trade = _normalize_trade(trade)
+        with self.lock:
+            with open(self.path, "a", newline='', encoding="utf-8") as f:
+                csv.DictWriter(f, fieldnames=TRADE_HISTORY_FIELDNAMES).writerow(trade)
+            self._index(trade)
+        return trade
+
+    def update(self, deal_id, **fields):
+        """Actualiza campos de una operación (p. ej. el cierre) con una línea en el journal."""
+        with self.lock:
+            if not self._apply(deal_id, fields):
+                logger.warning(f"TradeStore: dealId {deal_id} no encontrado; actualización ignorada.")
+                return False
+            entry = {"dealId": deal_id, **{k: _normalize_value(k, v) for k, v in fields.items()}}
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+            self._journal_entries += 1
+            if self._journal_entries >= self.compact_every:
+                self.compact()
+        return True
+
+    # --- Lectura ---
+
+    def get(self, deal_id):
+        with self.lock:
+            index = self._by_deal.get(deal_id)
+            return dict(self.records[index]) if index is not None else None
+
+    def open_trades(self):
+        """Operaciones abiertas con dealId, en orden de apertura (coste proporcional a las abiertas)."""
+        with self.lock:
+            return [dict(self.records[self._by_deal[deal_id]]) for deal_id in self._open]
+
+    def closed_trades(self):
+        """Operaciones cerradas, en el orden del historial."""
+        with self.lock:
+            return [dict(t) for t in self.records if t.get("status") == "CLOSED"]
+
+    def recent(self, limit=5):
+        """Las `limit` operaciones con open_time más reciente."""
+        with self.lock:
+            return [dict(t) for t in heapq.nlargest(limit, self.records, key=lambda t: t.get("open_time") or "")]
+
+    @property
+    def pending_updates(self):
+        """Actualizaciones en el journal que aún no están en el CSV."""
+        return self._journal_entries
+
+    def __len__(self):
+        return len(self.records)
+
+    def to_dataframe(self, status=None):
+        """DataFrame con las columnas de trade_history.csv y los campos numéricos ya convertidos."""
+        with self.lock:
+            records = [t for t in self.records if status is None or t.get("status") == status]
+            df = pd.DataFrame.from_records(records, columns=TRADE_HISTORY_FIELDNAMES)
+        for field in NUMERIC_FIELDS:
+            df[field] = pd.to_numeric(df[field], errors='coerce')
+        return df
+
+    def export_columnar(self, path="trade_history.parquet"):
+        """
+        Exporta el historial en formato columnar. Usa Parquet si pyarrow/fastparquet
+        están instalados y, si no, un pickle del DataFrame. Devuelve la ruta escrita.
+        """
+        df = self.to_dataframe()
+        for field in BOOLEAN_FIELDS:
+            df[field] = df[field].fillna(False).astype(bool)
+        try:
+            df.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            fallback = f"{os.path.splitext(path)[0]}.pkl"
+            df.to_pickle(fallback)
+            return fallback
+
+
+def read_trade_history(path="trade_history.csv"):
+    """Lee el historial desde el CSV (+journal), un Parquet o un pickle exportados."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".pkl"):
+        return pd.read_pickle(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return TradeStore(path, read_only=True).to_dataframe()